@@ -2,17 +2,15 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import os
-import zipfile
-import json
 import re
+import time
+import uuid
 from dotenv import load_dotenv
 
-# --- Imports do agente de NF (LLM) ---
-from llama_index.experimental.query_engine import PandasQueryEngine
-from llama_index.llms.groq import Groq
-
-# --- Imports do agente EDA ---
-from utils import eda, memory
+# Só o comum às duas abas. Os módulos de cada agente são importados quando a
+# aba é aberta (ver "Interface principal"); llama_index, Groq, scikit-learn e
+# matplotlib só quando a primeira pergunta, engine ou gráfico precisa deles.
+from utils import jobs, memory, metrics
 
 # --- Configurações ---
 load_dotenv()
@@ -21,170 +19,463 @@ st.set_page_config(page_title="Agentes Autônomos", layout="wide")
 DATA_DIR = os.getenv("DATA_DIR", "data")
 CABECALHO_CSV = os.getenv("CABECALHO_FILE", "202401_NFs_Cabecalho.csv")
 ITENS_CSV = os.getenv("ITENS_FILE", "202401_NFs_Itens.csv")
+# ZIP do desafio; pelo nome (YYYYMM_NFs*.zip) é também a partição 202401 do catálogo
 ZIP_FILENAME = "202401_NFs.zip"
+MES_RE = re.compile(r"\d{4}(0[1-9]|1[0-2])")
+# "pandas" (PandasQueryEngine) ou "duckdb" (SQL sobre o cache Parquet)
+NF_BACKEND = os.getenv("NF_BACKEND", "pandas")
+BACKENDS = ["pandas", "duckdb"]
+# intervalo entre reruns enquanto houver job da sessão em andamento
+POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "0.7"))
+
+# jobs desta execução do script ainda em andamento (ver acompanhar_job)
+_pendentes = []
+
+# ===============================
+# Jobs em segundo plano (utils.jobs)
+# ===============================
+def acompanhar_job(nome, mostrar):
+    """Estado do job guardado em ``st.session_state[nome]``.
+
+    Em andamento: barra de progresso e botão de cancelar (o script segue e
+    é reexecutado a cada ``POLL_SECONDS``). Concluído: ``mostrar(resultado)``.
+    """
+    manager = jobs.get_manager()
+    job = manager.get(st.session_state.get(nome))
+    if job is None:
+        return
+    if job.status == jobs.DONE:
+        mostrar(job.result)
+    elif job.status == jobs.FAILED:
+        st.error(f"{job.label} falhou: {job.error}")
+    elif job.status == jobs.CANCELLED:
+        st.warning(f"{job.label} cancelado.")
+    else:
+        detalhe = f" — {job.message}" if job.message else ""
+        st.progress(job.progress or 0.0, text=f"{job.label}: {job.status}{detalhe} ({job.elapsed():.0f} s)")
+        if st.button("Cancelar", key=f"{nome}_cancelar"):
+            manager.cancel(job.id)
+        _pendentes.append(job.id)
 
 # ===============================
 # Funções para Notas Fiscais (desafio anterior)
 # ===============================
-def unzip_if_needed():
-    zip_path = os.path.join(DATA_DIR, ZIP_FILENAME)
-    if os.path.exists(zip_path) and \
-       (not os.path.exists(os.path.join(DATA_DIR, CABECALHO_CSV)) or \
-        not os.path.exists(os.path.join(DATA_DIR, ITENS_CSV))):
-        try:
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(DATA_DIR)
-            st.success("Arquivos CSV descompactados com sucesso!")
-            return True
-        except Exception as e:
-            st.error(f"Erro ao descompactar: {e}")
-            return False
-    return False
-
-def load_data_nf():
-    cabecalho = pd.read_csv(os.path.join(DATA_DIR, CABECALHO_CSV))
-    itens = pd.read_csv(os.path.join(DATA_DIR, ITENS_CSV))
-    cabecalho.columns = cabecalho.columns.str.strip()
-    itens.columns = itens.columns.str.strip()
-    for col in ['VALOR NOTA FISCAL']:
-        if col in cabecalho.columns:
-            cabecalho[col] = pd.to_numeric(cabecalho[col], errors="coerce")
-    for col in ['VALOR TOTAL', 'VALOR UNITÁRIO', 'QUANTIDADE']:
-        if col in itens.columns:
-            itens[col] = pd.to_numeric(itens[col], errors="coerce")
-    return cabecalho, itens
+def archive_name(uploaded_file, mes=None):
+    """Nome da partição do upload: o próprio, se segue YYYYMM_NFs*.zip; senão ``{mes}_NFs.zip``.
+
+    None quando o nome não segue o padrão e o mês (AAAAMM) não foi informado:
+    gravar com um nome qualquer sobrescreveria outro mês do catálogo.
+    """
+    name = os.path.basename(uploaded_file.name)
+    if nf_catalog.ARCHIVE_PATTERN.match(name):
+        return name
+    mes = (mes or "").strip()
+    return f"{mes}_NFs.zip" if MES_RE.fullmatch(mes) else None
+
+def ingest_upload(uploaded_file, name):
+    """Grava o ZIP em blocos e já o converte para o cache colunar, sem extrair os CSVs."""
+    catalog = nf_catalog.get_catalog()
+    # o mês substituído perde as respostas e engines em cache; os demais meses ficam
+    for fingerprint in catalog.fingerprints(name):
+        llm_cache.get_cache().invalidate(fingerprint)
+        engine_registry.get_registry().discard(fingerprint)
+    zip_path = os.path.join(DATA_DIR, name)
+    nf_cache.copy_upload(uploaded_file, zip_path)
+    try:
+        nf_cache.load_zip_tables(zip_path)
+        # só o arquivo enviado é processado; os meses já catalogados ficam como estão
+        novas = catalog.refresh()
+        st.success(f"ZIP recebido e processado com sucesso! {', '.join(novas)}")
+        return True
+    except Exception as e:
+        st.error(f"Erro ao processar o ZIP: {e}")
+        return False
+
+def load_data_nf(inicio=None, fim=None, ufs=None):
+    """(cabecalho, itens) das partições do catálogo que o período/UFs alcançam.
+
+    Sem partições no padrão YYYYMM_NFs*, usa CABECALHO_FILE/ITENS_FILE (ou ZIP_FILENAME).
+    """
+    catalog = nf_catalog.get_catalog()
+    catalog.refresh()
+    if catalog.partitions():
+        return catalog.load(inicio, fim, ufs)
+    # ZIP lido em blocos direto para o cache Parquet (DATA_DIR/.cache); CSVs soltos como alternativa
+    return nf_cache.load_nf_dataset(DATA_DIR, ZIP_FILENAME, CABECALHO_CSV, ITENS_CSV)
+
+def dataset_available():
+    return bool(nf_catalog.get_catalog().discover()) or \
+        nf_cache.dataset_available(DATA_DIR, ZIP_FILENAME, CABECALHO_CSV, ITENS_CSV)
+
+def filtro_periodo():
+    """Período e UFs a consultar quando há mais de um mês; (None, None, None) sem filtro."""
+    partes = nf_catalog.get_catalog().partitions()
+    if len(partes) < 2:
+        return None, None, None
+    with st.expander(f"📅 Período e UFs ({len(partes)} partições)"):
+        st.dataframe(pd.DataFrame([{
+            "partição": p["id"], "notas": p["rows"]["cabecalho"], "itens": p["rows"]["itens"],
+            "de": p["min_date"], "até": p["max_date"],
+        } for p in partes]).set_index("partição"))
+        datas = [pd.Timestamp(d).date() for p in partes for d in (p["min_date"], p["max_date"]) if d]
+        periodo = st.date_input("Período", value=(min(datas), max(datas)),
+                                min_value=min(datas), max_value=max(datas))
+        ufs_disponiveis = sorted({uf for p in partes for v in p.get("ufs", {}).values() for uf in v})
+        ufs = st.multiselect("UF (emitente ou destinatário)", ufs_disponiveis)
+    inicio = fim = None
+    if isinstance(periodo, (list, tuple)) and len(periodo) == 2:
+        inicio, fim = periodo
+        if (inicio, fim) == (min(datas), max(datas)):
+            inicio = fim = None
+        else:
+            fim = pd.Timestamp(fim) + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+    return inicio, fim, ufs or None
 
 @st.cache_resource
 def get_llm():
+    # chamado só quando a pergunta chega ao LLM (dentro do job): cubo, roteador,
+    # cache e planos respondem sem chave; o erro vira a resposta do job
     groq_api_key = os.getenv("GROQ_API_KEY")
     if groq_api_key is None:
-        st.error("Erro: GROQ_API_KEY não configurada.")
-        st.stop()
+        raise RuntimeError("GROQ_API_KEY não configurada.")
+    from llama_index.llms.groq import Groq
+
     return Groq(model="llama3-8b-8192", api_key=groq_api_key)
 
-@st.cache_resource
-def get_query_engine(df):
-    llm = get_llm()
-    return PandasQueryEngine(
-        df=df,
-        verbose=True,
-        llm=llm,
-        system_prompt="""
-        Você é um assistente de análise de dados.
-        Responda perguntas sobre o DataFrame fornecido.
-        Se a resposta for tabular, retorne como JSON válido (lista de objetos).
-        """
-    )
-
-def responder_pergunta_com_agente(df, pergunta):
-    query_engine = get_query_engine(df)
-    try:
-        response_obj = query_engine.query(pergunta)
-        content = str(response_obj)
-        try:
-            data = json.loads(content)
-            if isinstance(data, list) and all(isinstance(item, dict) for item in data):
-                return data
-        except:
-            pass
-        return content
-    except Exception as e:
-        return f"Erro: {e}"
+def get_query_engine(df, tabela="Cabeçalho"):
+    # Chave barata (sha1 do CSV, calculado no load) em vez de hashear o DataFrame a cada rerun
+    return nf_agent.get_query_engine(df, tabela, get_llm)
+
+def responder_pergunta_com_rota(df, pergunta, tabela="Cabeçalho", backend=None, tabelas=None):
+    """Retorna (resposta, caminho, ms); caminho: cubo, roteador, cache, plano, llm, sql ou erro.
+
+    ``backend="duckdb"`` gera SQL sobre Cabeçalho e Itens juntos; ``tabelas``
+    evita recarregar (cabecalho, itens) quando o chamador já os tem.
+    """
+    if (backend or NF_BACKEND) == "duckdb":
+        cabecalho_df, itens_df = tabelas or load_data_nf()
+        return nf_agent.responder_sql(cabecalho_df, itens_df, pergunta, get_llm)
+    return nf_agent.responder(df, pergunta, tabela, get_query_engine)
+
+def responder_pergunta_com_agente(df, pergunta, tabela="Cabeçalho", backend=None):
+    return responder_pergunta_com_rota(df, pergunta, tabela, backend)[0]
+
+def _job_pergunta_nf(df, pergunta, tabela, backend, tabelas, perfilar):
+    with metrics.profiled(perfilar) as perfil, metrics.span("nf.pergunta", backend=backend):
+        resp, caminho, ms = responder_pergunta_com_rota(df, pergunta, tabela, backend, tabelas)
+    return resp, caminho, ms, perfil.text
+
+def mostrar_resposta_nf(result):
+    resp, caminho, ms, perfil = result
+    if isinstance(resp, list):
+        st.dataframe(pd.DataFrame(resp))
+    elif caminho == "erro":
+        st.error(resp)
+    else:
+        st.write(resp)
+    st.caption(f"Respondido por: {caminho} em {ms:.1f} ms")
+    mostrar_perfil(perfil)
+
+def mostrar_memoria(df):
+    mem = df.attrs.get("memory")
+    if mem:
+        st.caption(f"Memória: {mem['depois_mb']:.1f} MB (era {mem['antes_mb']:.1f} MB com os tipos do CSV)")
+
+def perfilar_proxima():
+    """Consome a opção de cProfile: vale só para a pergunta sendo enviada agora.
+
+    Chamada antes de ``painel_metricas`` desenhar o checkbox, que volta desmarcado.
+    """
+    perfilar = st.session_state.get("perfilar", False)
+    st.session_state["perfilar"] = False
+    return perfilar
+
+def mostrar_perfil(text):
+    if text:
+        with st.expander("cProfile da última pergunta"):
+            st.code(text)
+
+def painel_metricas():
+    """Latência por etapa (p50/p95), traces recentes e exportação."""
+    with st.sidebar.expander("📈 Métricas"):
+        st.checkbox("Perfilar próxima pergunta (cProfile)", key="perfilar")
+        estados = jobs.get_manager().stats()
+        if estados:
+            st.caption("Jobs: " + ", ".join(f"{n} {estado}" for estado, n in estados.items()))
+        rows = metrics.summary()
+        if not rows:
+            st.caption("Nenhuma etapa medida ainda.")
+            return
+        st.dataframe(pd.DataFrame(rows).set_index("etapa").round(1))
+        for trace in metrics.recent_traces(5):
+            caminho = trace.get("attrs", {}).get("caminho", "")
+            st.caption(f"{trace['name']} {caminho} {trace['ms']:.0f} ms: "
+                       + " · ".join(f"{s['name']} {s['ms']:.0f}" for s in trace["spans"] if s["depth"] == 1))
+        st.download_button("Prometheus", metrics.prometheus_text(), file_name="metrics.prom")
+        st.download_button("Traces (JSONL)", metrics.traces_jsonl(), file_name="traces.jsonl")
+        if st.button("Gravar em METRICS_DIR"):
+            st.caption(", ".join(metrics.export(fmt) for fmt in ("prometheus", "jsonl")))
 
 # ===============================
 # Funções para EDA (desafio extra)
 # ===============================
+# Resultados derivados saem de eda_cache (por conteúdo do upload, entre reruns
+# e sessões); gráficos já têm o cache em disco do plot_cache e recebem a
+# impressão digital para não rehashear o DataFrame a cada clique.
+def correlacao(df):
+    corr = eda_cache.compute(df, eda.correlation)
+    return corr, eda.plot_correlation(corr)
+
+# agregação pedida na pergunta -> agregação do cubo (nf_cube.Cube.lookup)
+AGREGACOES = {"soma": "soma", "total": "soma", "media": "media", "média": "media", "maximo": "maximo",
+              "máximo": "maximo", "maxima": "maximo", "máxima": "maximo", "minimo": "minimo",
+              "mínimo": "minimo", "minima": "minimo", "mínima": "minimo", "contagem": "linhas"}
+
+def agregado_por(q, df):
+    """Pergunta "soma/média/máximo/mínimo/contagem de X por Y" respondida pelo cubo do CSV, ou None."""
+    m = re.search(r"\b(" + "|".join(AGREGACOES) + r")\b(?:\s+(?:de|da|do|dos|das)\b)?\s*(.*?)\s*\bpor\s+(.+?)\??$", q)
+    if not m:
+        return None
+    cube = eda_cache.compute(df, nf_cube.build_auto)
+    agg = AGREGACOES[m.group(1)]
+    by = nf_router.resolve_column(m.group(3), cube.dimensions)
+    measure = nf_router.resolve_column(m.group(2), cube.measures) if m.group(2) else None
+    if by is None or (measure is None and agg != "linhas"):
+        return None
+    serie = cube.lookup(measure, agg, by=by).sort_values(ascending=False)
+    return (f"{m.group(1).capitalize()} de {measure or 'linhas'} por {by}:", serie.to_frame())
+
 def handle_question(question, df):
     q = question.lower()
+    fingerprint = eda_cache.fingerprint_of(df)
     if "tipo" in q:
-        return ("Tipos de colunas:", eda.get_column_types(df))
+        return ("Tipos de colunas:", eda_cache.compute(df, eda.get_column_types))
+    # agrupamentos saem do cubo de agregados (montado uma vez por CSV)
+    resposta = agregado_por(q, df)
+    if resposta is not None:
+        return resposta
     m = re.search(r'm[eé]dia(?: de| da| do)?\s+([A-Za-z0-9_]+)', q)
     if m:
         col = m.group(1)
         if col in df.columns:
-            return (f"Média de {col}: {df[col].mean()}", None)
+            desc = eda_cache.compute(df, eda.describe_numeric)
+            media = desc.at[col, "mean"] if col in desc.index else df[col].mean()
+            return (f"Média de {col}: {media}", None)
     if "hist" in q or "distribui" in q:
         m = re.search(r'(?:de|da|do)\s+([A-Za-z0-9_]+)', q)
         if m and m.group(1) in df.columns:
-            imgs = eda.generate_histograms(df, [m.group(1)])
+            imgs = eda.generate_histograms(df, [m.group(1)], fingerprint=fingerprint)
             return (f"Histograma de {m.group(1)} gerado.", imgs.get(m.group(1)))
-        imgs = eda.generate_histograms(df)
+        imgs = eda.generate_histograms(df, fingerprint=fingerprint)
         return ("Histogramas gerados.", ", ".join(list(imgs.values())[:5]))
     if "correl" in q:
-        corr, path = eda.correlation_matrix(df)
+        corr, path = correlacao(df)
         return ("Matriz de correlação gerada.", path)
     if "outlier" in q or "atípico" in q:
-        idxs, details = eda.detect_outliers_iqr(df)
+        idxs, details = eda_cache.compute(df, eda.detect_outliers_iqr)
         return (f"Foram encontrados {len(idxs)} outliers.", details)
+    if "cotovelo" in q or "elbow" in q or "silhueta" in q or "silhouette" in q:
+        scores, path = eda_cache.compute(df, eda.cluster_sweep, fingerprint=fingerprint,
+                                         check=lambda r: os.path.exists(r[1]))
+        best = eda.best_k(scores)
+        if best is None:
+            return ("Varredura de k concluída, mas a silhueta ficou indefinida para todos os k "
+                    "(dados constantes ou menos linhas que clusters).", path)
+        return (f"Varredura de k concluída; melhor silhueta com k={best}.", path)
     if "cluster" in q or "agrup" in q:
-        labels, path = eda.cluster_analysis(df, n_clusters=3)
+        labels, path = eda.cluster_analysis(df, n_clusters=3, fingerprint=fingerprint)
         return ("Cluster analysis executada.", path)
     return ("Não entendi a pergunta.", None)
 
+def _job_pergunta_eda(question, df, session, perfilar):
+    with metrics.profiled(perfilar) as perfil, metrics.span("eda.pergunta"):
+        ans, extra = handle_question(question, df)
+    memory.add_memory(question, ans, session=session)
+    return ans, extra, perfil.text
+
+def mostrar_resposta_eda(result):
+    ans, extra, perfil = result
+    mostrar_perfil(perfil)
+    st.write("Resposta:", ans)
+    if extra and isinstance(extra, str) and extra.endswith(".png"):
+        st.image(extra)
+    elif isinstance(extra, pd.DataFrame):
+        st.dataframe(extra)
+
+def impressao_upload(uploaded):
+    """sha1 do CSV enviado, calculado uma vez por arquivo da sessão e não a cada rerun."""
+    chave = (getattr(uploaded, "file_id", None), uploaded.name, uploaded.size)
+    memo = st.session_state.setdefault("eda_upload_fp", {})
+    if chave not in memo:
+        memo.clear()
+        memo[chave] = eda_cache.upload_fingerprint(uploaded)
+    return memo[chave]
+
+def mostrar_histogramas(imgs):
+    for c, path in imgs.items():
+        if path.endswith(".png"):
+            st.image(path, caption=c)
+
+def mostrar_eda(df, key="eda"):
+    """Painel de EDA sobre um DataFrame já carregado (CSV inteiro ou amostra).
+
+    ``key`` diferencia os widgets quando o painel aparece junto do modo streaming.
+    """
+    mostrar_memoria(df)
+    st.write("### Visualização inicial")
+    st.dataframe(df.head())
+    if st.button("Descrição básica", key=f"{key}_desc"):
+        st.dataframe(eda_cache.compute(df, eda.describe_numeric))
+    fingerprint = eda_cache.fingerprint_of(df)
+    if st.button("Histogramas", key=f"{key}_hist"):
+        # em segundo plano: a página segue respondendo e um segundo clique reaproveita o job
+        st.session_state[f"{key}_job_hist"] = jobs.get_manager().submit(
+            "eda", (fingerprint, "hist"), eda.generate_histograms, df,
+            fingerprint=fingerprint, label="Histogramas")
+    acompanhar_job(f"{key}_job_hist", mostrar_histogramas)
+    if st.button("Correlação", key=f"{key}_corr"):
+        corr, path = correlacao(df)
+        st.dataframe(corr)
+        st.image(path)
+    if st.button("Outliers (IQR)", key=f"{key}_outliers"):
+        idxs, details = eda_cache.compute(df, eda.detect_outliers_iqr)
+        st.write(f"{len(idxs)} outliers detectados.")
+        st.dataframe(pd.Series({c: d["count"] for c, d in details.items()}, name="outliers"))
+    if st.checkbox("Agregados por dimensão", key=f"{key}_cubo"):
+        cube = eda_cache.compute(df, nf_cube.build_auto)
+        if cube.dimensions:
+            dim = st.selectbox("Agrupar por", cube.dimensions, key=f"{key}_cubo_dim")
+            medida = st.selectbox("Medida", ["(todas)"] + list(cube.measures), key=f"{key}_cubo_medida")
+            st.dataframe(cube.rollup(dim, None if medida == "(todas)" else medida))
+        else:
+            st.caption("Nenhuma coluna categórica com poucos valores para agrupar.")
+    st.write("---")
+    q = st.text_input("Pergunta em linguagem natural", key=f"{key}_pergunta")
+    if st.button("Perguntar", key=f"{key}_perguntar"):
+        session = st.session_state["memory_session"]
+        st.session_state[f"{key}_job_pergunta"] = jobs.get_manager().submit(
+            "eda", (fingerprint, session, q), _job_pergunta_eda, q, df, session,
+            perfilar_proxima(), label="Pergunta")
+    acompanhar_job(f"{key}_job_pergunta", mostrar_resposta_eda)
+    if st.checkbox("Mostrar memória", key=f"{key}_memoria"):
+        st.write(memory.get_memory(session=st.session_state["memory_session"]))
+
 # ===============================
 # Interface principal
 # ===============================
 st.title("🧠 Agentes Autônomos")
-aba = st.sidebar.radio("Escolha o agente:", ["Notas Fiscais (LLM)", "EDA Genérico"])
+# partição da memória de perguntas por sessão do navegador
+st.session_state.setdefault("memory_session", uuid.uuid4().hex)
+aba = st.sidebar.radio("Escolha o agente:", ["Notas Fiscais (LLM)", "EDA Genérico"], key="aba")
 
 if aba == "Notas Fiscais (LLM)":
+    from utils import engine_registry, llm_cache, nf_agent, nf_cache, nf_catalog
+
     st.header("Agente de Consulta de Notas Fiscais")
     os.makedirs(DATA_DIR, exist_ok=True)
-    uploaded_file = st.file_uploader(f"📦 Upload ZIP ({ZIP_FILENAME})", type="zip")
-    if uploaded_file:
-        zip_path = os.path.join(DATA_DIR, ZIP_FILENAME)
-        with open(zip_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        st.success("ZIP recebido! Tentando descompactar...")
-        if unzip_if_needed():
-            st.experimental_rerun()
-    if os.path.exists(os.path.join(DATA_DIR, CABECALHO_CSV)) and \
-       os.path.exists(os.path.join(DATA_DIR, ITENS_CSV)):
-        cabecalho_df, itens_df = load_data_nf()
-        tabela = st.selectbox("Escolha a tabela:", ["Cabeçalho", "Itens"])
+    uploaded_file = st.file_uploader("📦 Upload ZIP (YYYYMM_NFs.zip, um mês por arquivo)", type="zip")
+    upload_id = uploaded_file and getattr(uploaded_file, "file_id", f"{uploaded_file.name}:{uploaded_file.size}")
+    if uploaded_file and st.session_state.get("nf_upload_id") != upload_id:
+        nome = archive_name(uploaded_file)
+        if nome is None:
+            mes = st.text_input(f"{uploaded_file.name} não segue YYYYMM_NFs*.zip: informe o mês (AAAAMM)",
+                                key="nf_upload_mes")
+            nome = archive_name(uploaded_file, mes)
+            if mes and nome is None:
+                st.warning("Mês inválido: use AAAAMM (ex.: 202402).")
+        if nome is not None:
+            # o uploader mantém o arquivo entre reruns: processa cada upload uma vez só
+            st.session_state["nf_upload_id"] = upload_id
+            if ingest_upload(uploaded_file, nome):
+                st.rerun()
+    if dataset_available():
+        try:
+            cabecalho_df, itens_df = load_data_nf(*filtro_periodo())
+        except ValueError as e:
+            st.warning(str(e))
+            st.stop()
+        if cabecalho_df.attrs.get("partitions"):
+            st.caption(f"Partições consultadas: {', '.join(cabecalho_df.attrs['partitions'])} "
+                       f"({len(cabecalho_df)} notas)")
+        backend = st.radio("Motor de consulta:", BACKENDS, index=BACKENDS.index(NF_BACKEND), horizontal=True,
+                           help="duckdb: o LLM gera SQL sobre Cabeçalho e Itens juntos")
+        tabela = st.selectbox("Escolha a tabela:", ["Cabeçalho", "Itens"], disabled=backend == "duckdb")
         df = cabecalho_df if tabela == "Cabeçalho" else itens_df
         st.write("Colunas disponíveis:", df.columns.tolist())
+        mostrar_memoria(df)
         pergunta = st.text_input("Pergunta sobre os dados")
+        pedido = (pergunta, tabela, backend)
+        if pergunta and st.session_state.get("nf_pedido") != pedido:
+            # o text_input mantém o valor entre reruns: cada pergunta nova vira um job só
+            st.session_state["nf_pedido"] = pedido
+            chave = (df.attrs.get("fingerprint"), itens_df.attrs.get("fingerprint")) + pedido
+            st.session_state["nf_job"] = jobs.get_manager().submit(
+                "llm", chave, _job_pergunta_nf, df, pergunta, tabela, backend, (cabecalho_df, itens_df),
+                perfilar_proxima(), label="Pergunta")
         if pergunta:
-            resp = responder_pergunta_com_agente(df, pergunta)
-            if isinstance(resp, list):
-                st.dataframe(pd.DataFrame(resp))
-            else:
-                st.write(resp)
+            acompanhar_job("nf_job", mostrar_resposta_nf)
+        stats = llm_cache.get_cache().stats()
+        st.caption(f"Cache de respostas: {stats['hits']} hits, {stats['misses']} misses, "
+                   f"{stats['entries']} entradas.")
     else:
         st.info("Faça upload do ZIP para começar.")
 
 elif aba == "EDA Genérico":
+    from utils import eda, eda_cache, eda_stream, nf_cube, nf_router, sampling, schema
+
     st.header("Agente EDA Genérico (qualquer CSV)")
     uploaded = st.sidebar.file_uploader("📂 Upload de CSV", type=["csv", "txt"])
-    if uploaded:
-        df = eda.load_csv(uploaded)
+    size = eda.file_size(uploaded) if uploaded else None
+    if uploaded and size and size > eda.STREAMING_THRESHOLD_BYTES:
+        # Arquivo grande: estatísticas em uma passada, sem carregar o CSV inteiro
+        st.info(f"Arquivo de {size / 1024 ** 2:.0f} MB: modo streaming (quantis aproximados).")
         st.write("### Visualização inicial")
-        st.dataframe(df.head())
+        st.dataframe(eda_stream.head(uploaded))
+        # a passada pelo arquivo é feita uma vez por conteúdo (eda_cache), não a cada clique
+        fingerprint = impressao_upload(uploaded)
         if st.button("Descrição básica"):
-            st.dataframe(eda.describe_numeric(df))
-        if st.button("Histogramas"):
-            imgs = eda.generate_histograms(df)
-            for c, path in imgs.items():
-                if path.endswith(".png"):
-                    st.image(path, caption=c)
+            st.dataframe(eda_cache.stream_stats(uploaded, fingerprint=fingerprint).describe())
         if st.button("Correlação"):
-            corr, path = eda.correlation_matrix(df)
+            corr, path = eda_stream.correlation_matrix(eda_cache.stream_stats(uploaded, fingerprint=fingerprint))
             st.dataframe(corr)
             st.image(path)
-        if st.button("Outliers (IQR)"):
-            idxs, details = eda.detect_outliers_iqr(df)
-            st.write(f"{len(idxs)} outliers detectados.")
-            st.write(details)
-        st.write("---")
-        q = st.text_input("Pergunta em linguagem natural")
-        if st.button("Perguntar"):
-            ans, extra = handle_question(q, df)
-            st.write("Resposta:", ans)
-            if extra and isinstance(extra, str) and extra.endswith(".png"):
-                st.image(extra)
-            memory.add_memory(q, ans)
-        if st.checkbox("Mostrar memória"):
-            st.write(memory.get_memory())
+        st.write("### Amostra de trabalho")
+        colunas = eda_stream.head(uploaded, 0).columns.tolist()
+        with st.form("amostra"):
+            n = st.number_input("Linhas na amostra", min_value=100, value=5000, step=1000)
+            estrato = st.selectbox("Estratificar por", ["(nenhuma)"] + colunas,
+                                   index=colunas.index("Class") + 1 if "Class" in colunas else 0)
+            minimo = st.number_input("Mínimo por estrato", min_value=0, value=250, step=50)
+            seed = st.number_input("Semente", min_value=0, value=42)
+            gerar = st.form_submit_button("Gerar amostra")
+        chave_upload = getattr(uploaded, "file_id", f"{uploaded.name}:{size}")
+        if gerar:
+            # reservatório em uma passada: o CSV nunca é carregado inteiro
+            amostra = sampling.reservoir_sample(
+                uploaded, n=int(n), seed=int(seed), min_per_stratum=int(minimo),
+                stratify=None if estrato == "(nenhuma)" else estrato)
+            amostra, _ = schema.optimize(amostra)
+            st.session_state["eda_amostra"] = (chave_upload, amostra)
+        salvo = st.session_state.get("eda_amostra")
+        if salvo and salvo[0] == chave_upload:
+            amostra = salvo[1]
+            info = amostra.attrs["sampling"]
+            st.caption(f"Amostra de {len(amostra)} de {info['rows']} linhas (semente {info['seed']}).")
+            if len(info["strata"]) > 1:
+                st.dataframe(pd.DataFrame(info["strata"]).T)
+            mostrar_eda(amostra, key="amostra")
+    elif uploaded:
+        # mesmo conteúdo, mesmo DataFrame: reruns e outras sessões não releem o CSV
+        mostrar_eda(eda_cache.load_csv(uploaded, fingerprint=impressao_upload(uploaded)))
+        stats = eda_cache.get_cache().stats()
+        st.sidebar.caption(f"Cache EDA: {stats['entries']} itens, {stats['mb']:.0f} MB, "
+                           f"{stats['hits']} hits, {stats['misses']} misses.")
     else:
         st.info("Envie um CSV para iniciar a análise.")
+
+painel_metricas()
+
+if _pendentes:
+    # polling: o trabalho segue nas threads do utils.jobs; o script só redesenha o progresso
+    time.sleep(POLL_SECONDS)
+    st.rerun()
@@ -1,12 +1,29 @@
+import argparse
+
 import pandas as pd
 
-# Lê o arquivo completo (que você já deve ter em data/creditcard.csv)
-df = pd.read_csv("data/creditcard.csv")
+from utils import sampling
 
-# Cria uma amostra com 5000 linhas aleatórias
-sample = df.sample(n=5000, random_state=42)
+# Lê data/creditcard.csv em blocos (sem carregá-lo inteiro) e gera uma amostra
+# reprodutível; estratificada por Class quando a coluna existe, para que as
+# fraudes (classe rara) não desapareçam da amostra.
+parser = argparse.ArgumentParser(description="Amostra de um CSV grande em uma passada")
+parser.add_argument("entrada", nargs="?", default="data/creditcard.csv")
+parser.add_argument("saida", nargs="?", default="data/creditcard_sample.csv")
+parser.add_argument("-n", type=int, default=5000)
+parser.add_argument("--seed", type=int, default=42)
+parser.add_argument("--estratificar", default="Class", help="coluna de estratificação ('' desliga)")
+parser.add_argument("--minimo", type=int, default=250, help="linhas mínimas por estrato")
+args = parser.parse_args()
 
-# Salva em data/creditcard_sample.csv
-sample.to_csv("data/creditcard_sample.csv", index=False)
+colunas = pd.read_csv(args.entrada, nrows=0).columns
+estrato = args.estratificar if args.estratificar in colunas else None
+sample = sampling.reservoir_sample(args.entrada, n=args.n, seed=args.seed,
+                                   stratify=estrato, min_per_stratum=args.minimo)
+sample.to_csv(args.saida, index=False)
 
-print("✅ Amostra criada em data/creditcard_sample.csv")
+info = sample.attrs["sampling"]
+print(f"✅ Amostra de {len(sample)} de {info['rows']} linhas criada em {args.saida}")
+for valor, s in info["strata"].items():
+    if estrato:
+        print(f"   {estrato}={valor}: {s['sampled']} de {s['seen']}")
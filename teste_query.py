@@ -4,6 +4,7 @@ from llama_index.experimental.query_engine import PandasQueryEngine
 from llama_index.llms.groq import Groq   # AGORA USE GROQ
 import os
 from dotenv import load_dotenv # Importa load_dotenv
+from utils import nf_cache
 
 # Carrega as variáveis de ambiente no início do script
 load_dotenv()
@@ -31,16 +32,11 @@ ITENS_CSV = os.getenv("ITENS_FILE", "202401_NFs_Itens.csv")
 
 # Carregar CSV (recomendado usar o ITENS_CSV por ser mais completo)
 csv_file_path = os.path.join(DATA_DIR, ITENS_CSV)
-df = pd.read_csv(csv_file_path)
 
-# Corrigir nomes das colunas com espaços
-df.columns = df.columns.str.strip()
-
-# Conversão de tipos de dados numéricos (muito importante para cálculos)
+# Leitura via cache colunar compartilhado com o app: nomes de colunas já sem
+# espaços e colunas numéricas já convertidas (muito importante para cálculos)
 numeric_cols = ['VALOR NOTA FISCAL', 'VALOR TOTAL', 'VALOR UNITÁRIO', 'QUANTIDADE']
-for col in numeric_cols:
-    if col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
+df = nf_cache.load_table(csv_file_path, numeric_cols)
 
 print(f"Colunas disponíveis no {csv_file_path}:")
 print(df.columns.tolist())
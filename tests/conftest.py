@@ -0,0 +1,63 @@
+# tests/conftest.py
+"""Fixtures com as tabelas de exemplo de ``data/`` (cache Parquet em diretório temporário).
+
+``catalog`` monta um catálogo de dois meses (202401 e 202402) a partir delas.
+"""
+import os
+import sys
+import zipfile
+
+import pandas as pd
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT, "data")
+CABECALHO_CSV = "202401_NFs_Cabecalho.csv"
+ITENS_CSV = "202401_NFs_Itens.csv"
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from utils import nf_cache, nf_catalog  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def nf_tables(tmp_path_factory):
+    cache_dir = str(tmp_path_factory.mktemp("nf_cache"))
+    return nf_cache.load_nf_tables(DATA_DIR, CABECALHO_CSV, ITENS_CSV, cache_dir=cache_dir)
+
+
+@pytest.fixture(scope="session")
+def cabecalho(nf_tables):
+    return nf_tables[0]
+
+
+@pytest.fixture(scope="session")
+def itens(nf_tables):
+    return nf_tables[1]
+
+
+def write_month(data_dir, mes):
+    """ZIP do mês ``mes`` a partir das tabelas de exemplo (datas e chaves trocadas)."""
+    path = os.path.join(data_dir, f"{mes}_NFs.zip")
+    with zipfile.ZipFile(path, "w") as zf:
+        for name in (CABECALHO_CSV, ITENS_CSV):
+            df = pd.read_csv(os.path.join(DATA_DIR, name), dtype=str)
+            for col in df.columns:
+                if col.startswith("DATA"):
+                    df[col] = df[col].str.replace("2024-01-", f"{mes[:4]}-{mes[4:]}-", regex=False)
+            df["CHAVE DE ACESSO"] = mes + df["CHAVE DE ACESSO"].str[6:]
+            zf.writestr(name.replace("202401", mes), df.to_csv(index=False))
+    return path
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    for mes in ("202401", "202402"):
+        write_month(str(data_dir), mes)
+    cat = nf_catalog.Catalog(str(data_dir), str(tmp_path / "cache"))
+    assert cat.refresh(workers=1) == ["202401_NFs.zip", "202402_NFs.zip"]
+    return cat
@@ -0,0 +1,65 @@
+# tests/test_batch_runner.py
+import asyncio
+import json
+import os
+import time
+
+from conftest import ROOT
+from utils import batch_runner, llm_cache, nf_agent, plan_store
+
+
+def test_load_questions_accepts_known_keys(tmp_path):
+    path = tmp_path / "q.jsonl"
+    linhas = [{"question": "a"}, {"pergunta": "b"}, {"title": "t", "body": "c"}, {"title": "d"}, {"outra": "x"}]
+    path.write_text("\n".join(json.dumps(x) for x in linhas) + "\n\n", encoding="utf-8")
+    assert batch_runner.load_questions(str(path)) == ["a", "b", "c", "d"]
+    assert len(batch_runner.load_questions(os.path.join(ROOT, "perguntas.jsonl"))) == 11
+
+
+def test_run_batch_limits_concurrency_and_keeps_order():
+    ativos, pico = [0], [0]
+
+    async def answer(df, pergunta, tabela):
+        ativos[0] += 1
+        pico[0] = max(pico[0], ativos[0])
+        await asyncio.sleep(0.01)
+        ativos[0] -= 1
+        return f"{pergunta}/{tabela}", "llm", 0.0
+
+    results = asyncio.run(batch_runner.run_batch(["q0", "q1", "q2"], {"A": None, "B": None}, answer, concurrency=2))
+    assert pico[0] == 2
+    assert [r["resposta"] for r in results] == ["q0/A", "q0/B", "q1/A", "q1/B", "q2/A", "q2/B"]
+
+
+def test_token_bucket_rate():
+    async def answer(df, pergunta, tabela):
+        return "", "llm", 0.0
+
+    inicio = time.perf_counter()
+    asyncio.run(batch_runner.run_batch(["q"] * 6, {"A": None}, answer, concurrency=1, rate=20))
+    # 1 de rajada + 5 a 20/s
+    assert time.perf_counter() - inicio >= 0.2
+
+
+def test_batch_with_fake_llm_on_sample(cabecalho, itens, tmp_path):
+    from utils.fake_llm import FakeLLM
+
+    replay = tmp_path / "replay.jsonl"
+    replay.write_text(json.dumps({"question": "Qual nota tem o maior valor em SP?",
+                                  "response": "df['VALOR NOTA FISCAL'].max()"}) + "\n", encoding="utf-8")
+    llm = FakeLLM.from_jsonl(str(replay), latency=0.01)
+    cache = llm_cache.ResponseCache(str(tmp_path / "c.sqlite"))
+    plans = plan_store.PlanStore(str(tmp_path / "p.sqlite"))
+
+    async def answer(df, pergunta, tabela):
+        engine = nf_agent.build_query_engine(df, llm, verbose=False)
+        return await nf_agent.aresponder(df, pergunta, tabela, lambda d, t: engine, cache=cache, plans=plans)
+
+    perguntas = ["Quantas notas existem?", "Qual nota tem o maior valor em SP?"]
+    results = asyncio.run(batch_runner.run_batch(perguntas, {"Cabeçalho": cabecalho}, answer, concurrency=2))
+    assert results[0]["caminho"] in ("cubo", "roteador") and results[0]["resposta"] == "100"
+    assert results[1]["caminho"] == "llm"
+    assert results[1]["resposta"] == str(cabecalho["VALOR NOTA FISCAL"].max())
+    summary = batch_runner.summarize(results, 1.0)
+    assert summary["requests"] == 2 and summary["p50_ms"] <= summary["p99_ms"]
+    assert sum(summary["caminhos"].values()) == 2
@@ -0,0 +1,77 @@
+# tests/test_bench_scale.py
+import json
+
+import pandas as pd
+import pytest
+
+from utils import bench_scale
+
+
+def test_scale_parsing_and_ids():
+    assert [bench_scale.parse_scale(s) for s in ("5k", "300K", "1.5m", "42")] == [5_000, 300_000, 1_500_000, 42]
+    assert [bench_scale.scale_label(n) for n in (5_000, 5_000_000, 1_500)] == ["5k", "5m", "1500"]
+    cases = bench_scale.build_cases([5_000], [30], only=["describe", "nf.agente"])
+    assert [bench_scale.case_id(c) for c in cases] == ["describe_numeric/5kx30", "nf.agente/5k"]
+
+
+def test_eda_frame_is_deterministic():
+    a = bench_scale.eda_frame(500, 8)
+    pd.testing.assert_frame_equal(a, bench_scale.eda_frame(500, 8))
+    assert list(a.columns) == ["Time"] + [f"V{i}" for i in range(1, 7)] + ["Class"]
+    assert not a.equals(bench_scale.eda_frame(500, 8, seed=1))
+
+
+def test_compare_flags_only_real_regressions():
+    baseline = {"results": {
+        "a/5kx30": {"wall_s": 1.0, "rss_peak_mb": 100.0, "alloc_peak_mb": 50.0},
+        "b/5kx30": {"wall_s": 0.01, "rss_peak_mb": 10.0, "alloc_peak_mb": None},
+    }}
+    results = {
+        # +50% no tempo e +30% na RSS (acima de MIN_DELTA); alocação dentro do limiar
+        "a/5kx30": {"wall_s": 1.5, "rss_peak_mb": 130.0, "alloc_peak_mb": 60.0},
+        # dobra, mas a diferença absoluta é ruído; alloc sem base não compara
+        "b/5kx30": {"wall_s": 0.02, "rss_peak_mb": 14.0, "alloc_peak_mb": 5.0},
+        "novo/5kx30": {"wall_s": 9.0, "rss_peak_mb": 1.0, "alloc_peak_mb": 1.0},
+        "c/5kx30": {"erro": "falhou"},
+    }
+    assert bench_scale.compare(results, baseline, threshold=0.25) == [
+        ("a/5kx30", "wall_s", 1.0, 1.5), ("a/5kx30", "rss_peak_mb", 100.0, 130.0)]
+    assert bench_scale.compare(results, baseline, threshold=0.25, metrics=("alloc_peak_mb",)) == []
+    assert bench_scale.compare(results, None) == []
+
+
+def test_save_baseline_merges_and_skips_failures(tmp_path):
+    path = str(tmp_path / "base" / "baseline.json")
+    bench_scale.save_baseline(path, {"a": {"wall_s": 1.0}, "b": {"pulado": "memória insuficiente"}})
+    previous = bench_scale.load_baseline(path)
+    bench_scale.save_baseline(path, {"c": {"wall_s": 2.0}, "a": {"erro": "x"}}, previous)
+    data = bench_scale.load_baseline(path)
+    assert data["results"] == {"a": {"wall_s": 1.0}, "c": {"wall_s": 2.0}}
+    assert data["meta"]["pandas"] == pd.__version__
+    assert bench_scale.load_baseline(str(tmp_path / "nada.json")) is None
+
+
+def test_run_case_measures_eda_op():
+    case = {"op": "describe_numeric", "rows": 2_000, "cols": 6}
+    result = bench_scale.run_case(case, repeat=2)
+    assert result["runs"] == 2
+    assert result["wall_s"] >= result["wall_min_s"] > 0
+    assert result["alloc_peak_mb"] > 0
+
+
+def test_main_exits_on_regression(tmp_path, monkeypatch, capsys):
+    medidas = {"wall_s": 1.0, "wall_min_s": 1.0, "runs": 1, "rss_peak_mb": 10.0, "alloc_peak_mb": 5.0}
+    monkeypatch.setattr(bench_scale, "_child", lambda case, repeat, budget: dict(medidas))
+    baseline = str(tmp_path / "baseline.json")
+    args = ["--scales", "1k", "--widths", "4", "--only", "describe", "--baseline", baseline]
+
+    # sem linha de base: a rodada vira a base
+    bench_scale.main(args)
+    assert json.load(open(baseline, encoding="utf-8"))["results"]["describe_numeric/1kx4"]["wall_s"] == 1.0
+
+    bench_scale.main(args)
+    medidas["wall_s"] = 2.0
+    with pytest.raises(SystemExit) as exc:
+        bench_scale.main(args)
+    assert exc.value.code == 1
+    assert "REGRESSÃO describe_numeric/1kx4 wall_s" in capsys.readouterr().out
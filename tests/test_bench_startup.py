@@ -0,0 +1,28 @@
+# tests/test_bench_startup.py
+import json
+
+import pytest
+
+from utils import bench_startup
+
+PESADOS = ("sklearn", "matplotlib", "llama_index", "duckdb", "utils.nf_engine", "utils.clustering")
+
+_LOADED_CHILD = """
+import importlib, json, sys
+for mod in json.loads(sys.argv[1]):
+    importlib.import_module(mod)
+print(json.dumps(sorted(m for m in json.loads(sys.argv[2]) if m in sys.modules)))
+"""
+
+
+@pytest.mark.parametrize("tab", list(bench_startup.TABS))
+def test_tab_imports_stay_light(tab):
+    # o topo do app e a aba não podem puxar as dependências adiadas para o primeiro uso
+    mods = bench_startup.BASE + bench_startup.TABS[tab]["import"]
+    assert bench_startup._child(_LOADED_CHILD, json.dumps(mods), json.dumps(PESADOS)) == []
+
+
+def test_measure_imports_reports_phases():
+    result = bench_startup.measure_imports("EDA Genérico", repeat=1)
+    assert {"base", "import", "primeiro_uso"} <= result.keys()
+    assert all(result[fase] >= 0 for fase in ("base", "import", "primeiro_uso"))
@@ -0,0 +1,56 @@
+# tests/test_clustering.py
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import DATA_DIR
+from utils import clustering, eda
+
+pytestmark = pytest.mark.filterwarnings("ignore::sklearn.exceptions.ConvergenceWarning")
+
+
+@pytest.fixture(scope="module")
+def creditcard():
+    return pd.read_csv(os.path.join(DATA_DIR, "creditcard_sample.csv"), nrows=1500)
+
+
+def test_sweep_and_best_k(creditcard, tmp_path):
+    scores, path = eda.cluster_sweep(creditcard, k_values=range(2, 5), outdir=str(tmp_path))
+    assert os.path.exists(path)
+    assert list(scores.index) == [2, 3, 4]
+    assert scores["inertia"].is_monotonic_decreasing
+    assert eda.best_k(scores) == scores["silhouette"].idxmax()
+
+
+def test_constant_data_has_no_best_k(tmp_path):
+    df = pd.DataFrame({"a": [1.0] * 30, "b": [5] * 30})
+    scores, _ = eda.cluster_sweep(df, outdir=str(tmp_path))
+    assert scores["silhouette"].isna().all()
+    assert eda.best_k(scores) is None
+
+
+def test_k_above_rows_does_not_break_sweep(tmp_path):
+    df = pd.DataFrame({"a": [1.0, 2.0, 3.0, 4.0], "b": [2, 5, 1, 0]})
+    scores, _ = eda.cluster_sweep(df, k_values=range(2, 7), outdir=str(tmp_path))
+    assert scores.loc[[5, 6]].isna().all().all()
+    assert np.isnan(scores.loc[4, "silhouette"])
+    assert eda.best_k(scores) in (2, 3)
+
+
+def test_cluster_analysis_compact_labels(creditcard, tmp_path):
+    labels, path = eda.cluster_analysis(creditcard, n_clusters=3, outdir=str(tmp_path))
+    assert labels.dtype == np.uint8 and len(labels) == len(creditcard)
+    assert set(np.unique(labels)) <= {0, 1, 2} and os.path.exists(path)
+    # segunda chamada sai do cache em disco
+    again, _ = eda.cluster_analysis(creditcard, n_clusters=3, outdir=str(tmp_path))
+    np.testing.assert_array_equal(labels, again)
+
+
+def test_density_sample_keeps_sparse_points():
+    rng = np.random.default_rng(0)
+    points = np.vstack([rng.normal(0, 0.1, (50_000, 2)), [[10.0, 10.0]]])
+    idx = clustering.density_sample(points, max_points=2_000)
+    assert len(idx) <= 2_500 and len(points) - 1 in idx
+    assert np.all(np.diff(idx) > 0)
@@ -0,0 +1,60 @@
+# tests/test_eda.py
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import DATA_DIR
+from utils import eda
+
+CREDITCARD = os.path.join(DATA_DIR, "creditcard_sample.csv")
+
+
+@pytest.fixture(scope="module")
+def creditcard():
+    return pd.read_csv(CREDITCARD)
+
+
+def _iqr_loop(df, k=1.5):
+    """Versão coluna a coluna (a original, antes da vetorização)."""
+    detail, rows = {}, set()
+    for col in df.select_dtypes(include=[np.number]).columns:
+        s = df[col]
+        q1, q3 = s.quantile(0.25), s.quantile(0.75)
+        iqr = q3 - q1
+        idx = s[(s < q1 - k * iqr) | (s > q3 + k * iqr)].index
+        detail[col] = list(idx)
+        rows.update(idx)
+    return sorted(rows), detail
+
+
+@pytest.mark.parametrize("k", [1.5, 3.0])
+def test_iqr_matches_column_loop(creditcard, k):
+    idxs, detail = eda.detect_outliers_iqr(creditcard, threshold=k)
+    ref_idxs, ref_detail = _iqr_loop(creditcard, k)
+    assert idxs.tolist() == ref_idxs
+    for col, ref in ref_detail.items():
+        assert detail[col]["indices"].tolist() == ref
+        assert detail[col]["count"] == len(ref)
+
+
+def test_mad_method(creditcard):
+    _, detail = eda.detect_outliers_iqr(creditcard, columns=["Amount"], method="mad")
+    s = creditcard["Amount"]
+    med = s.median()
+    z = 0.6745 * (s - med).abs() / (s - med).abs().median()
+    assert detail["Amount"]["indices"].tolist() == list(s.index[z > 3.5])
+    with pytest.raises(ValueError):
+        eda.detect_outliers_iqr(creditcard, method="zscore")
+
+
+def test_bitmap_and_custom_index(creditcard):
+    df = creditcard[["Amount", "V1"]].iloc[::-1].set_axis([f"l{i}" for i in range(len(creditcard))])
+    idxs, detail = eda.detect_outliers_iqr(df)
+    _, packed = eda.detect_outliers_iqr(df, as_bitmap=True)
+    for col in ("Amount", "V1"):
+        mask = np.unpackbits(packed[col]["bitmap"])[:len(df)].astype(bool)
+        assert df.index[mask].tolist() == detail[col]["indices"].tolist()
+        assert packed[col]["count"] == mask.sum()
+    assert idxs.tolist() == sorted(set(detail["Amount"]["indices"]) | set(detail["V1"]["indices"]))
@@ -0,0 +1,74 @@
+# tests/test_eda_cache.py
+import io
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import DATA_DIR
+from utils import eda, eda_cache, eda_stream
+
+CREDITCARD = os.path.join(DATA_DIR, "creditcard_sample.csv")
+
+
+def _upload():
+    with open(CREDITCARD, "rb") as f:
+        return io.BytesIO(f.read())
+
+
+def test_failed_build_releases_the_key():
+    cache = eda_cache.EdaCache()
+
+    def falha():
+        raise RuntimeError("quebrou")
+
+    with pytest.raises(RuntimeError):
+        cache.get(("fp", "x"), falha)
+    resultado = []
+    t = threading.Thread(target=lambda: resultado.append(cache.get(("fp", "x"), lambda: 42)))
+    t.start()
+    t.join(5)
+    assert resultado == [42]
+    assert cache._building == {}
+
+
+def test_build_runs_once_per_key():
+    cache = eda_cache.EdaCache()
+    chamadas = []
+    for _ in range(3):
+        assert cache.get(("fp", "x"), lambda: chamadas.append(1) or "v") == "v"
+    assert len(chamadas) == 1
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+
+
+def test_lru_respects_byte_budget():
+    cache = eda_cache.EdaCache(max_bytes=3 * 8000 + 500)
+    for i in range(5):
+        cache.get(("fp", i), lambda: np.zeros(1000))
+    assert cache.stats()["entries"] == 3
+    assert cache.bytes <= cache.max_bytes
+    cache.discard("fp")
+    assert cache.stats()["entries"] == 0 and cache.bytes == 0
+
+
+def test_load_csv_shared_by_content():
+    cache = eda_cache.EdaCache()
+    a = eda_cache.load_csv(_upload(), cache=cache)
+    b = eda_cache.load_csv(_upload(), cache=cache)
+    assert a is b
+    assert eda_cache.fingerprint_of(a) == eda_cache.upload_fingerprint(CREDITCARD)
+    pd.testing.assert_frame_equal(a, eda.load_csv(CREDITCARD))
+
+
+def test_stream_stats_one_pass_per_content(monkeypatch):
+    cache = eda_cache.EdaCache()
+    passadas = []
+    original = eda_stream.stream_stats
+    monkeypatch.setattr(eda_stream, "stream_stats", lambda f, **kw: passadas.append(1) or original(f, **kw))
+    fingerprint = eda_cache.upload_fingerprint(CREDITCARD)
+    a = eda_cache.stream_stats(_upload(), cache=cache, fingerprint=fingerprint, chunksize=1000)
+    b = eda_cache.stream_stats(_upload(), cache=cache, chunksize=1000)
+    assert a is b and len(passadas) == 1
+    assert eda_cache.sizeof(a) > 100_000
@@ -0,0 +1,72 @@
+# tests/test_eda_stream.py
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import DATA_DIR
+from utils import eda, eda_stream
+
+CREDITCARD = os.path.join(DATA_DIR, "creditcard_sample.csv")
+
+
+@pytest.fixture(scope="module")
+def creditcard():
+    return pd.read_csv(CREDITCARD)
+
+
+@pytest.mark.parametrize("chunksize", [333, 100_000])
+def test_matches_full_load(creditcard, chunksize):
+    stats = eda_stream.stream_stats(CREDITCARD, chunksize=chunksize)
+    desc, ref = stats.describe(), eda.describe_numeric(creditcard)
+    assert list(desc.index) == list(ref.index)
+    for col in ("count", "mean", "std", "min", "max"):
+        np.testing.assert_allclose(desc[col], ref[col], rtol=1e-9)
+    np.testing.assert_allclose(stats.correlation(), creditcard.corr(numeric_only=True), atol=1e-12)
+    # quantis do sketch: erro de rank pequeno
+    for col in ("Amount", "V1"):
+        rank = (creditcard[col] <= desc.loc[col, "50%"]).mean()
+        assert abs(rank - 0.5) < 0.03
+
+
+def _late_csv():
+    i = np.arange(1000)
+    df = pd.DataFrame({
+        "a": i * 1.0,
+        "tardia": np.where(i < 400, np.nan, i % 7),
+        "texto_depois": np.where(i < 600, (i % 5).astype(str), "n/d"),
+        "texto": ["x"] * 1000,
+    })
+    return df, df.to_csv(index=False)
+
+
+def test_late_numeric_and_late_text_columns():
+    df, text = _late_csv()
+    full = pd.read_csv(io.StringIO(text))
+    stats = eda_stream.stream_stats(io.StringIO(text), chunksize=100)
+    desc = stats.describe()
+    # a coluna vazia nos primeiros blocos entra quando aparece; a que vira texto sai, como no read_csv inteiro
+    assert list(desc.index) == list(full.select_dtypes("number").columns) == ["a", "tardia"]
+    assert desc.loc["tardia", "count"] == 600
+    assert desc.loc["tardia", "mean"] == pytest.approx(df["tardia"].mean())
+    assert stats.correlation().loc["a", "tardia"] == pytest.approx(full["a"].corr(full["tardia"]))
+    assert stats.covariance().loc["a", "tardia"] == pytest.approx(full["a"].cov(full["tardia"]))
+
+
+def test_column_that_only_appears_as_text_is_skipped():
+    stats = eda_stream.stream_stats(io.StringIO("x,y\n1,a\n2,b\n"), chunksize=1)
+    assert list(stats.describe().index) == ["x"]
+    assert stats.rows == 2
+
+
+def test_column_null_as_object_in_first_chunk_is_added_later():
+    stats = eda_stream.StreamingStats()
+    stats.update(pd.DataFrame({"a": [1.0, 2.0, 3.0], "b": pd.Series([None, None, None], dtype=object)}))
+    stats.update(pd.DataFrame({"a": [4.0, 5.0], "b": [10.0, 30.0]}))
+    desc = stats.describe()
+    assert list(desc.index) == ["a", "b"]
+    assert desc.loc["b", ["count", "mean", "min", "max"]].tolist() == [2, 20.0, 10.0, 30.0]
+    assert desc.loc["a", "mean"] == 3.0
+    assert stats.correlation().loc["a", "b"] == pytest.approx(1.0)
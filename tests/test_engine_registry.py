@@ -0,0 +1,77 @@
+# tests/test_engine_registry.py
+import threading
+import time
+
+import pytest
+
+from utils import engine_registry, nf_agent
+
+
+def test_builds_once_and_evicts_lru():
+    registry = engine_registry.EngineRegistry(max_engines=2)
+    for key in [("a", "T"), ("b", "T"), ("a", "T"), ("c", "T")]:
+        registry.get(key, lambda key=key: object())
+    assert registry.stats() == {"engines": 2, "builds": 3, "hits": 1}
+    built = []
+    registry.get(("b", "T"), lambda: built.append(1))
+    assert built == [1]  # "b" era o menos usado e saiu
+
+
+def test_concurrent_sessions_share_one_build():
+    registry = engine_registry.EngineRegistry()
+    builds = []
+
+    def build():
+        time.sleep(0.05)
+        builds.append(1)
+        return "engine"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get(("fp", "T"), build))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert results == ["engine"] * 5 and builds == [1]
+
+
+def test_failed_build_is_retried():
+    registry = engine_registry.EngineRegistry()
+
+    def falha():
+        raise RuntimeError("GROQ_API_KEY não configurada.")
+
+    with pytest.raises(RuntimeError):
+        registry.get(("fp", "T"), falha)
+    assert registry._building == {}
+    assert registry.get(("fp", "T"), lambda: "engine") == "engine"
+
+
+def test_discard_one_dataset():
+    registry = engine_registry.EngineRegistry()
+    for key in [("jan", "Cabeçalho"), ("jan", "Itens"), ("fev", "Itens")]:
+        registry.get(key, object)
+    registry.discard("jan")
+    assert registry.stats()["engines"] == 1
+    registry.discard()
+    assert registry.stats()["engines"] == 0
+
+
+def test_query_engine_keyed_by_fingerprint_and_table(cabecalho, itens):
+    from utils.fake_llm import FakeLLM
+
+    registry = engine_registry.EngineRegistry()
+    llms = []
+
+    def get_llm():
+        llms.append(FakeLLM())
+        return llms[-1]
+
+    a = nf_agent.get_query_engine(cabecalho, "Cabeçalho", get_llm, registry, verbose=False)
+    assert nf_agent.get_query_engine(cabecalho, "Cabeçalho", get_llm, registry, verbose=False) is a
+    assert nf_agent.get_query_engine(itens, "Itens", get_llm, registry, verbose=False) is not a
+    assert len(llms) == 2
+    sem_fp = cabecalho.copy(deep=False)
+    sem_fp.attrs = {}
+    nf_agent.get_query_engine(sem_fp, "Cabeçalho", get_llm, registry, verbose=False)
+    assert registry.stats()["engines"] == 2 and len(llms) == 3
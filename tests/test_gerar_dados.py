@@ -0,0 +1,90 @@
+# tests/test_gerar_dados.py
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import DATA_DIR
+from utils import gerar_dados
+
+
+@pytest.fixture(scope="module")
+def pools():
+    return gerar_dados.build_pools(seed=7, emitentes=200, destinatarios=500, produtos=400,
+                                   amostra_dir=DATA_DIR, use_faker=False)
+
+
+def _ler_zip(path, mes):
+    with zipfile.ZipFile(path) as zf:
+        with zf.open(f"{mes}_NFs_Cabecalho.csv") as f:
+            cab = pd.read_csv(f, dtype=str)
+        with zf.open(f"{mes}_NFs_Itens.csv") as f:
+            itens = pd.read_csv(f, dtype=str)
+    return cab, itens
+
+
+def test_build_pools_is_deterministic(pools):
+    again = gerar_dados.build_pools(seed=7, emitentes=200, destinatarios=500, produtos=400,
+                                    amostra_dir=DATA_DIR, use_faker=False)
+    assert pools.keys() == again.keys()
+    for key in pools:
+        np.testing.assert_array_equal(pools[key], again[key], err_msg=key)
+
+
+def test_bloco_same_seed_same_rows_and_schema(pools):
+    seed = np.random.SeedSequence(1).spawn(1)[0]
+    cab, itens = gerar_dados.gerar_bloco(pools, 300, seed, "202402")
+    cab2, itens2 = gerar_dados.gerar_bloco(pools, 300, seed, "202402")
+    pd.testing.assert_frame_equal(cab, cab2)
+    pd.testing.assert_frame_equal(itens, itens2)
+    assert list(cab.columns) == gerar_dados.CABECALHO_COLUMNS
+    assert list(itens.columns) == gerar_dados.ITENS_COLUMNS
+
+    outro, _ = gerar_dados.gerar_bloco(pools, 300, np.random.SeedSequence(2).spawn(1)[0], "202402")
+    assert not cab["CHAVE DE ACESSO"].equals(outro["CHAVE DE ACESSO"])
+
+
+def test_bloco_invariants(pools):
+    cab, itens = gerar_dados.gerar_bloco(pools, 500, np.random.SeedSequence(3), "202402")
+    chaves = cab["CHAVE DE ACESSO"]
+    assert chaves.str.fullmatch(r"\d{44}").all()
+    assert chaves.str[2:6].eq("2402").all()
+    assert pd.to_datetime(cab["DATA EMISSÃO"]).dt.strftime("%Y%m").eq("202402").all()
+    assert set(itens["CHAVE DE ACESSO"]) == set(chaves)
+    soma = itens.groupby("CHAVE DE ACESSO", sort=False)["VALOR TOTAL"].sum()
+    np.testing.assert_allclose(cab.set_index("CHAVE DE ACESSO")["VALOR NOTA FISCAL"].loc[soma.index],
+                               soma.round(2), atol=0.011)
+
+
+def test_chave_dv_modulo_11():
+    chave = gerar_dados.chaves_de_acesso(np.array([35]), 2401, np.array([12345678000195]),
+                                         np.array([1]), np.array([123]), np.array([87654321]))[0]
+    corpo = [int(c) for c in chave[:43]]
+    pesos = list(np.resize(np.arange(2, 10), 43)[::-1])
+    resto = sum(d * p for d, p in zip(corpo, pesos)) % 11
+    assert int(chave[43]) == (0 if resto < 2 else 11 - resto)
+    assert chave.startswith("352401")
+
+
+def test_gerar_independe_de_workers(tmp_path, pools):
+    # cada bloco tem sua semente (SeedSequence.spawn): 1 ou 2 workers geram o mesmo arquivo
+    serial = gerar_dados.gerar(450, mes="202403", saida=str(tmp_path / "serial"), seed=11,
+                               workers=1, chunk=200, pools=pools)
+    paralelo = gerar_dados.gerar(450, mes="202403", saida=str(tmp_path / "paralelo"), seed=11,
+                                 workers=2, chunk=200, pools=pools)
+    cab, itens = _ler_zip(serial, "202403")
+    cab2, itens2 = _ler_zip(paralelo, "202403")
+    assert len(cab) == 450
+    pd.testing.assert_frame_equal(cab, cab2)
+    pd.testing.assert_frame_equal(itens, itens2)
+    assert not [p for p in os.listdir(tmp_path / "serial") if p.startswith("nf_gen_")]
+
+
+def test_gerar_parquet_partes(tmp_path, pools):
+    destino = gerar_dados.gerar(250, mes="202401", formato="parquet", saida=str(tmp_path),
+                                seed=5, workers=1, chunk=100, pools=pools)
+    pasta = os.path.join(destino, "202401_NFs_Cabecalho")
+    assert sorted(os.listdir(pasta)) == [f"part-{i:05d}.parquet" for i in range(3)]
+    assert len(pd.read_parquet(pasta)) == 250
@@ -0,0 +1,79 @@
+# tests/test_jobs.py
+import threading
+import time
+
+import pytest
+
+from utils import jobs
+
+
+def _wait(manager, job_id, timeout=10):
+    limite = time.time() + timeout
+    while manager.get(job_id).status not in jobs.FINISHED:
+        assert time.time() < limite, "job não terminou"
+        time.sleep(0.01)
+    return manager.get(job_id)
+
+
+@pytest.fixture
+def manager():
+    m = jobs.JobManager(max_workers=2, limits={"llm": 1, "eda": 1})
+    yield m
+    m.shutdown()
+
+
+def test_queued_kind_does_not_hold_pool_threads(manager):
+    liberar = threading.Event()
+    llm = [manager.submit("llm", None, liberar.wait, 10) for _ in range(3)]
+    eda = manager.submit("eda", None, lambda: "pronto")
+    # com duas threads e "llm=1", a fila do LLM não pode segurar a thread do EDA
+    assert _wait(manager, eda, timeout=5).result == "pronto"
+    assert [manager.get(i).status for i in llm] == [jobs.RUNNING, jobs.QUEUED, jobs.QUEUED]
+    liberar.set()
+    assert all(_wait(manager, i).status == jobs.DONE for i in llm)
+
+
+def test_cancel_queued_job_finishes_at_once(manager):
+    liberar = threading.Event()
+    primeiro = manager.submit("llm", None, liberar.wait, 10)
+    fila = manager.submit("llm", None, lambda: "não roda")
+    assert manager.cancel(fila)
+    assert manager.get(fila).status == jobs.CANCELLED
+    liberar.set()
+    assert _wait(manager, primeiro).status == jobs.DONE
+    assert manager.get(fila).result is None
+
+
+def test_cancel_running_job(manager):
+    iniciou, liberar = threading.Event(), threading.Event()
+
+    def longo():
+        iniciou.set()
+        liberar.wait(10)
+        jobs.check_cancelled()
+        return "não publicado"
+
+    job_id = manager.submit("eda", None, longo)
+    iniciou.wait(5)
+    manager.cancel(job_id)
+    liberar.set()
+    assert _wait(manager, job_id).status == jobs.CANCELLED
+
+
+def test_result_of_job_cancelled_mid_call_is_discarded(manager):
+    iniciou, liberar = threading.Event(), threading.Event()
+    job_id = manager.submit("eda", None, lambda: iniciou.set() or liberar.wait(10) and "resultado")
+    iniciou.wait(5)
+    manager.cancel(job_id)
+    liberar.set()
+    job = _wait(manager, job_id)
+    assert job.status == jobs.CANCELLED and job.result is None
+
+
+def test_same_key_reuses_job_and_stats_count_states(manager):
+    liberar = threading.Event()
+    a = manager.submit("llm", "k", liberar.wait, 10)
+    assert manager.submit("llm", "k", liberar.wait, 10) == a
+    liberar.set()
+    _wait(manager, a)
+    assert manager.stats() == {jobs.DONE: 1}
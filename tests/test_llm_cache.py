@@ -0,0 +1,67 @@
+# tests/test_llm_cache.py
+import time
+
+import pytest
+
+from utils import llm_cache, nf_agent
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return llm_cache.ResponseCache(str(tmp_path / "llm.sqlite"))
+
+
+def test_key_ignores_case_accents_spaces_and_final_punctuation():
+    a = llm_cache.make_key("fp", "Cabeçalho", "Qual é o VALOR  total?")
+    assert a == llm_cache.make_key("fp", "Cabeçalho", "qual e o valor total")
+    assert a != llm_cache.make_key("fp", "Itens", "qual e o valor total")
+    assert a != llm_cache.make_key("outro", "Cabeçalho", "qual e o valor total")
+    assert a != llm_cache.make_key("fp", "Cabeçalho", "qual e o valor médio")
+
+
+def test_persists_across_instances(cache):
+    cache.put("fp", "Itens", "Top 2?", "df.head(2)", [{"a": 1}, {"a": 2}])
+    again = llm_cache.ResponseCache(cache.path)
+    assert again.get("fp", "Itens", "top 2") == {"code": "df.head(2)", "answer": [{"a": 1}, {"a": 2}]}
+    assert again.stats()["hits"] == 1 and again.stats()["entries"] == 1
+
+
+def test_ttl_expires_entries(tmp_path):
+    cache = llm_cache.ResponseCache(str(tmp_path / "ttl.sqlite"), ttl=0.05)
+    cache.put("fp", "Itens", "q", None, "42")
+    assert cache.get("fp", "Itens", "q") is not None
+    time.sleep(0.1)
+    assert cache.get("fp", "Itens", "q") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_evicts_least_recently_accessed(tmp_path):
+    cache = llm_cache.ResponseCache(str(tmp_path / "lru.sqlite"), max_entries=2)
+    cache.put("fp", "T", "a", None, "1")
+    cache.put("fp", "T", "b", None, "2")
+    cache.get("fp", "T", "a")
+    cache.put("fp", "T", "c", None, "3")
+    assert cache.get("fp", "T", "b") is None
+    assert cache.get("fp", "T", "a")["answer"] == "1" and cache.get("fp", "T", "c")["answer"] == "3"
+
+
+def test_invalidate_one_dataset(cache):
+    cache.put("jan", "T", "q", None, "1")
+    cache.put("fev", "T", "q", None, "2")
+    cache.invalidate("jan")
+    assert cache.get("jan", "T", "q") is None and cache.get("fev", "T", "q")["answer"] == "2"
+    cache.invalidate()
+    assert cache.stats()["entries"] == 0
+
+
+def test_agent_answers_repeated_question_from_cache(cabecalho, cache):
+    from utils.fake_llm import FakeLLM
+
+    llm = FakeLLM(default_response="df['VALOR NOTA FISCAL'].max()")
+    engine = nf_agent.build_query_engine(cabecalho, llm, verbose=False)
+    pergunta = "Qual nota tem o maior valor em SP?"
+    primeira = nf_agent.responder(cabecalho, pergunta, "Cabeçalho", lambda df, t: engine, cache=cache, plans=False)
+    segunda = nf_agent.responder(cabecalho, pergunta.upper(), "Cabeçalho", lambda df, t: engine,
+                                 cache=cache, plans=False)
+    assert (primeira[1], segunda[1]) == ("llm", "cache")
+    assert primeira[0] == segunda[0] and llm.calls == 1
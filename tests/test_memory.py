@@ -0,0 +1,63 @@
+# tests/test_memory.py
+import json
+import sqlite3
+import threading
+
+from utils import memory
+
+
+def _count(path):
+    with sqlite3.connect(memory._db_path(path)) as conn:
+        return conn.execute("SELECT COUNT(*) FROM qa").fetchone()[0]
+
+
+def test_recent_entries_per_session(tmp_path):
+    path = str(tmp_path / "mem.db")
+    for i in range(5):
+        memory.add_memory(f"q{i}", f"r{i}", path=path, session="a" if i % 2 else "b")
+    memory.add_memory("tabela", {"x": 1}, path=path, session="a")
+    assert [e["question"] for e in memory.get_memory(path, limit=2, session="a")] == ["q3", "tabela"]
+    assert memory.get_memory(path, session="a")[-1]["answer"] == "{'x': 1}"
+    assert [e["question"] for e in memory.get_memory(path, session="b")] == ["q0", "q2", "q4"]
+    assert len(memory.get_memory(path)) == 6
+
+
+def test_concurrent_writers_lose_nothing(tmp_path):
+    path = str(tmp_path / "mem.db")
+
+    def writer(n):
+        for i in range(50):
+            memory.add_memory(f"{n}-{i}", "ok", path=path, session=str(n))
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(30)
+    assert _count(path) == 300
+    assert [e["question"] for e in memory.get_memory(path, limit=3, session="2")] == ["2-47", "2-48", "2-49"]
+
+
+def test_compact_applies_retention(tmp_path):
+    path = str(tmp_path / "mem.db")
+    memory.init_memory(path)
+    with sqlite3.connect(path) as conn:
+        conn.execute("INSERT INTO qa (session, question, answer, timestamp) VALUES "
+                     "('a', 'velha', 'r', '2000-01-01T00:00:00Z')")
+    for i in range(5):
+        memory.add_memory(f"q{i}", "r", path=path, session="a")
+        memory.add_memory(f"q{i}", "r", path=path, session="b")
+    memory.compact(path, max_age_days=30, max_per_session=3)
+    assert [e["question"] for e in memory.get_memory(path, session="a")] == ["q2", "q3", "q4"]
+    assert _count(path) == 6
+
+
+def test_legacy_json_is_imported_once(tmp_path):
+    legacy = tmp_path / "memory.json"
+    legacy.write_text(json.dumps({"qa": [{"question": "antiga", "answer": "sim", "timestamp": "2024-01-01T00:00:00Z"}]}),
+                      encoding="utf-8")
+    path = str(legacy)
+    assert memory.get_memory(path)[0]["question"] == "antiga"
+    memory.add_memory("nova", "r", path=path)
+    memory._initialized.discard(path)
+    assert [e["question"] for e in memory.get_memory(path)] == ["antiga", "nova"]
@@ -0,0 +1,84 @@
+# tests/test_metrics.py
+import json
+
+import pytest
+
+from utils import metrics
+
+
+@pytest.fixture(autouse=True)
+def limpo(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_nested_spans_form_one_trace():
+    with metrics.span("nf.pergunta", aba="nf"):
+        with metrics.span("nf.llm"):
+            pass
+        metrics.annotate(caminho="llm")
+    traces = metrics.recent_traces()
+    assert len(traces) == 1
+    trace = traces[0]
+    assert trace["name"] == "nf.pergunta"
+    assert trace["attrs"] == {"caminho": "llm"}
+    assert [(s["name"], s["depth"]) for s in trace["spans"]] == [("nf.pergunta", 0), ("nf.llm", 1)]
+    assert trace["spans"][0]["attrs"] == {"aba": "nf"}
+    assert "t0" not in trace and "depth" not in trace
+
+
+def test_error_is_counted_and_reraised():
+    with pytest.raises(ValueError):
+        with metrics.span("eda.carga"):
+            raise ValueError("x")
+    [row] = metrics.summary()
+    assert (row["etapa"], row["chamadas"], row["erros"]) == ("eda.carga", 1, 1)
+    assert metrics.recent_traces()[0]["spans"][0]["error"] == "ValueError"
+
+
+def test_prometheus_buckets_are_cumulative():
+    for seconds in (0.001, 0.2, 0.2, 100.0):
+        metrics.observe('nf."sql"', seconds)
+    metrics.inc("cache_hits", 3)
+    text = metrics.prometheus_text()
+    stage = 'stage="nf.\\"sql\\""'
+    assert f'app_stage_duration_seconds_bucket{{{stage},le="0.005"}} 1' in text
+    assert f'app_stage_duration_seconds_bucket{{{stage},le="0.25"}} 3' in text
+    assert f'app_stage_duration_seconds_bucket{{{stage},le="60.0"}} 3' in text
+    assert f'app_stage_duration_seconds_bucket{{{stage},le="+Inf"}} 4' in text
+    assert f"app_stage_duration_seconds_count{{{stage}}} 4" in text
+    assert "app_cache_hits_total 3.0" in text
+    assert text.endswith("\n")
+
+
+def test_export_writes_both_formats(tmp_path):
+    with metrics.span("eda.histograma"):
+        pass
+    prom = metrics.export("prometheus", str(tmp_path / "m.prom"))
+    jsonl = metrics.export("jsonl", str(tmp_path / "sub" / "t.jsonl"))
+    assert "app_stage_duration_seconds_count" in open(prom, encoding="utf-8").read()
+    linhas = open(jsonl, encoding="utf-8").read().splitlines()
+    assert [json.loads(linha)["name"] for linha in linhas] == ["eda.histograma"]
+    assert not list(tmp_path.rglob("*.tmp"))
+
+
+def test_disabled_records_nothing(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+
+    @metrics.timed("nf.llm")
+    def f():
+        return 1
+
+    assert f() == 1
+    metrics.inc("x")
+    assert metrics.summary() == [] and metrics.recent_traces() == []
+
+
+def test_profiled_captures_stats():
+    with metrics.span("nf.pergunta"):
+        with metrics.profiled() as result:
+            sum(range(1000))
+    assert "cumulative" in result.text
+    assert metrics.recent_traces()[0]["attrs"] == {"profile": True}
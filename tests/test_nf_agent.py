@@ -0,0 +1,64 @@
+# tests/test_nf_agent.py
+from utils import nf_agent
+
+
+def _sem_chave(df, tabela):
+    raise RuntimeError("GROQ_API_KEY não configurada.")
+
+
+def test_local_paths_answer_without_llm_key(cabecalho):
+    resp, caminho, _ = nf_agent.responder(cabecalho, "Quantas notas têm 'UF EMITENTE' igual a 'SP'?",
+                                          "Cabeçalho", _sem_chave, cache=False, plans=False)
+    assert (resp, caminho) == ("26", "roteador")
+
+
+def test_missing_key_is_reported_only_on_llm_path(cabecalho):
+    resp, caminho, _ = nf_agent.responder(cabecalho, "Quantas notas foram emitidas em SP?",
+                                          "Cabeçalho", _sem_chave, cache=False, plans=False)
+    assert caminho == "erro" and "GROQ_API_KEY" in resp
+
+
+def test_llm_code_runs_in_job_thread(cabecalho):
+    from utils import jobs
+    from utils.fake_llm import FakeLLM
+
+    llm = FakeLLM(default_response="df['VALOR NOTA FISCAL'].max()")
+    engine = nf_agent.build_query_engine(cabecalho, llm, verbose=False)
+    manager = jobs.JobManager(max_workers=1)
+    try:
+        job_id = manager.submit("llm", None, nf_agent.responder, cabecalho, "Qual nota tem o maior valor em SP?",
+                                "Cabeçalho", lambda df, tabela: engine, cache=False, plans=False)
+        manager.get(job_id).future.result(timeout=60)
+        resp, caminho, _ = manager.get(job_id).result
+    finally:
+        manager.shutdown()
+    assert caminho == "llm"
+    assert resp == str(cabecalho["VALOR NOTA FISCAL"].max())
+
+
+def test_cancelled_llm_question_is_not_cached(cabecalho, tmp_path):
+    import threading
+
+    from utils import jobs, llm_cache
+
+    iniciou, liberar = threading.Event(), threading.Event()
+
+    class Engine:
+        def query(self, pergunta):
+            iniciou.set()
+            liberar.wait(10)
+            raise AssertionError("resposta não deveria ser usada")
+
+    cache = llm_cache.ResponseCache(str(tmp_path / "cache.sqlite"))
+    manager = jobs.JobManager(max_workers=1)
+    try:
+        job_id = manager.submit("llm", None, nf_agent.responder, cabecalho, "Qual nota tem o maior valor em SP?",
+                                "Cabeçalho", lambda df, tabela: Engine(), cache=cache, plans=False)
+        iniciou.wait(5)
+        manager.cancel(job_id)
+        liberar.set()
+        manager.get(job_id).future.result(timeout=10)
+    finally:
+        manager.shutdown()
+    assert manager.get(job_id).status == jobs.CANCELLED
+    assert cache.stats()["entries"] == 0
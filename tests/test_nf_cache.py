@@ -0,0 +1,70 @@
+# tests/test_nf_cache.py
+import os
+import zipfile
+
+import pandas as pd
+import pytest
+
+from conftest import CABECALHO_CSV, DATA_DIR, ITENS_CSV
+from utils import nf_cache
+
+
+@pytest.fixture
+def sample_zip(tmp_path):
+    path = tmp_path / "202401_NFs.zip"
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name in (CABECALHO_CSV, ITENS_CSV):
+            zf.write(os.path.join(DATA_DIR, name), name)
+    return str(path)
+
+
+def test_zip_ingest_does_not_depend_on_chunk_size(tmp_path, sample_zip):
+    small = nf_cache.load_zip_tables(sample_zip, str(tmp_path / "a"), chunksize=7)
+    whole = nf_cache.load_zip_tables(sample_zip, str(tmp_path / "b"), chunksize=100000)
+    for a, b in zip(small, whole):
+        pd.testing.assert_frame_equal(a, b)
+    assert len(small[0]) == 100 and len(small[1]) == 565
+    assert small[1]["CHAVE DE ACESSO"].nunique() == 100
+
+
+def test_zip_ingest_matches_csv_tables(tmp_path, sample_zip, cabecalho, itens):
+    zcab, zitens = nf_cache.load_zip_tables(sample_zip, str(tmp_path), chunksize=50)
+    assert list(zcab.columns) == list(cabecalho.columns)
+    assert zcab["VALOR NOTA FISCAL"].sum() == pytest.approx(cabecalho["VALOR NOTA FISCAL"].sum())
+    assert zitens["QUANTIDADE"].sum() == pytest.approx(itens["QUANTIDADE"].sum())
+
+
+def test_numeric_decided_over_all_chunks(tmp_path):
+    rows = [f"{i},{i},{i * 2}" for i in range(30)] + ["30,X,60"]
+    path = tmp_path / "202401_NFs.zip"
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("202401_NFs_Cabecalho.csv", "CHAVE DE ACESSO,CODIGO,NUMERO\n" + "\n".join(rows))
+        zf.writestr("202401_NFs_Itens.csv", "CHAVE DE ACESSO,QUANTIDADE\n1,2\n")
+    cab, _ = nf_cache.load_zip_tables(str(path), str(tmp_path / "cache"), chunksize=10)
+    # "X" só aparece no último bloco: a coluna continua texto
+    assert not pd.api.types.is_numeric_dtype(cab["CODIGO"])
+    assert pd.api.types.is_integer_dtype(cab["NUMERO"]) and cab["NUMERO"].sum() == 930
+
+
+def test_cache_reused_and_scratch_files_removed(tmp_path, sample_zip, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    first = nf_cache.load_zip_tables(sample_zip, str(cache_dir))
+    assert all(f.endswith((".parquet", ".json")) for f in os.listdir(cache_dir))
+
+    def boom(*args, **kwargs):
+        raise AssertionError("não devia reprocessar")
+
+    monkeypatch.setattr(nf_cache, "_ingest_member", boom)
+    again = nf_cache.load_zip_tables(sample_zip, str(cache_dir))
+    pd.testing.assert_frame_equal(first[1], again[1])
+
+
+def test_failed_typing_leaves_no_files(tmp_path, sample_zip, monkeypatch):
+    def boom(*args, **kwargs):
+        raise RuntimeError("falha na tipagem")
+
+    monkeypatch.setattr(nf_cache, "_typed_frame", boom)
+    cache_dir = tmp_path / "cache"
+    with pytest.raises(RuntimeError):
+        nf_cache.load_zip_tables(sample_zip, str(cache_dir))
+    assert os.listdir(cache_dir) == []
@@ -0,0 +1,56 @@
+# tests/test_nf_catalog.py
+import pandas as pd
+import pytest
+
+from conftest import write_month
+from utils import nf_cube
+
+
+def test_prune_by_date_and_uf(catalog):
+    assert catalog.prune() == ["202401_NFs.zip", "202402_NFs.zip"]
+    assert catalog.prune(inicio="2024-02-01") == ["202402_NFs.zip"]
+    assert catalog.prune(fim="2024-01-31") == ["202401_NFs.zip"]
+    assert catalog.prune(ufs=["XX"]) == []
+    with pytest.raises(ValueError):
+        catalog.load(ufs=["XX"])
+
+
+def test_load_filters_rows(catalog):
+    cab, itens = catalog.load()
+    assert len(cab) == 200 and itens["CHAVE DE ACESSO"].nunique() == 200
+    cab, itens = catalog.load(inicio="2024-02-01", ufs=["SP"])
+    assert cab.attrs["partitions"] == ["202402_NFs.zip"]
+    assert len(cab) > 0 and pd.to_datetime(cab["DATA EMISSÃO"]).min() >= pd.Timestamp("2024-02-01")
+    assert ((cab["UF EMITENTE"] == "SP") | (cab["UF DESTINATÁRIO"] == "SP")).all()
+
+
+def test_new_month_ingests_only_itself(catalog, monkeypatch):
+    ingested = []
+    original = catalog._ingest
+    monkeypatch.setattr(catalog, "_ingest", lambda pid, src: ingested.append(pid) or original(pid, src))
+    assert catalog.refresh(workers=1) == []
+    write_month(catalog.data_dir, "202403")
+    assert catalog.refresh(workers=1) == ["202403_NFs.zip"]
+    assert ingested == ["202403_NFs.zip"]
+    cab_cube, _ = catalog.cubes()
+    assert cab_cube.route("Quantas notas existem?").answer == "300"
+
+
+def test_fingerprints_of_a_month(catalog):
+    jan = catalog.load(ids=["202401_NFs.zip"])
+    both = catalog.load()
+    fev = catalog.load(inicio="2024-02-01")
+    found = set(catalog.fingerprints("202401_NFs.zip"))
+    assert {jan[0].attrs["fingerprint"], both[0].attrs["fingerprint"], both[1].attrs["fingerprint"]} <= found
+    assert fev[0].attrs["fingerprint"] not in found
+
+
+def test_cube_attached_to_whole_frames_and_detached_on_eviction(catalog):
+    cab, _ = catalog.load()
+    assert nf_cube.for_frame(cab).route("Quantas notas existem?").answer == "200"
+    filtered, _ = catalog.load(ufs=["SP"])
+    assert nf_cube.for_frame(filtered) is None
+    for fim in ("2024-01-20", "2024-02-10", "2024-02-20"):
+        catalog.load(fim=fim)
+    # a combinação sem filtro saiu do LRU do catálogo: o cubo dela foi esquecido
+    assert nf_cube.for_frame(cab) is None
@@ -0,0 +1,95 @@
+# tests/test_nf_cube.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import nf_cube, nf_router
+
+QUESTIONS = [
+    "Quantas notas existem?",
+    "Quantas linhas tem a tabela?",
+    "Quantas notas têm 'UF EMITENTE' igual a 'SP'?",
+    "Quantas notas têm 'RAZÃO SOCIAL EMITENTE' contendo 'CORREIOS'?",
+    "Quantas 'UF EMITENTE' distintas existem?",
+    "Quais os 3 'UF EMITENTE' mais frequentes?",
+    "Quais são as 3 'DESCRIÇÃO DO PRODUTO/SERVIÇO' mais frequentes e suas respectivas contagens?",
+    "Quais são as 5 'RAZÃO SOCIAL EMITENTE' que mais emitiram notas, listando-as com suas contagens?",
+    "Quais os 5 'RAZÃO SOCIAL EMITENTE' que mais emitiram notas com 'UF EMITENTE' igual a 'SP'?",
+    "Top 3 'UF EMITENTE' em soma de 'VALOR TOTAL'",
+    "Top 5 'RAZÃO SOCIAL EMITENTE' em soma do 'VALOR NOTA FISCAL' com 'UF EMITENTE' igual a 'SP'",
+    "Qual é a média do 'VALOR NOTA FISCAL' no DataFrame?",
+    "Qual é o valor máximo de 'VALOR NOTA FISCAL' com 'UF EMITENTE' igual a 'RJ'?",
+    "Qual é a soma total dos valores da coluna 'VALOR TOTAL' dos itens?",
+    "Qual é o valor mínimo de 'QUANTIDADE'?",
+    "Quantas notas foram emitidas em SP?",
+    "média de VALOR NOTA FISCAL por UF EMITENTE",
+]
+
+
+@pytest.fixture(scope="module", params=["Cabeçalho", "Itens"])
+def tabela(request, cabecalho, itens):
+    df = cabecalho if request.param == "Cabeçalho" else itens
+    return request.param, df, nf_cube.build(df)
+
+
+@pytest.mark.parametrize("question", QUESTIONS)
+def test_cube_matches_router(tabela, question):
+    nome, df, cube = tabela
+    routed = nf_router.route(question, df, nome)
+    cubed = cube.route(question, nome)
+    if cubed is None:
+        return  # fora do cubo: o agente segue para o roteador
+    assert routed is not None and cubed.intent == routed.intent
+    if isinstance(routed.answer, list):
+        assert len(cubed.answer) == len(routed.answer)
+        for got, want in zip(cubed.answer, routed.answer):
+            assert got.keys() == want.keys()
+            assert all(got[k] == pytest.approx(want[k]) for k in want)
+    else:
+        assert cubed.answer == routed.answer
+
+
+def test_cube_answers_constrained_questions_like_router(tabela):
+    nome, _, cube = tabela
+    assert cube.route("Quantas notas foram emitidas em SP?", nome) is None
+    assert cube.route("Quantas notas com valor acima de 5000?", nome) is None
+
+
+def test_top_notes_on_itens_from_cube(itens):
+    cube = nf_cube.build(itens)
+    answer = cube.route("Quais são as 5 'RAZÃO SOCIAL EMITENTE' que mais emitiram notas?", "Itens").answer
+    assert answer[0]["contagem"] == 7
+
+
+def test_merge_of_partitions_equals_full_build(itens):
+    keys = itens[nf_router.KEY_COLUMN].unique()
+    half = itens[nf_router.KEY_COLUMN].isin(keys[: len(keys) // 2])
+    merged = nf_cube.merge([nf_cube.build(itens[half]), nf_cube.build(itens[~half])])
+    full = nf_cube.build(itens)
+    by = "UF EMITENTE"
+    pd.testing.assert_series_equal(merged.lookup("VALOR TOTAL", "soma", by).sort_index(),
+                                   full.lookup("VALOR TOTAL", "soma", by).sort_index())
+    assert merged.lookup(agg="notas") == full.lookup(agg="notas") == len(keys)
+
+
+def test_hll_estimate_error():
+    keys = pd.Series(np.arange(20000).astype(str))
+    registers = nf_cube._hll_registers(keys, np.zeros(len(keys), dtype=np.int64), 1)
+    assert nf_cube.hll_estimate(registers)[0] == pytest.approx(20000, rel=0.2)
+
+
+def test_save_and_load(tmp_path, cabecalho):
+    cube = nf_cube.build(cabecalho)
+    loaded = nf_cube.Cube.load(cube.save(str(tmp_path / "cubo.pkl")))
+    question = "Quais os 3 'UF EMITENTE' mais frequentes?"
+    assert loaded.route(question).answer == cube.route(question).answer
+
+
+def test_sources_are_bounded_and_detachable(monkeypatch):
+    monkeypatch.setattr(nf_cube, "_sources", nf_cube.OrderedDict())
+    for i in range(nf_cube.MAX_SOURCES + 5):
+        nf_cube.attach(f"fp{i}", lambda: None)
+    assert len(nf_cube._sources) == nf_cube.MAX_SOURCES
+    assert "fp0" not in nf_cube._sources
+    nf_cube.detach(f"fp{nf_cube.MAX_SOURCES}")
+    assert f"fp{nf_cube.MAX_SOURCES}" not in nf_cube._sources
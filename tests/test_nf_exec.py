@@ -0,0 +1,48 @@
+# tests/test_nf_exec.py
+import threading
+
+import pandas as pd
+import pytest
+
+from utils import nf_exec
+
+DF = pd.DataFrame({"uf": ["SP", "RJ", "SP"], "valor": [1.0, 2.0, 3.0]})
+
+
+def _in_thread(func):
+    box = {}
+    worker = threading.Thread(target=lambda: box.update(out=func()))
+    worker.start()
+    worker.join()
+    return box["out"]
+
+
+def test_runs_off_the_main_thread():
+    assert _in_thread(lambda: nf_exec.run("df['valor'].sum()", DF)) == "6.0"
+    assert _in_thread(lambda: nf_exec.run("```python\nx = df[df['uf'] == 'SP']\nlen(x)\n```", DF)) == "2"
+
+
+def test_unsafe_code_is_rejected():
+    out = nf_exec.run("__import__('os').system('true')", DF)
+    assert out.startswith(nf_exec.ERROR_PREFIX)
+
+
+def test_timeout_is_enforced_off_the_main_thread(monkeypatch):
+    monkeypatch.setattr(nf_exec, "_abandoned", [])
+    monkeypatch.setattr(nf_exec, "MAX_ABANDONED", 1)
+    out = _in_thread(lambda: nf_exec.run("sum(i for i in range(3 * 10 ** 7))", DF, timeout=0.01))
+    assert out.startswith(nf_exec.ERROR_PREFIX) and "time limit" in out
+    # com a execução anterior ainda presa, novas execuções são recusadas
+    stuck = list(nf_exec._abandoned)
+    if any(t.is_alive() for t in stuck):
+        assert "ainda rodando" in nf_exec.run("len(df)", DF)
+    for t in stuck:
+        t.join()
+    assert nf_exec.run("len(df)", DF) == "3"
+
+
+@pytest.mark.parametrize("code", ["len(df)", "df.shape[0]"])
+def test_plan_replay_uses_the_same_executor(code):
+    from utils import plan_store
+
+    assert plan_store.run_expression(code, DF) == "3"
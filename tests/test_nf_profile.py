@@ -0,0 +1,55 @@
+# tests/test_nf_profile.py
+import os
+
+from utils import nf_profile
+
+
+def _profiles(cache_dir):
+    return sorted(n for n in os.listdir(cache_dir) if n.startswith("profile-"))
+
+
+def test_facts_of_sample(cabecalho):
+    facts = nf_profile.column_facts(cabecalho)
+    by_name = {c["name"]: c for c in facts["columns"]}
+    assert facts["rows"] == 100
+    assert by_name["CHAVE DE ACESSO"]["distinct"] == 100 and "top" not in by_name["CHAVE DE ACESSO"]
+    assert by_name["VALOR NOTA FISCAL"]["max"] == cabecalho["VALOR NOTA FISCAL"].max()
+    assert by_name["UF EMITENTE"]["top"][0][0] == cabecalho["UF EMITENTE"].value_counts().index[0]
+
+
+def test_render_fits_budget(itens):
+    facts = nf_profile.column_facts(itens)
+    rico = nf_profile.render_profile(facts, 100_000)
+    enxuto = nf_profile.render_profile(facts, 400)
+    assert "ex.:" in rico and nf_profile.count_tokens(enxuto) <= 400
+
+
+def test_memo_is_bounded(cabecalho, tmp_path, monkeypatch):
+    monkeypatch.setattr(nf_profile, "MAX_MEMO", 2)
+    monkeypatch.setattr(nf_profile, "_memo", type(nf_profile._memo)())
+    for i in range(4):
+        df = cabecalho.copy(deep=False)
+        df.attrs = {"fingerprint": f"fp{i}"}
+        nf_profile.table_context(df, 100_000, cache_dir=str(tmp_path))
+    assert [k[0] for k in nf_profile._memo] == ["fp2", "fp3"]
+    assert _profiles(tmp_path) == [f"profile-fp{i}.json" for i in range(4)]
+    nf_profile.forget(["fp3", "fp0"], str(tmp_path))
+    assert [k[0] for k in nf_profile._memo] == ["fp2"]
+    assert _profiles(tmp_path) == ["profile-fp1.json", "profile-fp2.json"]
+
+
+def test_catalog_removes_profiles_of_dropped_frames(catalog):
+    cache_dir = catalog.cache_dir
+    jan, _ = catalog.load(ids=["202401_NFs.zip"])
+    fev, _ = catalog.load(ids=["202402_NFs.zip"])
+    combinados = catalog.load()
+    for df in (jan, fev) + combinados:
+        nf_profile.table_context(df, 100_000, cache_dir=cache_dir)
+    # cabeçalho e itens combinados não dividem o mesmo arquivo
+    assert len(_profiles(cache_dir)) == 4
+    for fim in ("2024-01-20", "2024-02-10", "2024-02-20"):
+        catalog.load(fim=fim)
+    assert _profiles(cache_dir) == sorted(f"profile-{df.attrs['fingerprint']}.json" for df in (jan, fev))
+    os.remove(os.path.join(catalog.data_dir, "202402_NFs.zip"))
+    catalog.refresh(workers=1)
+    assert _profiles(cache_dir) == [f"profile-{jan.attrs['fingerprint']}.json"]
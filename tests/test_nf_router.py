@@ -0,0 +1,69 @@
+# tests/test_nf_router.py
+import pytest
+
+from utils import nf_router
+
+KEY = nf_router.KEY_COLUMN
+
+# perguntas com restrições que o roteador não sabe aplicar: resposta certa ou LLM
+CONSTRAINED = [
+    ("Quantas notas foram emitidas em SP?",
+     lambda df: str(df.loc[df["UF EMITENTE"] == "SP", KEY].nunique())),
+    ("Quantas notas com valor acima de 5000?",
+     lambda df: str(df.loc[df["VALOR NOTA FISCAL"] > 5000, KEY].nunique()) if "VALOR NOTA FISCAL" in df else None),
+    ("média de VALOR NOTA FISCAL por UF EMITENTE", None),
+    ("Qual o menor valor de 'VALOR NOTA FISCAL' com 'UF EMITENTE' diferente de 'SP'?",
+     lambda df: f"{df.loc[df['UF EMITENTE'] != 'SP', 'VALOR NOTA FISCAL'].min():.2f}" if "VALOR NOTA FISCAL" in df else None),
+    ("Quantas notas têm 'UF EMITENTE' igual a 'SP' ou 'RJ'?", None),
+    ("Qual a soma do 'VALOR NOTA FISCAL' exceto 'SP'?", None),
+    ("Quantas notas com 'VALOR NOTA FISCAL' > 5000?", None),
+    ("Qual é o valor máximo de 'VALOR NOTA FISCAL' em 2024?", None),
+]
+
+
+@pytest.fixture(params=["Cabeçalho", "Itens"])
+def tabela(request, cabecalho, itens):
+    return request.param, cabecalho if request.param == "Cabeçalho" else itens
+
+
+@pytest.mark.parametrize("question,expected", CONSTRAINED)
+def test_constraints_are_answered_or_sent_to_llm(tabela, question, expected):
+    nome, df = tabela
+    routed = nf_router.route(question, df, nome)
+    if routed is not None:
+        assert expected is not None and routed.answer == expected(df), routed
+
+
+def test_sample_answers(cabecalho):
+    route = lambda q: nf_router.route(q, cabecalho, "Cabeçalho").answer  # noqa: E731
+    assert route("Quantas notas têm 'UF EMITENTE' igual a 'SP'?") == "26"
+    assert route("Quantas notas existem?") == "100"
+    assert route("Qual é a média do 'VALOR NOTA FISCAL' no DataFrame?") == "33717.55"
+    assert route("Qual é o valor máximo de 'VALOR NOTA FISCAL'?") == f"{cabecalho['VALOR NOTA FISCAL'].max():.2f}"
+
+
+def test_top_emitters_count_notes_on_itens(cabecalho, itens):
+    question = "Quais são as 5 'RAZÃO SOCIAL EMITENTE' que mais emitiram notas, listando-as com suas contagens?"
+    expected = itens.groupby("RAZÃO SOCIAL EMITENTE", observed=True)[KEY].nunique()
+    routed = nf_router.route(question, itens, "Itens")
+    assert routed.intent == "top_n_notas"
+    assert routed.answer[0]["contagem"] == expected.max() == 7
+    assert routed.answer == nf_router.route(question, cabecalho, "Cabeçalho").answer
+
+
+def test_top_n_breaks_ties_by_key(itens):
+    routed = nf_router.route("Quais são as 3 'DESCRIÇÃO DO PRODUTO/SERVIÇO' mais frequentes e suas respectivas contagens?",
+                             itens, "Itens")
+    counts = itens["DESCRIÇÃO DO PRODUTO/SERVIÇO"].value_counts()
+    ranked = sorted(counts.items(), key=lambda kv: (-kv[1], str(kv[0])))[:3]
+    assert [(r["DESCRIÇÃO DO PRODUTO/SERVIÇO"], r["contagem"]) for r in routed.answer] == ranked
+
+
+def test_rows_on_itens_only_when_asked_on_itens(cabecalho, itens):
+    question = ("Quantas operações (linhas) na tabela 'Itens' tiveram a 'PRESENÇA DO COMPRADOR' "
+                "igual a '1 - OPERAÇÃO PRESENCIAL'?")
+    assert nf_router.route(question, cabecalho, "Cabeçalho") is None
+    assert nf_router.route("Quantas notas existem na tabela 'Itens'?", cabecalho, "Cabeçalho") is None
+    assert nf_router.route("Quantas notas existem na tabela 'Itens'?", itens, "Itens").answer == "100"
+    expected = (itens["PRESENÇA DO COMPRADOR"] == "1 - OPERAÇÃO PRESENCIAL").sum()
+    assert nf_router.route(question, itens, "Itens").answer == str(expected)
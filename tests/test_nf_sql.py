@@ -0,0 +1,44 @@
+# tests/test_nf_sql.py
+import pandas as pd
+import pytest
+
+from utils import nf_sql
+
+pytest.importorskip("duckdb")
+
+
+def _view(conn, name):
+    return conn.execute("SELECT sql FROM duckdb_views() WHERE view_name = ?", [name]).fetchone()[0]
+
+
+def test_single_table_reads_its_parquet(cabecalho, itens):
+    conn = nf_sql.get_connection(cabecalho, itens)
+    assert "read_parquet" in _view(conn, "cabecalho")
+    assert nf_sql.run_sql(conn, "SELECT COUNT(*) FROM cabecalho") == str(len(cabecalho))
+
+
+def test_catalog_frames_read_partition_parquets_with_filter(catalog):
+    cab, itens = catalog.load(inicio="2024-01-15", fim="2024-02-10", ufs=["SP", "MG"])
+    assert len(cab.attrs["parquet"]) == 2
+    conn = nf_sql.get_connection(cab, itens)
+    assert "read_parquet" in _view(conn, "cabecalho") and "WHERE" in _view(conn, "itens")
+    assert nf_sql.run_sql(conn, "SELECT COUNT(*) FROM cabecalho") == str(len(cab))
+    assert nf_sql.run_sql(conn, "SELECT COUNT(*) FROM itens") == str(len(itens))
+    total = float(nf_sql.run_sql(conn, 'SELECT SUM("VALOR NOTA FISCAL") FROM cabecalho'))
+    assert total == pytest.approx(cab["VALOR NOTA FISCAL"].sum())
+
+
+def test_unfiltered_months_union(catalog):
+    cab, itens = catalog.load()
+    conn = nf_sql.get_connection(cab, itens)
+    assert "WHERE" not in _view(conn, "cabecalho")
+    assert nf_sql.run_sql(conn, 'SELECT COUNT(DISTINCT "CHAVE DE ACESSO") FROM itens') == "200"
+
+
+def test_frame_without_parquet_falls_back_to_memory(cabecalho, itens, caplog):
+    cab = pd.DataFrame(cabecalho).copy()
+    cab.attrs = {}
+    with caplog.at_level("INFO"):
+        conn = nf_sql.get_connection(cab, itens)
+    assert "em memória" in caplog.text
+    assert nf_sql.run_sql(conn, "SELECT COUNT(*) FROM cabecalho") == str(len(cabecalho))
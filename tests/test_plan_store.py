@@ -0,0 +1,60 @@
+# tests/test_plan_store.py
+import sqlite3
+
+import pytest
+
+from utils import plan_store
+
+EXPR = "df[df['CHAVE DE ACESSO'] == 'X1']['VALOR NOTA FISCAL'].sum()"
+
+
+@pytest.fixture
+def store(tmp_path):
+    return plan_store.PlanStore(str(tmp_path / "plans.sqlite"))
+
+
+def _pergunta(chave):
+    return f"Qual o valor da nota '{chave}' na coluna 'VALOR NOTA FISCAL'?"
+
+
+def test_template_keeps_columns_and_extracts_literals(cabecalho):
+    template, params = plan_store.question_template(_pergunta("X1"), cabecalho.columns)
+    assert params == ["X1"]
+    assert "__p0__" in template and "valor nota fiscal" in template
+    assert plan_store.question_template(_pergunta("Y2"), cabecalho.columns)[0] == template
+
+
+def test_replay_with_other_literal(store, cabecalho):
+    store.record("Cabeçalho", _pergunta("X1"), EXPR, cabecalho)
+    chave = cabecalho["CHAVE DE ACESSO"].iloc[3]
+    valor = cabecalho.loc[cabecalho["CHAVE DE ACESSO"] == chave, "VALOR NOTA FISCAL"].sum()
+    assert store.replay("Cabeçalho", _pergunta(chave), cabecalho) == str(valor)
+    assert store.replay("Itens", _pergunta(chave), cabecalho) is None
+
+
+def test_replay_on_new_month(catalog, store):
+    jan, _ = catalog.load(ids=["202401_NFs.zip"])
+    fev, _ = catalog.load(ids=["202402_NFs.zip"])
+    pergunta = "Qual o valor total das notas?"
+    store.record("Cabeçalho", pergunta, "df['VALOR NOTA FISCAL'].sum()", jan)
+    assert store.replay("Cabeçalho", "qual o valor total das notas", fev) == str(fev["VALOR NOTA FISCAL"].sum())
+
+
+def test_literal_missing_from_expression_binds_exact_question(store, cabecalho):
+    store.record("Cabeçalho", _pergunta("X1"), "df['VALOR NOTA FISCAL'].max()", cabecalho)
+    assert store.replay("Cabeçalho", _pergunta("Y2"), cabecalho) is None
+    assert store.replay("Cabeçalho", _pergunta("X1"), cabecalho) == str(cabecalho["VALOR NOTA FISCAL"].max())
+
+
+def test_unsafe_literal_is_not_substituted(store, cabecalho):
+    store.record("Cabeçalho", _pergunta("X1"), EXPR, cabecalho)
+    assert store.replay("Cabeçalho", _pergunta('a" or "b'), cabecalho) is None
+
+
+def test_failing_plan_is_dropped(store, cabecalho):
+    store.record("Cabeçalho", "qual o total?", "df['VALOR NOTA FISCAL'].sum()", cabecalho)
+    sem_coluna = cabecalho.drop(columns=["VALOR NOTA FISCAL"])
+    for _ in range(plan_store.MAX_NET_FAILURES + 2):
+        assert store.replay("Cabeçalho", "qual o total?", sem_coluna) is None
+    with sqlite3.connect(store.path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM plans").fetchone()[0] == 0
@@ -0,0 +1,75 @@
+# tests/test_plot_cache.py
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import DATA_DIR
+from utils import eda, plot_cache
+
+
+@pytest.fixture(scope="module")
+def creditcard():
+    return pd.read_csv(os.path.join(DATA_DIR, "creditcard_sample.csv"), nrows=2000)
+
+
+def test_fingerprint_follows_content(creditcard):
+    fp = plot_cache.dataset_fingerprint(creditcard)
+    assert fp == plot_cache.dataset_fingerprint(creditcard.copy())
+    changed = creditcard.copy()
+    changed.iloc[0, 0] += 1
+    assert plot_cache.dataset_fingerprint(changed) != fp
+    assert plot_cache.dataset_fingerprint(creditcard.astype({"Class": "int8"})) != fp
+
+
+def test_cache_path_keys_on_params(tmp_path):
+    a = plot_cache.cache_path(str(tmp_path), "hist", "fp", column="V 1/x", bins=50)
+    assert a == plot_cache.cache_path(str(tmp_path), "hist", "fp", bins=50, column="V 1/x")
+    assert a != plot_cache.cache_path(str(tmp_path), "hist", "fp", column="V 1/x", bins=20)
+    assert a != plot_cache.cache_path(str(tmp_path), "hist", "outro", column="V 1/x", bins=50)
+    assert os.path.basename(a).startswith("hist_V_1_x_") and a.endswith(".png")
+
+
+def test_evict_removes_least_recently_used(tmp_path):
+    paths = []
+    for i in range(4):
+        path = tmp_path / f"p{i}.png"
+        path.write_bytes(b"x" * 1000)
+        os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+        paths.append(str(path))
+    (tmp_path / "outro.txt").write_bytes(b"x" * 5000)
+    assert plot_cache.lookup(paths[0])  # hit: passa a ser o mais recente
+    assert not plot_cache.lookup(str(tmp_path / "faltando.png"))
+    plot_cache.evict(str(tmp_path), max_bytes=2500)
+    assert sorted(os.listdir(tmp_path)) == ["outro.txt", "p0.png", "p3.png"]
+
+
+def test_histograms_reuse_images(creditcard, tmp_path, monkeypatch):
+    cols = ["Amount", "V1", "V2"]
+    first = eda.generate_histograms(creditcard, cols, outdir=str(tmp_path))
+    assert all(os.path.exists(p) for p in first.values())
+    drawn = []
+    original = plot_cache.render_many
+    monkeypatch.setattr(plot_cache, "render_many", lambda f, jobs, progress=None: drawn.extend(jobs) or original(f, jobs, progress))
+    again = eda.generate_histograms(creditcard, cols + ["V3"], outdir=str(tmp_path))
+    assert [job[0] for job in drawn] == [again["V3"]]
+    assert {c: again[c] for c in cols} == first
+
+
+def test_histogram_counts_ignore_non_finite():
+    counts, edges = plot_cache.histogram_counts([1.0, 2.0, np.nan, np.inf, 3.0], bins=3)
+    assert counts.tolist() == [1, 1, 1] and edges[0] == 1.0 and edges[-1] == 3.0
+
+
+def test_render_many_keeps_order_and_errors():
+    def func(x):
+        if x == 2:
+            raise ValueError("dois")
+        return x * 10
+
+    progresso = []
+    results = plot_cache.render_many(func, [(1,), (2,), (3,)], lambda d, t: progresso.append((d, t)))
+    assert results[0] == 10 and isinstance(results[1], ValueError) and results[2] == 30
+    assert progresso == [(1, 3), (2, 3), (3, 3)]
@@ -0,0 +1,59 @@
+# tests/test_sampling.py
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import DATA_DIR
+from utils import sampling
+
+CREDITCARD = os.path.join(DATA_DIR, "creditcard_sample.csv")
+
+
+@pytest.mark.parametrize("stratify", [None, "Class"])
+def test_same_sample_for_any_chunksize(stratify):
+    kwargs = dict(n=300, seed=7, stratify=stratify, min_per_stratum=20)
+    a = sampling.reservoir_sample(CREDITCARD, chunksize=97, **kwargs)
+    b = sampling.reservoir_sample(CREDITCARD, chunksize=100_000, **kwargs)
+    pd.testing.assert_frame_equal(a, b)
+    assert len(a) == 300
+    assert not a.equals(sampling.reservoir_sample(CREDITCARD, chunksize=97, **dict(kwargs, seed=8)))
+
+
+def test_floor_keeps_rare_class():
+    sample = sampling.reservoir_sample(CREDITCARD, n=300, seed=1, stratify="Class", min_per_stratum=20,
+                                       chunksize=500)
+    strata = sample.attrs["sampling"]["strata"]
+    raros = min(s["seen"] for s in strata.values())
+    assert (sample["Class"] == 1).sum() == min(20, raros)
+    assert sum(s["seen"] for s in strata.values()) == sample.attrs["sampling"]["rows"]
+
+
+def test_explicit_quotas():
+    sample = sampling.reservoir_sample(CREDITCARD, seed=3, stratify="Class", quotas={0: 40, 1: 5}, chunksize=250)
+    assert sample["Class"].value_counts().to_dict() == {0: 40, 1: 5}
+    sample = sampling.reservoir_sample(CREDITCARD, seed=3, stratify="Class", quotas={1: 5})
+    assert (sample["Class"] == 1).all() and len(sample) == 5
+
+
+def test_missing_values_are_one_stratum():
+    i = np.arange(1000)
+    df = pd.DataFrame({"x": i, "s": np.where(i % 2, np.nan, i % 4)})
+    csv = io.StringIO(df.to_csv(index=False))
+    sample = sampling.reservoir_sample(csv, n=100, seed=0, stratify="s", chunksize=100)
+    strata = sample.attrs["sampling"]["strata"]
+    assert len(strata) == 3
+    assert strata["<NA>"] == {"seen": 500, "sampled": 50}
+    assert sample["s"].isna().sum() == 50
+    csv.seek(0)
+    sample = sampling.reservoir_sample(csv, seed=0, stratify="s", quotas={np.nan: 10}, chunksize=100)
+    assert len(sample) == 10 and sample["s"].isna().all()
+
+
+def test_allocate_never_exceeds_n():
+    assert sampling.allocate({"a": 900, "b": 90, "c": 10}, 100, min_per_stratum=20) == {"a": 70, "b": 20, "c": 10}
+    quotas = sampling.allocate({k: 100 for k in "abcdefghij"}, 25, min_per_stratum=5)
+    assert sum(quotas.values()) == 25 and min(quotas.values()) >= 2
+    assert sampling.allocate({"a": 3, "b": 4}, 10, min_per_stratum=5) == {"a": 3, "b": 4}
@@ -0,0 +1,60 @@
+# tests/test_schema.py
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import CABECALHO_CSV, DATA_DIR, ITENS_CSV
+from utils import schema
+
+
+@pytest.mark.parametrize("name", [CABECALHO_CSV, ITENS_CSV])
+def test_round_trip_keeps_values_and_shrinks(name):
+    raw = pd.read_csv(os.path.join(DATA_DIR, name))
+    out, report = schema.optimize(raw, key_columns=["CHAVE DE ACESSO"])
+    assert report.loc["TOTAL", "depois_mb"] < report.loc["TOTAL", "antes_mb"]
+    assert out.attrs["memory"]["depois_mb"] == pytest.approx(report.loc["TOTAL", "depois_mb"])
+    assert str(out["CHAVE DE ACESSO"].dtype).startswith("string")
+    assert str(out["UF EMITENTE"].dtype) == "category"
+    assert pd.api.types.is_datetime64_any_dtype(out["DATA EMISSÃO"])
+    for col in raw.columns:
+        if pd.api.types.is_datetime64_any_dtype(out[col]):
+            expected = pd.to_datetime(raw[col])
+        else:
+            expected = raw[col]
+        restored = out[col].astype(object) if isinstance(out[col].dtype, pd.CategoricalDtype) else out[col]
+        pd.testing.assert_series_equal(restored, expected, check_dtype=False, check_exact=True, obj=col)
+
+
+def test_integer_and_float_downcast():
+    df = pd.DataFrame({"pequeno": [1, 2, 120], "grande": [0, 70_000, 5], "nulos": pd.array([1, None, 300], "Int64"),
+                       "exato": [0.5, 1.25, 2.0], "inexato": [0.1, 0.2, 0.3]})
+    out, _ = schema.optimize(df)
+    assert out.dtypes.astype(str).to_dict() == {"pequeno": "int8", "grande": "int32", "nulos": "Int16",
+                                                "exato": "float32", "inexato": "float64"}
+    assert out["inexato"].tolist() == [0.1, 0.2, 0.3]
+
+
+def test_text_rules():
+    n = 100
+    df = pd.DataFrame({
+        "repetido": ["a", "b"] * (n // 2),
+        "unico": [f"id{i}" for i in range(n)],
+        "data_br": ["31/01/2024"] * n,
+        "quase_data": ["2024-01-01"] * (n - 1) + ["ontem"],
+        "chave": ["1"] * n,
+    })
+    out, _ = schema.optimize(df, key_columns=["chave"])
+    assert str(out["repetido"].dtype) == "category"
+    assert out["unico"].dtype == object
+    assert out["data_br"].iloc[0] == pd.Timestamp("2024-01-31")
+    assert not pd.api.types.is_datetime64_any_dtype(out["quase_data"])
+    assert out["chave"].dtype == schema.KEY_DTYPE
+
+
+def test_memory_report_rows():
+    df = pd.DataFrame({"a": np.arange(10, dtype="int64")})
+    out, report = schema.optimize(df)
+    assert list(report.index) == ["a", "TOTAL"]
+    assert report.loc["a", "dtype_depois"] == "int8" and report.loc["a", "reducao_%"] > 80
@@ -0,0 +1,170 @@
+# utils/batch_runner.py
+"""Avaliação em lote do agente de Notas Fiscais.
+
+Lê perguntas de um JSONL (chave ``question``/``pergunta``, ou ``title`` e
+``body`` como no requests.jsonl) e roda cada uma contra Cabeçalho e Itens
+ao mesmo tempo, com concorrência limitada por semáforo e taxa limitada por
+token bucket. Ao final imprime latência por pergunta, p50/p95/p99 e vazão.
+
+Uso:
+    python -m utils.batch_runner perguntas.jsonl --fake --latency 0.8
+    python -m utils.batch_runner perguntas.jsonl --concurrency 2 --rate 0.5
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import Counter
+
+import numpy as np
+
+from utils import engine_registry, llm_cache, metrics, nf_agent, nf_cache, plan_store
+
+DATA_DIR = os.getenv("DATA_DIR", "data")
+CABECALHO_CSV = os.getenv("CABECALHO_FILE", "202401_NFs_Cabecalho.csv")
+ITENS_CSV = os.getenv("ITENS_FILE", "202401_NFs_Itens.csv")
+
+
+class TokenBucket:
+    """Limita a taxa a ``rate`` requisições/s com rajadas de até ``capacity``."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def load_questions(path):
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            text = item.get("question") or item.get("pergunta") or item.get("body") or item.get("title")
+            if text:
+                questions.append(text)
+    return questions
+
+
+async def run_batch(questions, tables, answer, concurrency=4, rate=None):
+    """Roda ``await answer(df, pergunta, tabela)`` para cada pergunta x tabela.
+
+    ``tables`` é {nome: DataFrame}; ``answer`` é uma corrotina que retorna
+    (resposta, caminho, ms). Retorna os resultados na ordem de entrada.
+    """
+    sem = asyncio.Semaphore(concurrency)
+    bucket = TokenBucket(rate, capacity=max(1, concurrency)) if rate else None
+
+    async def one(i, pergunta, tabela, df):
+        async with sem:
+            if bucket:
+                await bucket.acquire()
+            inicio = time.perf_counter()
+            resp, caminho, _ = await answer(df, pergunta, tabela)
+            ms = (time.perf_counter() - inicio) * 1000
+        return {"id": i, "pergunta": pergunta, "tabela": tabela, "caminho": caminho,
+                "ms": ms, "resposta": resp}
+
+    tasks = [one(i, q, name, df) for i, q in enumerate(questions) for name, df in tables.items()]
+    return await asyncio.gather(*tasks)
+
+
+def summarize(results, wall_seconds):
+    lat = np.array([r["ms"] for r in results]) if results else np.zeros(1)
+    return {
+        "requests": len(results),
+        "wall_s": wall_seconds,
+        "throughput_rps": len(results) / wall_seconds if wall_seconds else 0.0,
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p95_ms": float(np.percentile(lat, 95)),
+        "p99_ms": float(np.percentile(lat, 99)),
+        "caminhos": dict(Counter(r["caminho"] for r in results)),
+        "etapas": {row["etapa"]: {k: round(v, 2) if isinstance(v, float) else v
+                                  for k, v in row.items() if k != "etapa"}
+                   for row in metrics.summary()},
+    }
+
+
+def _make_llm(args):
+    if args.fake or args.replay:
+        from utils.fake_llm import FakeLLM
+        kwargs = dict(latency=args.latency, jitter=args.jitter)
+        return FakeLLM.from_jsonl(args.replay, **kwargs) if args.replay else FakeLLM(**kwargs)
+    from llama_index.llms.groq import Groq
+    api_key = os.getenv("GROQ_API_KEY")
+    if api_key is None:
+        raise SystemExit("GROQ_API_KEY não configurada (use --fake para rodar offline).")
+    return Groq(model="llama3-8b-8192", api_key=api_key)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Avaliação em lote do agente de NF")
+    parser.add_argument("questions", help="arquivo JSONL de perguntas")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=None, help="requisições/s (token bucket)")
+    parser.add_argument("--fake", action="store_true", help="usa o LLM local de mentira")
+    parser.add_argument("--replay", help="JSONL de respostas gravadas para o LLM de mentira")
+    parser.add_argument("--latency", type=float, default=0.0, help="latência simulada (s)")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--no-router", action="store_true", help="força todas as perguntas ao LLM")
+    parser.add_argument("--use-cache", action="store_true",
+                        help="usa o cache de respostas e os planos compartilhados")
+    parser.add_argument("--output", help="grava os resultados por pergunta em JSONL")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    questions = load_questions(args.questions)
+    cabecalho, itens = nf_cache.load_nf_tables(DATA_DIR, CABECALHO_CSV, ITENS_CSV)
+    tables = {"Cabeçalho": cabecalho, "Itens": itens}
+
+    llm = _make_llm(args)
+    registry = engine_registry.EngineRegistry()
+    if args.use_cache:
+        cache, plans = None, None
+    else:
+        # caches isolados: uma rodada (ainda mais com o LLM falso) não contamina o app
+        tmp = tempfile.mkdtemp(prefix="nf_batch_")
+        cache = llm_cache.ResponseCache(os.path.join(tmp, "llm_cache.sqlite"))
+        plans = plan_store.PlanStore(os.path.join(tmp, "plans.sqlite"))
+
+    def get_engine(df, tabela):
+        return nf_agent.get_query_engine(df, tabela, lambda: llm, registry=registry, verbose=False)
+
+    async def answer(df, pergunta, tabela):
+        return await nf_agent.aresponder(df, pergunta, tabela, get_engine, cache=cache, plans=plans,
+                                         use_router=not args.no_router)
+
+    inicio = time.perf_counter()
+    results = asyncio.run(run_batch(questions, tables, answer, args.concurrency, args.rate))
+    wall = time.perf_counter() - inicio
+
+    for r in results:
+        print(f"{r['ms']:9.1f} ms  {r['caminho']:<9} {r['tabela']:<10} {r['pergunta'][:70]}")
+    summary = summarize(results, wall)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for r in results:
+                f.write(json.dumps(r, ensure_ascii=False, default=str) + "\n")
+    return summary
+
+
+if __name__ == "__main__":
+    main()
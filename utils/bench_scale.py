@@ -0,0 +1,409 @@
+# utils/bench_scale.py
+"""Benchmark de escala do EDA e do caminho de NF (carga e agente).
+
+Cada caso roda num interpretador novo sobre dados sintéticos
+determinísticos (mesma semente, mesmos dados):
+
+- EDA: ``describe_numeric``, ``generate_histograms``,
+  ``correlation_matrix``, ``detect_outliers_iqr`` e ``cluster_analysis``
+  em tabelas de ``--scales`` linhas por ``--widths`` colunas;
+- NF: ``load_data_nf`` a frio (ZIP -> cache Parquet + cubo) e a quente
+  (cache pronto, processo novo) e o agente (``nf_agent.responder``) com as
+  perguntas de ``perguntas.jsonl`` e o LLM local de mentira
+  (``utils.fake_llm``). O ZIP de cada escala é gerado uma vez por
+  ``utils.gerar_dados`` em ``--workdir``; a escala conta linhas de Itens.
+
+Por caso: tempo de parede (mediana das repetições, com caches do processo e
+gráficos em disco zerados a cada uma), pico de RSS acima do que havia antes
+da operação (amostrado em thread) e pico de alocações do ``tracemalloc``
+(numa execução à parte, que o rastreamento deixa mais lenta; pulada nos
+casos acima de ``BENCH_ALLOC_MAX_S`` segundos). Os módulos pesados são
+importados antes da medida. Casos que não cabem na memória disponível são
+pulados.
+
+O resultado é comparado com a linha de base em JSON (``--baseline``); uma
+métrica acima de ``(1 + threshold)`` vezes a base faz o comando sair com
+código 1. Sem linha de base, a rodada vira a linha de base.
+
+Uso: ``python -m utils.bench_scale [--scales 5k,300k,5m] [--widths 30,300]
+[--only describe,nf.] [--threshold 0.25] [--update-baseline]``.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SEED = 42
+WORKDIR = os.getenv("BENCH_DIR", os.path.join("outputs", "bench"))
+BASELINE = os.getenv("BENCH_BASELINE", os.path.join(WORKDIR, "baseline.json"))
+THRESHOLD = float(os.getenv("BENCH_THRESHOLD", "0.25"))
+DEFAULT_SCALES = "5k,300k,5m"
+DEFAULT_WIDTHS = "30,300"
+# repete até ``repeat`` vezes, mas para quando o caso já passou deste tempo
+BUDGET_SECONDS = 60.0
+RSS_INTERVAL = 0.005
+# o tracemalloc deixa código Python (ex.: matplotlib) várias vezes mais lento:
+# casos mais demorados que isso ficam sem a medida de alocações
+ALLOC_MAX_SECONDS = float(os.getenv("BENCH_ALLOC_MAX_S", "15"))
+# diferenças abaixo disso são ruído, mesmo acima do limiar relativo
+MIN_DELTA = {"wall_s": 0.02, "rss_peak_mb": 8.0, "alloc_peak_mb": 4.0}
+METRICS = tuple(MIN_DELTA)
+# bytes por célula somando as cópias que as operações fazem (float64, máscaras)
+EDA_BYTES_PER_CELL = 24
+NF_BYTES_PER_ROW = 1500
+QUESTIONS = os.path.join(ROOT, "perguntas.jsonl")
+
+EDA_OPS = ("describe_numeric", "generate_histograms", "correlation_matrix", "detect_outliers_iqr",
+           "cluster_analysis")
+NF_OPS = ("nf.load_data_nf_frio", "nf.load_data_nf_quente", "nf.agente")
+
+
+# --- dados sintéticos ---
+def parse_scale(text):
+    text = text.strip().lower()
+    mult = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * mult)
+
+
+def scale_label(rows):
+    for suffix, mult in (("m", 1_000_000), ("k", 1_000)):
+        if rows >= mult and rows % mult == 0:
+            return f"{rows // mult}{suffix}"
+    return str(rows)
+
+
+def eda_frame(rows, cols, seed=SEED):
+    """Tabela numérica no formato do creditcard: Time, V1..Vn correlacionadas, Class rara.
+
+    Quatro fatores latentes dão correlação entre as colunas; ruído t de
+    Student (3 g.l.) dá caudas pesadas, ou seja, outliers.
+    """
+    rng = np.random.default_rng([seed, rows, cols])
+    n = max(cols - 2, 1)
+    factors = rng.standard_normal((rows, 4))
+    loadings = rng.standard_normal((4, n))
+    data = {"Time": np.arange(rows, dtype=np.float32)}
+    for j in range(n):
+        # coluna a coluna: o pico de memória fica em uma coluna float64
+        data[f"V{j + 1}"] = (factors @ loadings[:, j] + rng.standard_t(3, rows)).astype(np.float32)
+    data["Class"] = (rng.random(rows) < 0.02).astype(np.int8)
+    return pd.DataFrame(data)
+
+
+def nf_dataset(rows, workdir=WORKDIR, seed=SEED):
+    """Pasta com o ZIP sintético de ~``rows`` itens (gerado uma vez por escala e semente)."""
+    from utils import gerar_dados
+
+    pasta = os.path.join(workdir, f"nf-{scale_label(rows)}-{seed}")
+    if not os.path.exists(os.path.join(pasta, "202401_NFs.zip")):
+        # ~2,9 itens por nota
+        pools = gerar_dados.build_pools(seed, amostra_dir=os.path.join(ROOT, gerar_dados.DATA_DIR),
+                                        use_faker=False)
+        gerar_dados.gerar(max(1, rows * 10 // 29), "202401", "zip", pasta, seed, pools=pools)
+    return pasta
+
+
+def _available_bytes():
+    try:
+        with open("/proc/meminfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def fits_in_memory(case):
+    """O caso cabe em 70% da memória disponível (sem /proc/meminfo, sempre cabe)?"""
+    available = _available_bytes()
+    if available is None:
+        return True
+    if case["op"].startswith("nf."):
+        need = case["rows"] * NF_BYTES_PER_ROW
+    else:
+        need = case["rows"] * case["cols"] * EDA_BYTES_PER_CELL
+    return need <= 0.7 * available
+
+
+# --- medição (processo filho) ---
+def _rss():
+    try:
+        with open("/proc/self/statm", "r", encoding="utf-8") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+
+        # sem /proc: o pico do processo (KB no Linux, bytes no macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class _PeakRss:
+    """Maior RSS durante o bloco, acima do RSS na entrada (amostrado em thread)."""
+
+    def __enter__(self):
+        self.start = self.peak = _rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+        self._thread.start()
+        return self
+
+    def _poll(self):
+        while not self._stop.wait(RSS_INTERVAL):
+            self.peak = max(self.peak, _rss())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss())
+        self.mb = (self.peak - self.start) / 1024 ** 2
+        return False
+
+
+def _prepare(case, tmp):
+    """(função sem argumentos que roda a operação uma vez, função de limpeza entre repetições)."""
+    op = case["op"]
+    if not op.startswith("nf."):
+        from utils import clustering, eda, plot_cache, schema
+
+        plot_cache.pyplot()
+        df, _ = schema.optimize(eda_frame(case["rows"], case["cols"]))
+        outdir = os.path.join(tmp, "outputs")
+        calls = {
+            "describe_numeric": lambda: eda.describe_numeric(df),
+            "generate_histograms": lambda: eda.generate_histograms(df, outdir=outdir),
+            "correlation_matrix": lambda: eda.correlation_matrix(df, outdir=outdir),
+            "detect_outliers_iqr": lambda: eda.detect_outliers_iqr(df),
+            "cluster_analysis": lambda: eda.cluster_analysis(df, n_clusters=3, outdir=outdir),
+        }
+
+        def reset():
+            # gráficos em disco e matriz padronizada: cada repetição mede o cálculo inteiro
+            shutil.rmtree(outdir, ignore_errors=True)
+            clustering.clear_cache()
+
+        return calls[op], reset
+
+    from utils import nf_catalog
+
+    data_dir = case["data_dir"]
+    cache_dir = os.path.join(tmp, "cache")
+    if op == "nf.load_data_nf_frio":
+        def reset():
+            shutil.rmtree(cache_dir, ignore_errors=True)
+    else:
+        nf_catalog.Catalog(data_dir, cache_dir).refresh()
+
+        def reset():
+            pass
+
+    def load():
+        # o mesmo que o app faz em load_data_nf, com um catálogo novo (processo recém-iniciado)
+        catalog = nf_catalog.Catalog(data_dir, cache_dir)
+        catalog.refresh()
+        return catalog.load()
+
+    if op != "nf.agente":
+        return load, reset
+
+    from utils import engine_registry, nf_agent, nf_engine  # noqa: F401 (llama_index fora da medida)
+    from utils.batch_runner import load_questions
+    from utils.fake_llm import FakeLLM
+
+    questions = load_questions(case.get("questions") or QUESTIONS)
+    llm = FakeLLM()
+
+    def agente():
+        cabecalho, itens = load()
+        registry = engine_registry.EngineRegistry()
+
+        def get_engine(df, tabela):
+            return nf_agent.get_query_engine(df, tabela, lambda: llm, registry=registry, verbose=False)
+
+        return [nf_agent.responder(df, q, tabela, get_engine, cache=False, plans=False)
+                for q in questions for tabela, df in (("Cabeçalho", cabecalho), ("Itens", itens))]
+
+    return agente, reset
+
+
+def run_case(case, repeat=3, budget=BUDGET_SECONDS, alloc_max=ALLOC_MAX_SECONDS):
+    """Mede um caso neste processo: tempo (mediana), pico de RSS e pico do tracemalloc."""
+    tmp = tempfile.mkdtemp(prefix="bench_")
+    try:
+        call, reset = _prepare(case, tmp)
+        walls, rss = [], []
+        for _ in range(max(1, repeat)):
+            reset()
+            gc.collect()
+            with _PeakRss() as peak:
+                inicio = time.perf_counter()
+                call()
+                walls.append(time.perf_counter() - inicio)
+            rss.append(peak.mb)
+            if sum(walls) > budget:
+                break
+        result = {"wall_s": statistics.median(walls), "wall_min_s": min(walls), "runs": len(walls),
+                  "rss_peak_mb": max(rss), "alloc_peak_mb": None}
+        if result["wall_s"] <= alloc_max:
+            reset()
+            gc.collect()
+            tracemalloc.start()
+            try:
+                call()
+                result["alloc_peak_mb"] = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+            finally:
+                tracemalloc.stop()
+        return result
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _child(case, repeat, budget):
+    code = ("import json, sys, warnings; warnings.simplefilter('ignore'); "
+            "from utils.bench_scale import run_case; "
+            "print(json.dumps(run_case(json.loads(sys.argv[1]), int(sys.argv[2]), float(sys.argv[3]))))")
+    proc = subprocess.run([sys.executable, "-c", code, json.dumps(case), str(repeat), str(budget)],
+                          cwd=ROOT, capture_output=True, text=True, check=False)
+    if proc.returncode != 0:
+        return {"erro": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "falhou"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+# --- casos, linha de base e comparação ---
+def case_id(case):
+    if case["op"].startswith("nf."):
+        return f"{case['op']}/{scale_label(case['rows'])}"
+    return f"{case['op']}/{scale_label(case['rows'])}x{case['cols']}"
+
+
+def build_cases(scales, widths, only=None):
+    cases = [{"op": op, "rows": rows, "cols": cols} for rows in scales for cols in widths for op in EDA_OPS]
+    cases += [{"op": op, "rows": rows} for rows in scales for op in NF_OPS]
+    if only:
+        cases = [c for c in cases if any(o in case_id(c) for o in only)]
+    return cases
+
+
+def load_baseline(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_baseline(path, results, previous=None):
+    data = previous or {}
+    data["meta"] = {
+        "python": platform.python_version(), "platform": platform.platform(),
+        "cpus": os.cpu_count(), "numpy": np.__version__, "pandas": pd.__version__,
+        "updated": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    data.setdefault("results", {}).update({k: v for k, v in results.items() if "erro" not in v and "pulado" not in v})
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+    return path
+
+
+def compare(results, baseline, threshold=THRESHOLD, metrics=METRICS):
+    """Regressões: [(caso, métrica, base, atual)] acima de ``(1 + threshold)`` x base e de ``MIN_DELTA``."""
+    regressions = []
+    base_results = (baseline or {}).get("results", {})
+    for cid, current in results.items():
+        base = base_results.get(cid)
+        if not base or "erro" in current or "pulado" in current:
+            continue
+        for metric in metrics:
+            b, c = base.get(metric), current.get(metric)
+            if b is None or c is None:
+                continue
+            if c > b * (1 + threshold) and c - b > MIN_DELTA[metric]:
+                regressions.append((cid, metric, b, c))
+    return regressions
+
+
+def _delta(current, base, metric):
+    if not base or base.get(metric) in (None, 0) or current.get(metric) is None:
+        return "     "
+    return f"{(current[metric] / base[metric] - 1) * 100:+4.0f}%"
+
+
+def _mb(value):
+    return f"{value:8.1f} MB" if value is not None else "       — MB"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de escala do EDA e do caminho de NF")
+    parser.add_argument("--scales", default=DEFAULT_SCALES, help="linhas, ex.: 5k,300k,5m")
+    parser.add_argument("--widths", default=DEFAULT_WIDTHS, help="colunas das tabelas do EDA, ex.: 30,300")
+    parser.add_argument("--only", help="só os casos cujo id contém um destes trechos (separados por vírgula)")
+    parser.add_argument("-n", "--repeat", type=int, default=3, help="repetições por caso (mediana)")
+    parser.add_argument("--budget", type=float, default=BUDGET_SECONDS, help="segundos por caso antes de parar de repetir")
+    parser.add_argument("--workdir", default=WORKDIR, help="onde ficam os ZIPs sintéticos de NF")
+    parser.add_argument("--baseline", default=BASELINE, help="JSON da linha de base")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="regressão tolerada (0.25 = 25%%)")
+    parser.add_argument("--metrics", default=",".join(METRICS), help="métricas comparadas com a base")
+    parser.add_argument("--update-baseline", action="store_true", help="grava esta rodada como linha de base")
+    parser.add_argument("--output", help="grava o resultado desta rodada em JSON")
+    args = parser.parse_args(argv)
+
+    scales = [parse_scale(s) for s in args.scales.split(",") if s.strip()]
+    widths = [int(w) for w in args.widths.split(",") if w.strip()]
+    only = [o.strip() for o in args.only.split(",")] if args.only else None
+    metrics = [m.strip() for m in args.metrics.split(",") if m.strip() in MIN_DELTA]
+    baseline = load_baseline(args.baseline)
+    base_results = (baseline or {}).get("results", {})
+
+    results = {}
+    for case in build_cases(scales, widths, only):
+        cid = case_id(case)
+        if not fits_in_memory(case):
+            results[cid] = {"pulado": "memória insuficiente"}
+            print(f"{cid:<42} pulado (memória insuficiente)")
+            continue
+        if case["op"].startswith("nf."):
+            case["data_dir"] = os.path.abspath(nf_dataset(case["rows"], args.workdir))
+        r = results[cid] = _child(case, args.repeat, args.budget)
+        if "erro" in r:
+            print(f"{cid:<42} erro: {r['erro']}")
+            continue
+        base = base_results.get(cid)
+        print(f"{cid:<42} {r['wall_s'] * 1000:10.1f} ms {_delta(r, base, 'wall_s')}  "
+              f"RSS {_mb(r['rss_peak_mb'])} {_delta(r, base, 'rss_peak_mb')}  "
+              f"alloc {_mb(r['alloc_peak_mb'])} {_delta(r, base, 'alloc_peak_mb')}  ({r['runs']}x)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if baseline is None or args.update_baseline:
+        save_baseline(args.baseline, results, baseline)
+        print(f"Linha de base gravada em {args.baseline}")
+        return results
+    regressions = compare(results, baseline, args.threshold, metrics)
+    for cid, metric, b, c in regressions:
+        print(f"REGRESSÃO {cid} {metric}: {b:.3f} -> {c:.3f} (+{(c / b - 1) * 100:.0f}%)")
+    if regressions:
+        raise SystemExit(1)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# utils/bench_startup.py
+"""Tempo de partida a frio do app, por aba.
+
+Cada medida roda num interpretador novo (como um pod recém-criado):
+
+- ``import``: módulos carregados no topo do ``app.py`` mais os da aba;
+- ``primeiro_uso``: dependências pesadas adiadas até a primeira pergunta
+  ou gráfico (llama_index na aba de NF; matplotlib e scikit-learn no EDA);
+- ``first_paint``: primeira execução completa do script na aba, via
+  ``streamlit.testing`` (pulada se o Streamlit não estiver instalado).
+
+Uso: ``python -m utils.bench_startup [-n 5] [--output startup.json]``.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BASE = ["pandas", "numpy", "dotenv", "utils.memory", "utils.metrics"]
+TABS = {
+    "Notas Fiscais (LLM)": {
+        "import": ["utils.engine_registry", "utils.llm_cache", "utils.nf_agent", "utils.nf_cache"],
+        "primeiro_uso": ["utils.nf_engine"],
+    },
+    "EDA Genérico": {
+        "import": ["utils.eda", "utils.eda_stream", "utils.sampling", "utils.schema"],
+        "primeiro_uso": ["matplotlib.pyplot", "utils.clustering"],
+    },
+}
+
+_IMPORT_CHILD = """
+import importlib, json, sys, time, warnings
+warnings.simplefilter("ignore")
+out = {}
+for fase, mods in json.loads(sys.argv[1]):
+    inicio = time.perf_counter()
+    for mod in mods:
+        try:
+            importlib.import_module(mod)
+        except ImportError as e:
+            out.setdefault("ausentes", []).append(str(e))
+    out[fase] = (time.perf_counter() - inicio) * 1000
+print(json.dumps(out))
+"""
+
+_PAINT_CHILD = """
+import json, sys, time, warnings
+warnings.simplefilter("ignore")
+inicio = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("app.py", default_timeout=300)
+at.session_state["aba"] = sys.argv[1]
+at.run()
+print(json.dumps({"first_paint": (time.perf_counter() - inicio) * 1000,
+                  "excecoes": [str(e.value) for e in at.exception]}))
+"""
+
+
+def _child(code, *args):
+    proc = subprocess.run([sys.executable, "-c", code, *args], cwd=ROOT,
+                          capture_output=True, text=True, check=False)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "falhou")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def measure_imports(tab, repeat=5):
+    fases = [("base", BASE), ("import", TABS[tab]["import"]), ("primeiro_uso", TABS[tab]["primeiro_uso"])]
+    runs = [_child(_IMPORT_CHILD, json.dumps(fases)) for _ in range(repeat)]
+    result = {fase: statistics.median(r[fase] for r in runs) for fase, _ in fases}
+    ausentes = sorted({a for r in runs for a in r.get("ausentes", [])})
+    if ausentes:
+        result["ausentes"] = ausentes
+    return result
+
+
+def measure_first_paint(tab, repeat=3):
+    try:
+        import streamlit  # noqa: F401
+    except ImportError:
+        return None
+    runs = [_child(_PAINT_CHILD, tab) for _ in range(repeat)]
+    result = {"first_paint": statistics.median(r["first_paint"] for r in runs)}
+    if runs[-1]["excecoes"]:
+        result["excecoes"] = runs[-1]["excecoes"]
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tempo de partida a frio do app, por aba")
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="interpretadores novos por medida")
+    parser.add_argument("--no-paint", action="store_true", help="mede só os imports")
+    parser.add_argument("--output", help="grava o resultado em JSON")
+    args = parser.parse_args(argv)
+
+    report = {}
+    for tab in TABS:
+        report[tab] = measure_imports(tab, args.repeat)
+        paint = None if args.no_paint else measure_first_paint(tab, max(1, args.repeat // 2))
+        report[tab].update(paint or {"first_paint": None})
+        r = report[tab]
+        paint_txt = f"{r['first_paint']:8.0f} ms" if r["first_paint"] is not None else "   (sem streamlit)"
+        print(f"{tab:<22} base {r['base']:7.0f} ms  aba {r['import']:7.0f} ms  "
+              f"primeiro uso {r['primeiro_uso']:7.0f} ms  first paint {paint_txt}")
+        for ausente in r.get("ausentes", []):
+            print(f"   ausente: {ausente}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# utils/clustering.py
+"""Motor de clusterização escalável usado por ``eda.cluster_analysis``.
+
+- a matriz padronizada fica em cache por dataset (varreduras de k a reutilizam);
+- MiniBatchKMeans/IncrementalPCA acima de ``MINIBATCH_MIN_ROWS`` linhas;
+- varredura de k (cotovelo + silhueta) em paralelo;
+- amostragem por grade que preserva a densidade para o gráfico de dispersão.
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.decomposition import PCA, IncrementalPCA
+from sklearn.metrics import silhouette_score
+
+MINIBATCH_MIN_ROWS = 20_000
+BATCH_SIZE = 4096
+MAX_PLOT_POINTS = 20_000
+SILHOUETTE_SAMPLE = 10_000
+SCALED_CACHE_SIZE = int(os.getenv("CLUSTER_CACHE_SIZE", "4"))
+SWEEP_WORKERS = min(4, os.cpu_count() or 1)
+
+_scaled = OrderedDict()
+_scaled_lock = threading.Lock()
+
+
+def compact_labels(labels, n_clusters):
+    """Rótulos no menor tipo inteiro que comporta ``n_clusters``."""
+    return np.asarray(labels).astype(np.min_scalar_type(max(n_clusters - 1, 0)))
+
+
+def _cache_entry(df, features, fingerprint):
+    key = (fingerprint, tuple(features) if features else None)
+    if fingerprint is not None:
+        with _scaled_lock:
+            if key in _scaled:
+                _scaled.move_to_end(key)
+                return _scaled[key]
+    num = df.select_dtypes(include=[np.number])
+    if features:
+        num = num[list(features)]
+    X = num.to_numpy(dtype=np.float32)
+    X = np.where(np.isnan(X), 0.0, X).astype(np.float32)
+    mean = X.mean(axis=0)
+    std = X.std(axis=0)
+    std[std == 0] = 1.0
+    entry = {"X": (X - mean) / std, "proj": None}
+    if fingerprint is not None:
+        with _scaled_lock:
+            _scaled[key] = entry
+            while len(_scaled) > SCALED_CACHE_SIZE:
+                _scaled.popitem(last=False)
+    return entry
+
+
+def clear_cache():
+    """Esquece as matrizes padronizadas (ex.: para medir a clusterização a frio)."""
+    with _scaled_lock:
+        _scaled.clear()
+
+
+def standardized_matrix(df, features=None, fingerprint=None):
+    """Matriz numérica padronizada (float32), em cache por (dataset, features)."""
+    return _cache_entry(df, features, fingerprint)["X"]
+
+
+def projection(df, features=None, fingerprint=None):
+    """Projeção 2D da matriz padronizada, em cache junto com ela."""
+    entry = _cache_entry(df, features, fingerprint)
+    if entry["proj"] is None:
+        entry["proj"] = project_2d(entry["X"])
+    return entry["proj"]
+
+
+def fit_kmeans(Xs, n_clusters, seed=42):
+    """Retorna (modelo, rótulos compactos); MiniBatchKMeans para matrizes grandes."""
+    if len(Xs) >= MINIBATCH_MIN_ROWS:
+        model = MiniBatchKMeans(n_clusters=n_clusters, batch_size=BATCH_SIZE, random_state=seed, n_init=3)
+    else:
+        model = KMeans(n_clusters=n_clusters, random_state=seed)
+    labels = model.fit_predict(Xs)
+    return model, compact_labels(labels, n_clusters)
+
+
+def project_2d(Xs):
+    """Projeção PCA 2D; IncrementalPCA (em lotes) para matrizes grandes."""
+    if len(Xs) >= MINIBATCH_MIN_ROWS:
+        pca = IncrementalPCA(n_components=2, batch_size=max(BATCH_SIZE, Xs.shape[1] * 5))
+    else:
+        pca = PCA(n_components=2)
+    return pca.fit_transform(Xs)
+
+
+def density_sample(points, max_points=MAX_PLOT_POINTS, grid=100, seed=0):
+    """Índices de uma amostra que preserva a densidade da nuvem 2D.
+
+    Cada célula de uma grade ``grid x grid`` mantém uma cota proporcional
+    ao seu número de pontos (no mínimo 1), então regiões esparsas e pontos
+    isolados continuam visíveis.
+    """
+    n = len(points)
+    if n <= max_points:
+        return np.arange(n)
+    rng = np.random.default_rng(seed)
+    lo, hi = points.min(axis=0), points.max(axis=0)
+    span = np.where(hi > lo, hi - lo, 1.0)
+    cells = np.minimum(((points - lo) / span * grid).astype(np.int64), grid - 1)
+    cell = cells[:, 0] * grid + cells[:, 1]
+    order = np.lexsort((rng.random(n), cell))
+    sorted_cell = cell[order]
+    starts = np.flatnonzero(np.r_[True, sorted_cell[1:] != sorted_cell[:-1]])
+    counts = np.diff(np.r_[starts, n])
+    quota = np.maximum(1, np.round(counts * max_points / n)).astype(np.int64)
+    rank = np.arange(n) - np.repeat(starts, counts)
+    keep = rank < np.repeat(quota, counts)
+    return np.sort(order[keep])
+
+
+def _score_k(Xs, k, seed, sample_idx):
+    if not 1 <= k <= len(Xs):
+        # mais clusters que linhas: k sem ajuste, em vez de derrubar a varredura inteira
+        return {"k": k, "inertia": np.nan, "silhouette": np.nan}
+    model, labels = fit_kmeans(Xs, k, seed)
+    sil = np.nan
+    # silhueta só é definida com 2 a n-1 rótulos distintos
+    if 1 < len(np.unique(labels[sample_idx])) < len(sample_idx):
+        sil = silhouette_score(Xs[sample_idx], labels[sample_idx])
+    return {"k": k, "inertia": float(model.inertia_), "silhouette": float(sil)}
+
+
+def sweep(Xs, k_values, seed=42, workers=None):
+    """Inércia (cotovelo) e silhueta para cada k, calculadas em paralelo.
+
+    Silhueta NaN quando indefinida (um único rótulo, ex.: dados constantes);
+    inércia também NaN quando ``k`` passa do número de linhas.
+    """
+    rng = np.random.default_rng(seed)
+    sample_idx = np.arange(len(Xs))
+    if len(Xs) > SILHOUETTE_SAMPLE:
+        sample_idx = np.sort(rng.choice(len(Xs), SILHOUETTE_SAMPLE, replace=False))
+    with ThreadPoolExecutor(max_workers=workers or SWEEP_WORKERS) as ex:
+        rows = list(ex.map(lambda k: _score_k(Xs, k, seed, sample_idx), k_values))
+    return pd.DataFrame(rows).set_index("k")
@@ -2,18 +2,34 @@
 import os
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA
 
-def load_csv(filelike):
-    """filelike: caminho (str) ou file-like (uploaded file). Retorna DataFrame."""
+# matplotlib (plot_cache.pyplot) e scikit-learn (utils.clustering) são
+# importados só na primeira função que os usa, não no carregamento do app
+from utils import jobs, metrics, plot_cache, schema
+
+# Acima deste tamanho o app usa utils.eda_stream (uma passada, memória limitada)
+STREAMING_THRESHOLD_BYTES = int(os.getenv("EDA_STREAMING_THRESHOLD_MB", "200")) * 1024 * 1024
+
+def file_size(filelike):
+    """Tamanho em bytes de um caminho ou arquivo enviado (None se desconhecido)."""
+    if isinstance(filelike, str):
+        return os.path.getsize(filelike)
+    return getattr(filelike, "size", None)
+
+@metrics.timed("eda.csv_parse")
+def load_csv(filelike, optimize=True):
+    """filelike: caminho (str) ou file-like (uploaded file). Retorna DataFrame.
+
+    Com ``optimize`` os tipos são compactados (``utils.schema``) e o resumo
+    antes/depois fica em ``df.attrs["memory"]``.
+    """
     if isinstance(filelike, str):
         df = pd.read_csv(filelike)
     else:
         # streamlit uploaded file is file-like
         df = pd.read_csv(filelike)
+    if optimize:
+        df, _ = schema.optimize(df)
     return df
 
 def get_column_types(df):
@@ -33,76 +49,175 @@ def describe_numeric(df):
             desc[k] = np.nan
     return desc[keep]
 
-def generate_histograms(df, columns=None, outdir='outputs'):
+@metrics.timed("eda.histograms")
+def generate_histograms(df, columns=None, outdir='outputs', bins=50, fingerprint=None):
+    """Histogramas por coluna, reaproveitando imagens já geradas para o mesmo dataset.
+
+    As contagens são calculadas aqui (np.histogram); só os misses são
+    desenhados, em paralelo quando há vários. Dentro de um job
+    (``utils.jobs``) o progresso é reportado por coluna desenhada.
+    """
     os.makedirs(outdir, exist_ok=True)
     if columns is None:
         columns = df.select_dtypes(include=[np.number]).columns.tolist()
-    images = {}
-    for col in columns:
+    fingerprint = fingerprint or plot_cache.dataset_fingerprint(df)
+    images, draw, pending = {}, [], []
+    for i, col in enumerate(columns):
+        jobs.report(0, len(columns), f"contagens: {i + 1}/{len(columns)}")
         try:
-            plt.figure()
-            df[col].dropna().hist(bins=50)
-            plt.title(f'Histograma - {col}')
-            path = os.path.join(outdir, f'hist_{col}.png')
-            plt.savefig(path, bbox_inches='tight')
-            plt.close()
-            images[col] = path
+            path = plot_cache.cache_path(outdir, 'hist', fingerprint, column=col, bins=bins)
+            if plot_cache.lookup(path):
+                images[col] = path
+                continue
+            counts, edges = plot_cache.histogram_counts(df[col].dropna(), bins=bins)
+            draw.append((path, f'Histograma - {col}', counts, edges))
+            pending.append(col)
         except Exception as e:
             images[col] = f"erro: {e}"
-    return images
+    cached = len(columns) - len(draw)
+
+    def progress(done, total):
+        jobs.report(cached + done, len(columns), f"desenhados: {done}/{total}")
+
+    for col, result in zip(pending, plot_cache.render_many(plot_cache.render_histogram, draw, progress)):
+        images[col] = f"erro: {result}" if isinstance(result, Exception) else result
+    if draw:
+        plot_cache.evict(outdir)
+    return {col: images[col] for col in columns}
+
+def correlation(df):
+    return df.select_dtypes(include=[np.number]).corr()
 
 def correlation_matrix(df, outdir='outputs'):
+    corr = correlation(df)
+    return corr, plot_correlation(corr, outdir)
+
+@metrics.timed("eda.correlation_plot")
+def plot_correlation(corr, outdir='outputs'):
     os.makedirs(outdir, exist_ok=True)
-    num = df.select_dtypes(include=[np.number])
-    corr = num.corr()
-    plt.figure(figsize=(10,8))
-    plt.imshow(corr, interpolation='nearest')
-    plt.colorbar()
-    plt.xticks(range(len(corr.columns)), corr.columns, rotation=90)
-    plt.yticks(range(len(corr.columns)), corr.columns)
-    path = os.path.join(outdir, 'correlation_matrix.png')
-    plt.title('Matriz de Correlação')
-    plt.savefig(path, bbox_inches='tight')
-    plt.close()
-    return corr, path
-
-def detect_outliers_iqr(df, columns=None):
+    # a própria matriz identifica o gráfico
+    path = plot_cache.cache_path(outdir, 'correlation_matrix', plot_cache.dataset_fingerprint(corr))
+    if plot_cache.lookup(path):
+        return path
+    with plot_cache.drawing() as plt:
+        plt.figure(figsize=(10,8))
+        plt.imshow(corr, interpolation='nearest')
+        plt.colorbar()
+        plt.xticks(range(len(corr.columns)), corr.columns, rotation=90)
+        plt.yticks(range(len(corr.columns)), corr.columns)
+        plt.title('Matriz de Correlação')
+        plot_cache.save_figure(plt, path)
+    plot_cache.evict(outdir)
+    return path
+
+@metrics.timed("eda.outliers")
+def detect_outliers_iqr(df, columns=None, method="iqr", threshold=None, as_bitmap=False):
+    """Detecta outliers em todas as colunas de uma vez (vetorizado).
+
+    method="iqr": fora de [Q1 - k*IQR, Q3 + k*IQR], k = threshold (padrão 1.5).
+    method="mad": |z robusto| = 0.6745*|x - mediana|/MAD > threshold (padrão 3.5).
+    Retorna (índices com ao menos um outlier, detalhes por coluna), ambos com
+    np.ndarray. Com as_bitmap=True cada coluna traz a máscara compactada
+    (np.packbits) em "bitmap" no lugar de "indices".
+    """
     if columns is None:
         columns = df.select_dtypes(include=[np.number]).columns
-    outlier_indices = set()
+    columns = list(columns)
+    X = df[columns].to_numpy(dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if method == "iqr":
+            k = 1.5 if threshold is None else threshold
+            q1, q3 = np.nanquantile(X, [0.25, 0.75], axis=0)
+            iqr = q3 - q1
+            mask = (X < q1 - k * iqr) | (X > q3 + k * iqr)
+        elif method == "mad":
+            k = 3.5 if threshold is None else threshold
+            med = np.nanmedian(X, axis=0)
+            mad = np.nanmedian(np.abs(X - med), axis=0)
+            mask = (0.6745 * np.abs(X - med) / mad > k) & (mad > 0)
+        else:
+            raise ValueError(f"Método de outlier desconhecido: {method}")
+    index = df.index.to_numpy()
+    counts = mask.sum(axis=0)
     detail = {}
-    for col in columns:
-        col_values = df[col].dropna()
-        Q1 = col_values.quantile(0.25)
-        Q3 = col_values.quantile(0.75)
-        IQR = Q3 - Q1
-        lower = Q1 - 1.5 * IQR
-        upper = Q3 + 1.5 * IQR
-        mask = (df[col] < lower) | (df[col] > upper)
-        idxs = df[mask].index.tolist()
-        detail[col] = {"count": len(idxs), "indices": idxs}
-        outlier_indices.update(idxs)
-    return sorted(list(outlier_indices)), detail
-
-def cluster_analysis(df, n_clusters=3, features=None, outdir='outputs'):
+    for j, col in enumerate(columns):
+        if as_bitmap:
+            detail[col] = {"count": int(counts[j]), "bitmap": np.packbits(mask[:, j])}
+        else:
+            detail[col] = {"count": int(counts[j]), "indices": index[mask[:, j]]}
+    outlier_indices = index[mask.any(axis=1)]
+    if not (df.index.is_monotonic_increasing and df.index.is_unique):
+        outlier_indices = np.unique(outlier_indices)
+    return outlier_indices, detail
+
+@metrics.timed("eda.cluster")
+def cluster_analysis(df, n_clusters=3, features=None, outdir='outputs', fingerprint=None):
+    """KMeans (MiniBatch em dados grandes) + projeção PCA 2D.
+
+    Usa todas as colunas numéricas por padrão. A matriz padronizada fica em
+    cache por dataset, então trocar só ``n_clusters`` não recalcula a escala.
+    Retorna (rótulos no menor tipo inteiro possível, caminho do gráfico).
+    """
     os.makedirs(outdir, exist_ok=True)
-    num = df.select_dtypes(include=[np.number]).fillna(0)
-    if features:
-        X = num[features]
-    else:
-        # limit dims for stability (use first up to 10 numeric features)
-        X = num.iloc[:, :min(10, num.shape[1])]
-    scaler = StandardScaler()
-    Xs = scaler.fit_transform(X)
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-    labels = kmeans.fit_predict(Xs)
+    fingerprint = fingerprint or plot_cache.dataset_fingerprint(df)
+    params = dict(k=n_clusters, features=list(features) if features else None)
+    path = plot_cache.cache_path(outdir, 'clusters', fingerprint, **params)
+    labels_path = plot_cache.cache_path(outdir, 'clusters', fingerprint, ext='npy', **params)
+    if plot_cache.lookup(labels_path) and plot_cache.lookup(path):
+        return np.load(labels_path), path
+    from utils import clustering
+
+    jobs.report(0, 4, "padronizando")
+    Xs = clustering.standardized_matrix(df, features, fingerprint)
+    jobs.report(1, 4, "KMeans")
+    _, labels = clustering.fit_kmeans(Xs, n_clusters)
     # 2D projection for plotting
-    pca = PCA(n_components=2)
-    proj = pca.fit_transform(Xs)
-    plt.figure()
-    plt.scatter(proj[:,0], proj[:,1], c=labels, s=10)
-    plt.title(f'Clusters (k={n_clusters}) - projeção PCA 2D')
-    path = os.path.join(outdir, f'clusters_k{n_clusters}.png')
-    plt.savefig(path, bbox_inches='tight')
-    plt.close()
+    jobs.report(2, 4, "projeção PCA")
+    proj = clustering.projection(df, features, fingerprint)
+    sample = clustering.density_sample(proj)
+    jobs.report(3, 4, "gráfico")
+    with plot_cache.drawing() as plt:
+        plt.figure()
+        plt.scatter(proj[sample,0], proj[sample,1], c=labels[sample], s=10)
+        title = f'Clusters (k={n_clusters}) - projeção PCA 2D'
+        if len(sample) < len(proj):
+            title += f' ({len(sample)} de {len(proj)} pontos)'
+        plt.title(title)
+        plot_cache.save_figure(plt, path)
+    np.save(labels_path, labels)
+    plot_cache.evict(outdir)
     return labels, path
+
+def best_k(scores):
+    """k de maior silhueta na tabela de ``cluster_sweep``; None se ela é NaN em todos."""
+    silhouette = scores['silhouette'].dropna()
+    return None if silhouette.empty else silhouette.idxmax()
+
+@metrics.timed("eda.cluster_sweep")
+def cluster_sweep(df, k_values=range(2, 9), features=None, outdir='outputs', fingerprint=None):
+    """Cotovelo (inércia) e silhueta para vários k. Retorna (tabela, caminho do gráfico)."""
+    os.makedirs(outdir, exist_ok=True)
+    fingerprint = fingerprint or plot_cache.dataset_fingerprint(df)
+    k_values = list(k_values)
+    from utils import clustering
+
+    jobs.report(0, 3, "padronizando")
+    Xs = clustering.standardized_matrix(df, features, fingerprint)
+    jobs.report(1, 3, f"varrendo k={k_values[0]}..{k_values[-1]}")
+    scores = clustering.sweep(Xs, k_values)
+    jobs.report(2, 3, "gráfico")
+    path = plot_cache.cache_path(outdir, 'cluster_sweep', fingerprint, k=k_values,
+                                 features=list(features) if features else None)
+    if not plot_cache.lookup(path):
+        with plot_cache.drawing() as plt:
+            fig, ax1 = plt.subplots()
+            ax1.plot(scores.index, scores['inertia'], marker='o')
+            ax1.set_xlabel('k')
+            ax1.set_ylabel('Inércia')
+            ax2 = ax1.twinx()
+            ax2.plot(scores.index, scores['silhouette'], marker='s', color='tab:orange')
+            ax2.set_ylabel('Silhueta')
+            plt.title('Cotovelo / silhueta por k')
+            plot_cache.save_figure(plt, path)
+        plot_cache.evict(outdir)
+    return scores, path
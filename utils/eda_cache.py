@@ -0,0 +1,215 @@
+# utils/eda_cache.py
+"""Cache em memória do CSV já lido e dos resultados derivados da aba EDA.
+
+Cada clique no Streamlit reexecuta o script; sem cache, o upload era
+relido e descrição, correlação e outliers recalculados a cada clique. Aqui
+a chave é o sha1 do conteúdo enviado (sessões que enviam o mesmo arquivo
+compartilham as entradas), o DataFrame lido e os resultados ficam num LRU
+por processo limitado a ``EDA_CACHE_MAX_MB``, e cada cálculo roda uma vez
+só mesmo com sessões concorrentes. Os objetos devolvidos são
+compartilhados: trate-os como somente leitura.
+
+A impressão digital de um DataFrame fica num registro por identidade do
+objeto, e não em ``df.attrs``: o pandas copia ``attrs`` para fatias e
+resultados de operações, que herdariam uma chave que não é deles.
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils import eda, eda_stream, metrics, plot_cache
+
+MAX_BYTES = int(os.getenv("EDA_CACHE_MAX_MB", "512")) * 1024 * 1024
+HASH_CHUNK = 1 << 20
+
+_fingerprints = {}
+_fingerprints_lock = threading.Lock()
+
+
+def sizeof(value):
+    """Estimativa do tamanho em bytes de um resultado (frames, arrays, tuplas, dicts)."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sizeof(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(k) + sizeof(v) for k, v in value.items())
+    if isinstance(value, (eda_stream.StreamingStats, eda_stream.KLLSketch)):
+        return sys.getsizeof(value) + sizeof(vars(value))
+    return sys.getsizeof(value)
+
+
+def upload_fingerprint(filelike):
+    """sha1 do conteúdo de um caminho ou arquivo enviado, lido em blocos."""
+    h = hashlib.sha1()
+    if isinstance(filelike, str):
+        with open(filelike, "rb") as f:
+            for block in iter(lambda: f.read(HASH_CHUNK), b""):
+                h.update(block)
+        return h.hexdigest()
+    filelike.seek(0)
+    for block in iter(lambda: filelike.read(HASH_CHUNK), b""):
+        h.update(block)
+    filelike.seek(0)
+    return h.hexdigest()
+
+
+def register(df, fingerprint):
+    """Associa ``fingerprint`` a este objeto DataFrame (enquanto ele existir)."""
+    key = id(df)
+
+    def _forget(_ref):
+        with _fingerprints_lock:
+            if _fingerprints.get(key, (None,))[0] is _ref:
+                del _fingerprints[key]
+
+    with _fingerprints_lock:
+        _fingerprints[key] = (weakref.ref(df, _forget), fingerprint)
+    return df
+
+
+def fingerprint_of(df):
+    """Impressão digital registrada; sem registro, o hash do conteúdo (uma vez por objeto)."""
+    with _fingerprints_lock:
+        item = _fingerprints.get(id(df))
+    if item is not None and item[0]() is df:
+        return item[1]
+    fingerprint = plot_cache.dataset_fingerprint(df)
+    register(df, fingerprint)
+    return fingerprint
+
+
+class EdaCache:
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._building = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build, check=None):
+        """Valor de ``key``; ``build()`` roda uma vez por chave (ou após remoção).
+
+        ``check(valor)`` falso força recalcular (ex.: gráfico removido do disco).
+        """
+        value = self._lookup(key, check)
+        if value is not None:
+            return value
+        with self._lock:
+            key_lock = self._building.setdefault(key, threading.Lock())
+        # cálculo fora do lock global; sessões concorrentes esperam a mesma chave
+        with key_lock:
+            try:
+                value = self._lookup(key, check, count=False)
+                if value is not None:
+                    return value
+                with metrics.span("eda.cache_build", item=str(key[1])):
+                    value = build()
+                self._store(key, value)
+                with self._lock:
+                    self.misses += 1
+                return value
+            finally:
+                # também quando build() falha: a próxima chamada tenta de novo
+                with self._lock:
+                    if self._building.get(key) is key_lock:
+                        del self._building[key]
+
+    def _lookup(self, key, check, count=True):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            value, _ = self._entries[key]
+            self._entries.move_to_end(key)
+        if check is not None and not check(value):
+            self.discard_key(key)
+            return None
+        if count:
+            with self._lock:
+                self.hits += 1
+        return value
+
+    def _store(self, key, value):
+        size = sizeof(value)
+        if size > self.max_bytes:
+            # maior que o orçamento inteiro: usado, mas não guardado
+            return
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self.bytes -= old_size
+
+    def discard_key(self, key):
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+
+    def discard(self, fingerprint=None):
+        """Remove as entradas de um dataset (ou todas, sem argumento)."""
+        with self._lock:
+            for key in list(self._entries):
+                if fingerprint is None or key[0] == fingerprint:
+                    self.bytes -= self._entries.pop(key)[1]
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "mb": self.bytes / 1024 ** 2,
+                    "hits": self.hits, "misses": self.misses}
+
+
+_default = EdaCache()
+
+
+def get_cache():
+    """Instância compartilhada por todas as sessões do processo."""
+    return _default
+
+
+def load_csv(filelike, cache=None, fingerprint=None):
+    """``eda.load_csv`` memorizado pelo conteúdo do arquivo.
+
+    ``fingerprint`` (de ``upload_fingerprint``) evita rehashear o arquivo
+    quando o chamador já o tem.
+    """
+    cache = cache or get_cache()
+    fingerprint = fingerprint or upload_fingerprint(filelike)
+
+    def build():
+        if hasattr(filelike, "seek"):
+            filelike.seek(0)
+        return eda.load_csv(filelike)
+
+    return register(cache.get((fingerprint, "frame"), build), fingerprint)
+
+
+def stream_stats(filelike, cache=None, fingerprint=None, **kwargs):
+    """``eda_stream.stream_stats`` memorizado pelo conteúdo: uma passada por arquivo."""
+    cache = cache or get_cache()
+    fingerprint = fingerprint or upload_fingerprint(filelike)
+    params = json.dumps(kwargs, sort_keys=True, default=str)
+    return cache.get((fingerprint, "stream_stats", params), lambda: eda_stream.stream_stats(filelike, **kwargs))
+
+
+def compute(df, func, *args, check=None, cache=None, **kwargs):
+    """``func(df, *args, **kwargs)`` memorizado por (dataset, função, argumentos)."""
+    cache = cache or get_cache()
+    params = json.dumps([args, kwargs], sort_keys=True, default=str)
+    key = (fingerprint_of(df), func.__name__, params)
+    return cache.get(key, lambda: func(df, *args, **kwargs), check)
@@ -0,0 +1,233 @@
+# utils/eda_stream.py
+"""Estatísticas em uma única passada para CSVs maiores que a memória.
+
+O arquivo é lido em blocos (``chunksize``) e cada bloco atualiza:
+- contagem/média/variância/mín/máx por coluna (Welford, mesclado por bloco);
+- um sketch KLL por coluna para quantis e mediana aproximados;
+- a matriz de covariância pareada (mesma semântica de ``DataFrame.corr``).
+
+A memória usada depende só do número de colunas numéricas e de ``k``.
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_CHUNKSIZE = 100_000
+
+
+class KLLSketch:
+    """Sketch KLL de quantis: ~3k valores guardados, erro de rank ~O(1/k)."""
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # com tamanho ímpar, o maior valor permanece no nível
+                rest = items[len(items) - len(items) % 2:]
+                items = items[:len(items) - len(items) % 2]
+                promoted = items[self._rng.integers(2)::2]
+                self.levels[level] = rest
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def quantiles(self, qs):
+        """Quantis aproximados para a sequência ``qs`` (valores em [0, 1])."""
+        if not self.n:
+            return np.full(len(qs), np.nan)
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(lvl), 2.0 ** h) for h, lvl in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        values, cum = values[order], np.cumsum(weights[order])
+        ranks = np.asarray(qs, dtype=float) * cum[-1]
+        pos = np.searchsorted(cum, ranks, side="left")
+        return values[np.clip(pos, 0, len(values) - 1)]
+
+
+class StreamingStats:
+    """Acumula estatísticas das colunas numéricas bloco a bloco.
+
+    Os tipos são os que o ``read_csv`` infere em cada bloco. Uma coluna
+    entra quando aparece numérica pela primeira vez (ex.: vazia nos
+    primeiros blocos); colunas com algum valor não numérico em qualquer
+    bloco ficam de fora do resultado, como num ``read_csv`` do arquivo
+    inteiro, que as leria como texto.
+    """
+
+    def __init__(self, k=200, seed=0):
+        self.k = k
+        self.seed = seed
+        self.columns = []
+        self.rows = 0
+        self._text = set()
+        self.n = np.zeros(0)
+        self.mean = np.zeros(0)
+        self.m2 = np.zeros(0)
+        self.min = np.zeros(0)
+        self.max = np.zeros(0)
+        self.sketches = []
+        # deslocamento fixo (média do 1º bloco com valores de cada coluna) para estabilidade numérica
+        self.shift = np.zeros(0)
+        self.pair_n = np.zeros((0, 0))
+        self.pair_sx = np.zeros((0, 0))
+        self.pair_sxx = np.zeros((0, 0))
+        self.pair_sxy = np.zeros((0, 0))
+
+    def _grow(self, new):
+        """Acrescenta colunas; nos blocos anteriores elas contam como ausentes."""
+        if not new:
+            return
+        old = len(self.columns)
+        pad, pad2 = [(0, len(new))], [(0, len(new)), (0, len(new))]
+        self.columns = self.columns + list(new)
+        self.n = np.pad(self.n, pad)
+        self.mean = np.pad(self.mean, pad)
+        self.m2 = np.pad(self.m2, pad)
+        self.min = np.pad(self.min, pad, constant_values=np.inf)
+        self.max = np.pad(self.max, pad, constant_values=-np.inf)
+        self.sketches += [KLLSketch(self.k, seed=self.seed + i) for i in range(old, len(self.columns))]
+        self.shift = np.pad(self.shift, pad, constant_values=np.nan)
+        for name in ("pair_n", "pair_sx", "pair_sxx", "pair_sxy"):
+            setattr(self, name, np.pad(getattr(self, name), pad2))
+
+    @property
+    def numeric_columns(self):
+        """Colunas só com valores numéricos em todos os blocos vistos."""
+        return [c for c in self.columns if c not in self._text]
+
+    def update(self, chunk):
+        self.rows += len(chunk)
+        numeric = chunk.select_dtypes(include=[np.number]).columns
+        for col in chunk.columns.difference(numeric):
+            if chunk[col].notna().any():
+                self._text.add(col)
+        known = set(self.columns)
+        self._grow([c for c in numeric if c not in known])
+        if not self.columns:
+            return self
+        X = chunk.reindex(columns=self.columns).apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+        mask = ~np.isnan(X)
+
+        # Welford/Chan: mescla (n, média, M2) do bloco com o acumulado
+        nb = mask.sum(axis=0).astype(float)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_b = np.where(nb > 0, np.nansum(X, axis=0) / nb, 0.0)
+        m2_b = np.nansum((X - mean_b) ** 2, axis=0)
+        n = self.n + nb
+        delta = mean_b - self.mean
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.mean = np.where(n > 0, self.mean + delta * nb / n, 0.0)
+            self.m2 = self.m2 + m2_b + np.where(n > 0, delta ** 2 * self.n * nb / n, 0.0)
+        self.n = n
+        if mask.any():
+            self.min = np.fmin(self.min, np.nanmin(np.where(mask, X, np.inf), axis=0))
+            self.max = np.fmax(self.max, np.nanmax(np.where(mask, X, -np.inf), axis=0))
+
+        for i, sketch in enumerate(self.sketches):
+            sketch.update(X[mask[:, i], i])
+
+        # somas pareadas (linhas onde as duas colunas existem)
+        unset = np.isnan(self.shift) & (nb > 0)
+        self.shift[unset] = mean_b[unset]
+        X0 = np.where(mask, X - self.shift, 0.0)
+        M = mask.astype(float)
+        self.pair_n += M.T @ M
+        self.pair_sx += X0.T @ M
+        self.pair_sxx += (X0 ** 2).T @ M
+        self.pair_sxy += X0.T @ X0
+        return self
+
+    def _keep(self):
+        return [i for i, c in enumerate(self.columns) if c not in self._text]
+
+    def describe(self):
+        """Mesmo formato de ``eda.describe_numeric`` (quantis aproximados)."""
+        keep = ['count', 'mean', 'median', 'std', 'variance', 'min', '25%', '50%', '75%', 'max']
+        idx = self._keep()
+        if not idx:
+            return pd.DataFrame(columns=keep)
+        n, m2 = self.n[idx], self.m2[idx]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            variance = np.where(n > 1, m2 / (n - 1), np.nan)
+        empty = n == 0
+        q = np.array([self.sketches[i].quantiles([0.25, 0.5, 0.75]) for i in idx])
+        desc = pd.DataFrame({
+            'count': n,
+            'mean': np.where(empty, np.nan, self.mean[idx]),
+            'median': q[:, 1],
+            'std': np.sqrt(variance),
+            'variance': variance,
+            'min': np.where(empty, np.nan, self.min[idx]),
+            '25%': q[:, 0],
+            '50%': q[:, 1],
+            '75%': q[:, 2],
+            'max': np.where(empty, np.nan, self.max[idx]),
+        }, index=self.numeric_columns)
+        return desc[keep]
+
+    def _pairs(self):
+        idx = np.ix_(self._keep(), self._keep())
+        return self.pair_n[idx], self.pair_sx[idx], self.pair_sxx[idx], self.pair_sxy[idx]
+
+    def covariance(self):
+        n, sx, _, sxy = self._pairs()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = (sxy - sx * sx.T / n) / (n - 1)
+        cols = self.numeric_columns
+        return pd.DataFrame(cov, index=cols, columns=cols)
+
+    def correlation(self):
+        """Correlação de Pearson pareada, como ``DataFrame.corr()``."""
+        n, sx, sxx, sxy = self._pairs()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = sxy - sx * sx.T / n
+            var_i = sxx - sx ** 2 / n
+            corr = cov / np.sqrt(var_i * var_i.T)
+        corr = np.clip(corr, -1.0, 1.0)
+        cols = self.numeric_columns
+        return pd.DataFrame(corr, index=cols, columns=cols)
+
+
+def stream_stats(filelike, chunksize=DEFAULT_CHUNKSIZE, k=200, seed=0, **read_kwargs):
+    """Percorre o CSV uma vez e retorna o ``StreamingStats`` acumulado."""
+    if hasattr(filelike, "seek"):
+        filelike.seek(0)
+    stats = StreamingStats(k=k, seed=seed)
+    for chunk in pd.read_csv(filelike, chunksize=chunksize, **read_kwargs):
+        stats.update(chunk)
+    return stats
+
+
+def correlation_matrix(stats, outdir='outputs'):
+    """Equivalente a ``eda.correlation_matrix`` a partir de um ``StreamingStats``."""
+    from utils.eda import plot_correlation
+    corr = stats.correlation()
+    return corr, plot_correlation(corr, outdir)
+
+
+def head(filelike, n=5):
+    """Primeiras linhas do CSV sem carregá-lo inteiro."""
+    if hasattr(filelike, "seek"):
+        filelike.seek(0)
+    return pd.read_csv(filelike, nrows=n)
@@ -0,0 +1,71 @@
+# utils/engine_registry.py
+"""Registro de query engines por (impressão digital do dataset, tabela).
+
+Substitui ``st.cache_resource`` em ``get_query_engine``: o Streamlit
+hasheava o DataFrame inteiro a cada rerun só para achar o engine em cache.
+Aqui a chave é o sha1 do arquivo de origem (calculado uma vez no load), o
+engine é criado sob demanda e no máximo ``MAX_ENGINES`` ficam vivos (LRU).
+O registro é por processo, então é compartilhado entre as sessões.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+MAX_ENGINES = int(os.getenv("MAX_QUERY_ENGINES", "8"))
+
+
+class EngineRegistry:
+    def __init__(self, max_engines=MAX_ENGINES):
+        self.max_engines = max_engines
+        self._engines = OrderedDict()
+        self._lock = threading.Lock()
+        self._building = {}
+        self.builds = 0
+        self.hits = 0
+
+    def get(self, key, build):
+        """Engine de ``key``; chama ``build()`` só na primeira vez (ou após remoção)."""
+        with self._lock:
+            if key in self._engines:
+                self._engines.move_to_end(key)
+                self.hits += 1
+                return self._engines[key]
+            key_lock = self._building.setdefault(key, threading.Lock())
+        # construção fora do lock global; sessões concorrentes esperam a mesma chave
+        with key_lock:
+            try:
+                with self._lock:
+                    if key in self._engines:
+                        self.hits += 1
+                        return self._engines[key]
+                engine = build()
+                with self._lock:
+                    self._engines[key] = engine
+                    self.builds += 1
+                    while len(self._engines) > self.max_engines:
+                        self._engines.popitem(last=False)
+                return engine
+            finally:
+                # também quando build() falha (ex.: sem GROQ_API_KEY)
+                with self._lock:
+                    if self._building.get(key) is key_lock:
+                        del self._building[key]
+
+    def discard(self, fingerprint=None):
+        """Remove os engines de um dataset (ou todos, sem argumento)."""
+        with self._lock:
+            for key in list(self._engines):
+                if fingerprint is None or key[0] == fingerprint:
+                    del self._engines[key]
+
+    def stats(self):
+        with self._lock:
+            return {"engines": len(self._engines), "builds": self.builds, "hits": self.hits}
+
+
+_default = EngineRegistry()
+
+
+def get_registry():
+    """Instância compartilhada por todas as sessões do processo."""
+    return _default
@@ -0,0 +1,79 @@
+# utils/fake_llm.py
+"""LLM local de mentira para testes de carga do agente de NF sem a API.
+
+Responde ao prompt do PandasQueryEngine com expressões pandas enlatadas
+(por pergunta normalizada) ou reproduzidas de um arquivo JSONL gravado
+antes (``{"question": ..., "response": ...}`` por linha), simulando a
+latência de rede com ``latency`` (+ ``jitter``) segundos.
+"""
+import asyncio
+import json
+import random
+import re
+import time
+from typing import Any, Dict
+
+from llama_index.core.llms import CompletionResponse, CompletionResponseGen, CustomLLM, LLMMetadata
+from llama_index.core.llms.callbacks import llm_completion_callback
+
+from utils.llm_cache import normalize_question
+
+_QUERY = re.compile(r"Query:\s*(.*?)\s*\n\s*\n\s*Expression:", re.S)
+
+
+class FakeLLM(CustomLLM):
+    responses: Dict[str, str] = {}
+    default_response: str = "len(df)"
+    latency: float = 0.0
+    jitter: float = 0.0
+    calls: int = 0
+
+    @classmethod
+    def from_jsonl(cls, path, **kwargs: Any) -> "FakeLLM":
+        """Carrega respostas gravadas (uma por linha: question/response)."""
+        responses = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    responses[item["question"]] = item["response"]
+        return cls(responses=responses, **kwargs)
+
+    def model_post_init(self, __context: Any) -> None:
+        self.responses = {normalize_question(q): r for q, r in self.responses.items()}
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(model_name="fake-llm", is_chat_model=False)
+
+    def _lookup(self, prompt: str) -> str:
+        m = _QUERY.search(prompt)
+        question = normalize_question(m.group(1) if m else prompt)
+        self.calls += 1
+        return self.responses.get(question, self.default_response)
+
+    def _delay(self) -> float:
+        return self.latency + random.uniform(0, self.jitter)
+
+    def _answer(self, prompt: str) -> str:
+        delay = self._delay()
+        if delay > 0:
+            time.sleep(delay)
+        return self._lookup(prompt)
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return CompletionResponse(text=self._answer(prompt))
+
+    @llm_completion_callback()
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        # latência simulada sem bloquear o event loop
+        delay = self._delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return CompletionResponse(text=self._lookup(prompt))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        text = self._answer(prompt)
+        yield CompletionResponse(text=text, delta=text)
@@ -1,53 +1,376 @@
-import pandas as pd
-import random
-from faker import Faker
-from datetime import datetime, timedelta
+# utils/gerar_dados.py
+"""Gerador sintético de Notas Fiscais no schema real (Cabeçalho/Itens).
+
+Feito para testes de carga: as linhas saem de "pools" de valores
+pré-amostrados (por padrão, os CSVs de exemplo em ``data/``) com sorteios
+vetorizados do NumPy e distribuição de Zipf, que reproduz a concentração
+real (poucos emitentes/produtos respondem pela maior parte das notas).
+Cada bloco de notas tem sua própria semente derivada de ``--seed``, então o
+resultado não depende do número de workers. Os blocos são gerados em
+paralelo e gravados direto num ZIP (CSV) ou em Parquet particionado.
+A chave de acesso tem os 44 dígitos do layout oficial, com dígito
+verificador. O Faker é opcional: só amplia o pool de razões sociais.
+
+Uso:
+    python -m utils.gerar_dados --notas 1000000 --mes 202401 --formato zip
+    python -m utils.gerar_dados --notas 5000000 --formato parquet --workers 8
+"""
+import argparse
+import logging
+import multiprocessing
 import os
+import shutil
+import tempfile
+import time
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    from faker import Faker
+except ImportError:
+    Faker = None
+
+DATA_DIR = os.getenv("DATA_DIR", "data")
+AMOSTRA_CABECALHO = "202401_NFs_Cabecalho.csv"
+AMOSTRA_ITENS = "202401_NFs_Itens.csv"
+
+CABECALHO_COLUMNS = [
+    "CHAVE DE ACESSO", "MODELO", "SÉRIE", "NÚMERO", "NATUREZA DA OPERAÇÃO", "DATA EMISSÃO",
+    "EVENTO MAIS RECENTE", "DATA/HORA EVENTO MAIS RECENTE", "CPF/CNPJ Emitente",
+    "RAZÃO SOCIAL EMITENTE", "INSCRIÇÃO ESTADUAL EMITENTE", "UF EMITENTE", "MUNICÍPIO EMITENTE",
+    "CNPJ DESTINATÁRIO", "NOME DESTINATÁRIO", "UF DESTINATÁRIO", "INDICADOR IE DESTINATÁRIO",
+    "DESTINO DA OPERAÇÃO", "CONSUMIDOR FINAL", "PRESENÇA DO COMPRADOR", "VALOR NOTA FISCAL",
+]
+# colunas do cabeçalho repetidas em cada item
+ITENS_HEADER_COLUMNS = [c for c in CABECALHO_COLUMNS[:-1]
+                        if c not in ("EVENTO MAIS RECENTE", "DATA/HORA EVENTO MAIS RECENTE")]
+ITENS_COLUMNS = ITENS_HEADER_COLUMNS + [
+    "NÚMERO PRODUTO", "DESCRIÇÃO DO PRODUTO/SERVIÇO", "CÓDIGO NCM/SH", "NCM/SH (TIPO DE PRODUTO)",
+    "CFOP", "QUANTIDADE", "UNIDADE", "VALOR UNITÁRIO", "VALOR TOTAL",
+]
+
+MODELO = "55 - NF-E EMITIDA EM SUBSTITUIÇÃO AO MODELO 1 OU 1A"
+EVENTOS = (["Autorização de Uso", "Cancelamento da NF-e"], [0.97, 0.03])
+INDICADOR_IE = (["NÃO CONTRIBUINTE", "CONTRIBUINTE ISENTO", "CONTRIBUINTE ICMS"], [0.83, 0.11, 0.06])
+CONSUMIDOR = (["1 - CONSUMIDOR FINAL", "0 - NORMAL"], [0.91, 0.09])
+PRESENCA = ([
+    "0 - NÃO SE APLICA", "1 - OPERAÇÃO PRESENCIAL", "9 - OPERAÇÃO NÃO PRESENCIAL, OUTROS",
+    "2 - OPERAÇÃO NÃO PRESENCIAL, PELA INTERNET", "3 - OPERAÇÃO NÃO PRESENCIAL, TELEATENDIMENTO",
+], [0.41, 0.25, 0.25, 0.08, 0.01])
+DESTINO_INTERNA = "1 - OPERAÇÃO INTERNA"
+DESTINO_INTERESTADUAL = "2 - OPERAÇÃO INTERESTADUAL"
+# sufixos de CFOP; o primeiro dígito (5 interna / 6 interestadual) vem do destino
+CFOP_SUFIXOS = ([102, 405, 403, 108, 117, 949, 906, 101], [0.4, 0.15, 0.12, 0.1, 0.08, 0.08, 0.04, 0.03])
+UNIDADES_FRACIONADAS = {"KG", "L", "LITRO", "METRO", "M", "M2", "M3", "TON"}
+
+# código IBGE da UF (dois primeiros dígitos da chave de acesso)
+UF_CODIGOS = {
+    "RO": 11, "AC": 12, "AM": 13, "RR": 14, "PA": 15, "AP": 16, "TO": 17, "MA": 21, "PI": 22,
+    "CE": 23, "RN": 24, "PB": 25, "PE": 26, "AL": 27, "SE": 28, "BA": 29, "MG": 31, "ES": 32,
+    "RJ": 33, "SP": 35, "PR": 41, "SC": 42, "RS": 43, "MS": 50, "MT": 51, "GO": 52, "DF": 53,
+}
+# pools mínimos quando não há CSV de amostra
+_MUNICIPIOS = [("SP", "SAO PAULO"), ("SP", "CAMPINAS"), ("RJ", "RIO DE JANEIRO"), ("MG", "BELO HORIZONTE"),
+               ("PR", "CURITIBA"), ("RS", "PORTO ALEGRE"), ("SC", "FLORIANOPOLIS"), ("DF", "BRASILIA"),
+               ("BA", "SALVADOR"), ("PE", "RECIFE"), ("GO", "GOIANIA"), ("AM", "MANAUS")]
+_NATUREZAS = ["VENDA", "Venda de mercadoria", "VENDA DE MERCADORIA ADQUIRIDA OU RECEBIDA DE TERCEIROS",
+              "REMESSA - ENTREGA FUTURA", "RETORNO DE MATERIAL DEPOSITADO EM ARMAZEM GERAL", "OUTRAS SAIDAS"]
+_PRODUTOS = [("PRODUTO DIVERSO", 99999999, "Outros produtos", "UNIDAD", 50.0),
+             ("AGUA MINERAL 500ML", 22011000, "Águas minerais e águas gaseificadas", "CX", 20.0),
+             ("LIVRO DIDATICO", 49019900, "Outros livros, brochuras e impressos semelhantes", "UNIDAD", 80.0),
+             ("CIMENTO CP II 50KG", 25232910, "Cimentos Portland", "KG", 1.2)]
+_PALAVRAS = ["COMERCIAL", "DISTRIBUIDORA", "INDUSTRIA", "ATACADO", "SERVICOS", "LOGISTICA", "SUPRIMENTOS",
+             "BRASIL", "NACIONAL", "SUL", "NORTE", "CENTRAL", "UNIAO", "ALIANCA", "PROGRESSO", "ESTRELA",
+             "SILVA", "SANTOS", "OLIVEIRA", "SOUZA", "PEREIRA", "COSTA", "RODRIGUES", "ALMEIDA"]
+_SUFIXOS = ["LTDA", "S.A.", "EIRELI", "ME", "EPP"]
+
+CHUNK_NOTAS = 100_000
+MAX_ITENS = 50
+ZIPF_A = 1.1
+
+
+def zipf_probs(n, a=ZIPF_A, rng=None):
+    """Probabilidades ~ 1/rank^a; com ``rng`` o rank de cada posição é embaralhado."""
+    p = 1.0 / np.arange(1, n + 1) ** a
+    p /= p.sum()
+    return rng.permutation(p) if rng is not None else p
+
+
+def _nomes_sinteticos(rng, n):
+    a = rng.choice(_PALAVRAS, n)
+    b = rng.choice(_PALAVRAS, n)
+    c = rng.choice(_SUFIXOS, n)
+    return np.char.add(np.char.add(np.char.add(a, " "), np.char.add(b, " ")), c).astype(object)
+
+
+def _nomes(rng, base, n, use_faker):
+    """Completa ``base`` até ``n`` nomes (Faker quando disponível, senão combinações de palavras)."""
+    base = list(dict.fromkeys(base))[:n]
+    falta = n - len(base)
+    extras = []
+    if falta > 0 and use_faker and Faker is not None:
+        fake = Faker("pt_BR")
+        fake.seed_instance(int(rng.integers(2**31)))
+        # o Faker só alimenta o pool (algumas centenas de chamadas), nunca linha a linha
+        extras = [fake.company().upper() for _ in range(min(falta, 2000))]
+    if falta - len(extras) > 0:
+        extras += list(_nomes_sinteticos(rng, falta - len(extras)))
+    return np.array(base + extras, dtype=object)
+
+
+def _ler_amostras(amostra_dir):
+    cab_path = os.path.join(amostra_dir, AMOSTRA_CABECALHO)
+    itens_path = os.path.join(amostra_dir, AMOSTRA_ITENS)
+    if not (os.path.exists(cab_path) and os.path.exists(itens_path)):
+        return None, None
+    return pd.read_csv(cab_path, dtype=str), pd.read_csv(itens_path, dtype=str)
+
+
+def build_pools(seed=0, emitentes=5000, destinatarios=20000, produtos=50000,
+                amostra_dir=DATA_DIR, use_faker=True):
+    """Pools de valores (arrays NumPy) a partir das amostras reais, ampliados até o tamanho pedido."""
+    rng = np.random.default_rng(seed)
+    cab, itens = _ler_amostras(amostra_dir) if amostra_dir else (None, None)
+    if cab is not None:
+        municipios = cab[["UF EMITENTE", "MUNICÍPIO EMITENTE"]].dropna().drop_duplicates().values.tolist()
+        naturezas = cab["NATUREZA DA OPERAÇÃO"].dropna().unique().tolist()
+        razoes = cab["RAZÃO SOCIAL EMITENTE"].dropna().tolist()
+        nomes_dest = cab["NOME DESTINATÁRIO"].dropna().tolist()
+        prod = itens.assign(preco=pd.to_numeric(itens["VALOR UNITÁRIO"], errors="coerce"),
+                            ncm=pd.to_numeric(itens["CÓDIGO NCM/SH"], errors="coerce"))
+        prod = prod.dropna(subset=["preco", "ncm"]).groupby("DESCRIÇÃO DO PRODUTO/SERVIÇO").agg(
+            ncm=("ncm", "first"), tipo=("NCM/SH (TIPO DE PRODUTO)", "first"),
+            unidade=("UNIDADE", "first"), preco=("preco", "median")).reset_index()
+        base_prod = list(prod.itertuples(index=False, name=None))
+    else:
+        municipios, naturezas, razoes, nomes_dest = _MUNICIPIOS, _NATUREZAS, [], []
+        base_prod = _PRODUTOS
+    municipios = [m for m in municipios if m[0] in UF_CODIGOS] or _MUNICIPIOS
+
+    # emitentes: cada um com CNPJ, IE, razão social e município fixos
+    loc = rng.choice(len(municipios), emitentes, p=zipf_probs(len(municipios), rng=rng))
+    pools = {
+        "emit_cnpj": rng.integers(10**11, 10**14, emitentes),
+        "emit_ie": rng.integers(10**8, 10**12, emitentes),
+        "emit_nome": _nomes(rng, razoes, emitentes, use_faker),
+        "emit_uf": np.array([municipios[i][0] for i in loc], dtype=object),
+        "emit_municipio": np.array([municipios[i][1] for i in loc], dtype=object),
+        "emit_uf_codigo": np.array([UF_CODIGOS[municipios[i][0]] for i in loc], dtype=np.int64),
+        "emit_p": zipf_probs(emitentes, rng=rng),
+        "dest_cnpj": rng.integers(10**10, 10**14, destinatarios),
+        "dest_nome": _nomes(rng, nomes_dest, destinatarios, use_faker),
+        "dest_uf": np.array(list(UF_CODIGOS), dtype=object)[
+            rng.choice(len(UF_CODIGOS), destinatarios, p=zipf_probs(len(UF_CODIGOS), rng=rng))],
+        "dest_p": zipf_probs(destinatarios, rng=rng),
+        "natureza": np.array(naturezas, dtype=object),
+        "natureza_p": zipf_probs(len(naturezas), rng=rng),
+    }
+    # produtos: as amostras e variações delas (mesmo NCM/unidade, preço deslocado)
+    idx = np.concatenate([np.arange(len(base_prod)),
+                          rng.integers(0, len(base_prod), max(0, produtos - len(base_prod)))])[:produtos]
+    desc, ncm, tipo, unidade, preco = (np.array(col, dtype=object) for col in zip(*base_prod))
+    variante = np.arange(len(idx)) >= len(base_prod)
+    codigos = np.char.zfill(np.arange(len(idx)).astype(str), 6)
+    pools.update({
+        "prod_desc": np.where(variante, desc[idx] + " REF " + codigos.astype(object), desc[idx]),
+        "prod_ncm": ncm[idx].astype(np.int64),
+        "prod_tipo": tipo[idx],
+        "prod_unidade": unidade[idx],
+        "prod_preco": preco[idx].astype(float) * np.where(variante, rng.lognormal(0, 0.5, len(idx)), 1.0),
+        "prod_p": zipf_probs(len(idx), rng=rng),
+    })
+    pools["prod_fracionado"] = np.isin(pools["prod_unidade"], list(UNIDADES_FRACIONADAS))
+    return pools
+
+
+def _escolher(rng, valores, n):
+    opcoes, p = valores
+    return np.asarray(opcoes, dtype=object)[rng.choice(len(opcoes), n, p=p)]
+
+
+def _digitos(valores, largura):
+    """Matriz (n, largura) com os dígitos decimais de ``valores``, com zeros à esquerda."""
+    pot = 10 ** np.arange(largura - 1, -1, -1, dtype=np.int64)
+    return (np.asarray(valores, dtype=np.int64)[:, None] // pot) % 10
+
+
+def chaves_de_acesso(uf, aamm, cnpj, serie, numero, codigo):
+    """Chaves de 44 dígitos (cUF, AAMM, CNPJ, modelo 55, série, número, tpEmis, cNF, DV)."""
+    n = len(cnpj)
+    campos = np.hstack([
+        _digitos(uf, 2), _digitos(np.full(n, aamm), 4), _digitos(cnpj, 14), _digitos(np.full(n, 55), 2),
+        _digitos(serie, 3), _digitos(numero, 9), _digitos(np.ones(n), 1), _digitos(codigo, 8),
+    ])
+    # DV módulo 11 com pesos 2..9 da direita para a esquerda
+    pesos = np.resize(np.arange(2, 10), 43)[::-1]
+    resto = (campos @ pesos) % 11
+    dv = np.where(resto < 2, 0, 11 - resto)
+    digitos = np.hstack([campos, dv[:, None]]).astype(np.uint8) + ord("0")
+    return np.ascontiguousarray(digitos).view("S44").ravel().astype(str).astype(object)
+
+
+def _texto_data(datas):
+    return np.char.replace(np.datetime_as_string(datas, unit="s"), "T", " ").astype(object)
+
+
+def _datas(rng, inicio, segundos, n):
+    emissao = np.datetime64(inicio, "s") + rng.integers(0, segundos, n).astype("timedelta64[s]")
+    evento = emissao + rng.exponential(60, n).astype(np.int64).astype("timedelta64[s]")
+    return _texto_data(emissao), _texto_data(evento)
+
+
+def gerar_bloco(pools, n_notas, seed, mes="202401"):
+    """Gera (cabecalho, itens) de ``n_notas`` notas com a semente ``seed``."""
+    rng = np.random.default_rng(seed)
+    inicio = datetime.strptime(mes, "%Y%m")
+    fim = datetime(inicio.year + inicio.month // 12, inicio.month % 12 + 1, 1)
+
+    e = rng.choice(len(pools["emit_p"]), n_notas, p=pools["emit_p"])
+    d = rng.choice(len(pools["dest_p"]), n_notas, p=pools["dest_p"])
+    uf_emit, uf_dest = pools["emit_uf"][e], pools["dest_uf"][d]
+    interna = uf_emit == uf_dest
+    serie = np.minimum(rng.zipf(2.0, n_notas) - 1, 999)
+    numero = rng.integers(1, 10**9, n_notas)
+    emissao, evento = _datas(rng, inicio, int((fim - inicio).total_seconds()), n_notas)
+    cab = pd.DataFrame({
+        "CHAVE DE ACESSO": chaves_de_acesso(pools["emit_uf_codigo"][e], int(mes[2:]), pools["emit_cnpj"][e], serie, numero,
+                                            rng.integers(0, 10**8, n_notas)),
+        "MODELO": MODELO,
+        "SÉRIE": serie,
+        "NÚMERO": numero,
+        "NATUREZA DA OPERAÇÃO": pools["natureza"][
+            rng.choice(len(pools["natureza"]), n_notas, p=pools["natureza_p"])],
+        "DATA EMISSÃO": emissao,
+        "EVENTO MAIS RECENTE": _escolher(rng, EVENTOS, n_notas),
+        "DATA/HORA EVENTO MAIS RECENTE": evento,
+        "CPF/CNPJ Emitente": np.char.zfill(pools["emit_cnpj"][e].astype(str), 14).astype(object),
+        "RAZÃO SOCIAL EMITENTE": pools["emit_nome"][e],
+        "INSCRIÇÃO ESTADUAL EMITENTE": pools["emit_ie"][e],
+        "UF EMITENTE": uf_emit,
+        "MUNICÍPIO EMITENTE": pools["emit_municipio"][e],
+        "CNPJ DESTINATÁRIO": pools["dest_cnpj"][d],
+        "NOME DESTINATÁRIO": pools["dest_nome"][d],
+        "UF DESTINATÁRIO": uf_dest,
+        "INDICADOR IE DESTINATÁRIO": _escolher(rng, INDICADOR_IE, n_notas),
+        "DESTINO DA OPERAÇÃO": np.where(interna, DESTINO_INTERNA, DESTINO_INTERESTADUAL).astype(object),
+        "CONSUMIDOR FINAL": _escolher(rng, CONSUMIDOR, n_notas),
+        "PRESENÇA DO COMPRADOR": _escolher(rng, PRESENCA, n_notas),
+    })
+
+    # itens: quantidade por nota geométrica (muitas notas com 1-3 itens, cauda longa)
+    n_itens = np.minimum(rng.geometric(0.35, n_notas), MAX_ITENS)
+    nota = np.repeat(np.arange(n_notas), n_itens)
+    inicio_nota = np.cumsum(n_itens) - n_itens
+    p = rng.choice(len(pools["prod_p"]), len(nota), p=pools["prod_p"])
+    qtd = rng.lognormal(0.7, 1.0, len(nota))
+    qtd = np.where(pools["prod_fracionado"][p], np.round(qtd, 3), np.ceil(qtd))
+    unitario = np.round(pools["prod_preco"][p] * rng.lognormal(0, 0.15, len(nota)), 2).clip(0.01)
+    total = np.round(qtd * unitario, 2)
+    cfop = np.where(interna[nota], 5000, 6000) + np.asarray(CFOP_SUFIXOS[0])[
+        rng.choice(len(CFOP_SUFIXOS[0]), len(nota), p=CFOP_SUFIXOS[1])]
+
+    itens = cab[ITENS_HEADER_COLUMNS].take(nota).reset_index(drop=True)
+    itens["NÚMERO PRODUTO"] = np.arange(len(nota)) - np.repeat(inicio_nota, n_itens) + 1
+    itens["DESCRIÇÃO DO PRODUTO/SERVIÇO"] = pools["prod_desc"][p]
+    itens["CÓDIGO NCM/SH"] = pools["prod_ncm"][p]
+    itens["NCM/SH (TIPO DE PRODUTO)"] = pools["prod_tipo"][p]
+    itens["CFOP"] = cfop
+    itens["QUANTIDADE"] = qtd
+    itens["UNIDADE"] = pools["prod_unidade"][p]
+    itens["VALOR UNITÁRIO"] = unitario
+    itens["VALOR TOTAL"] = total
+    # o valor da nota é a soma dos itens, como no dado real
+    cab["VALOR NOTA FISCAL"] = np.round(np.bincount(nota, weights=total, minlength=n_notas), 2)
+    return cab, itens
+
+
+def _gerar_parte(pools, n_notas, seed, mes, formato, destino, parte):
+    """Worker: gera um bloco e grava as duas partes; retorna (caminhos, linhas)."""
+    cab, itens = gerar_bloco(pools, n_notas, seed, mes)
+    caminhos = []
+    for nome, df in (("Cabecalho", cab), ("Itens", itens)):
+        if formato == "parquet":
+            pasta = os.path.join(destino, f"{mes}_NFs_{nome}")
+            os.makedirs(pasta, exist_ok=True)
+            path = os.path.join(pasta, f"part-{parte:05d}.parquet")
+            df.to_parquet(path, index=False)
+        else:
+            path = os.path.join(destino, f"{nome}-{parte:05d}.csv")
+            df.to_csv(path, index=False, header=parte == 0, encoding="utf-8")
+        caminhos.append(path)
+    return caminhos, (len(cab), len(itens))
+
+
+def _montar_zip(zip_path, mes, partes, compresslevel):
+    """Concatena as partes CSV em dois membros do ZIP, em streaming."""
+    tmp = f"{zip_path}.{os.getpid()}.tmp"
+    with zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as zf:
+        for i, nome in enumerate(("Cabecalho", "Itens")):
+            with zf.open(f"{mes}_NFs_{nome}.csv", "w", force_zip64=True) as out:
+                for caminhos in partes:
+                    with open(caminhos[i], "rb") as src:
+                        shutil.copyfileobj(src, out, 8 * 1024 * 1024)
+    os.replace(tmp, zip_path)
+
+
+def gerar(n_notas, mes="202401", formato="zip", saida=os.path.join(DATA_DIR, "sintetico"), seed=42,
+          workers=None, chunk=CHUNK_NOTAS, pools=None, compresslevel=1):
+    """Gera ``n_notas`` notas (itens ~2,9x) e retorna o caminho do ZIP ou da pasta Parquet."""
+    os.makedirs(saida, exist_ok=True)
+    pools = pools if pools is not None else build_pools(seed)
+    tamanhos = [min(chunk, n_notas - i) for i in range(0, n_notas, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(tamanhos))
+    workers = workers or min(len(tamanhos), os.cpu_count() or 1)
+    tmpdir = tempfile.mkdtemp(prefix="nf_gen_", dir=saida) if formato == "zip" else saida
+    jobs = [(pools, n, s, mes, formato, tmpdir, i) for i, (n, s) in enumerate(zip(tamanhos, seeds))]
+    inicio = time.perf_counter()
+    try:
+        if workers <= 1 or len(jobs) <= 1:
+            resultados = [_gerar_parte(*job) for job in jobs]
+        else:
+            # spawn: seguro também quando chamado de dentro do Streamlit
+            ctx = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+                resultados = list(pool.map(_gerar_parte, *zip(*jobs)))
+        if formato == "zip":
+            destino = os.path.join(saida, f"{mes}_NFs.zip")
+            _montar_zip(destino, mes, [r[0] for r in resultados], compresslevel)
+        else:
+            destino = saida
+    finally:
+        if formato == "zip":
+            shutil.rmtree(tmpdir, ignore_errors=True)
+    linhas = np.sum([r[1] for r in resultados], axis=0)
+    logging.info(f"{linhas[0]} notas / {linhas[1]} itens em {time.perf_counter() - inicio:.1f} s -> {destino}")
+    return destino
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera NFs sintéticas no schema real")
+    parser.add_argument("--notas", type=int, default=100_000)
+    parser.add_argument("--mes", default="202401", help="AAAAMM")
+    parser.add_argument("--formato", choices=["zip", "parquet"], default="zip")
+    parser.add_argument("--saida", default=os.path.join(DATA_DIR, "sintetico"))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk", type=int, default=CHUNK_NOTAS, help="notas por bloco")
+    parser.add_argument("--emitentes", type=int, default=5000)
+    parser.add_argument("--destinatarios", type=int, default=20000)
+    parser.add_argument("--produtos", type=int, default=50000)
+    parser.add_argument("--amostras", default=DATA_DIR, help="pasta com os CSVs reais usados nos pools")
+    parser.add_argument("--sem-faker", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(message)s")
+    pools = build_pools(args.seed, args.emitentes, args.destinatarios, args.produtos,
+                        args.amostras, use_faker=not args.sem_faker)
+    destino = gerar(args.notas, args.mes, args.formato, args.saida, args.seed, args.workers, args.chunk, pools)
+    print(f"✅ Dados gerados em {destino}")
+
 
-fake = Faker('pt_BR')
-
-# Geração de dados do cabeçalho da nota fiscal
-def gerar_cabecalho(n=100):
-    dados = []
-    for i in range(1, n + 1):
-        data = fake.date_between(start_date='-6M', end_date='today')
-        valor = round(random.uniform(100, 10000), 2)
-        cliente = fake.company()
-        status = random.choice(['Emitida', 'Cancelada', 'Pendente'])
-        dados.append([i, data.strftime('%Y-%m-%d'), valor, cliente, status])
-    return pd.DataFrame(dados, columns=['ID', 'Data', 'Valor', 'Cliente', 'Status'])
-
-# Geração de itens por nota fiscal
-def gerar_itens(cabecalho_df):
-    dados = []
-    for _, row in cabecalho_df.iterrows():
-        qtd_itens = random.randint(1, 5)
-        for item in range(qtd_itens):
-            produto = fake.word().capitalize()
-            quantidade = random.randint(1, 10)
-            valor_unitario = round(random.uniform(10, 500), 2)
-            dados.append([row['ID'], produto, quantidade, valor_unitario])
-    return pd.DataFrame(dados, columns=['ID_NF', 'Produto', 'Quantidade', 'ValorUnitario'])
-
-# Criar pasta data
-os.makedirs('data', exist_ok=True)
-
-# Gerar dados
-cabecalho_df = gerar_cabecalho(200)
-itens_df = gerar_itens(cabecalho_df)
-
-# Salvar CSVs
-cabecalho_path = 'data/202401_NFs_Cabecalho.csv'
-itens_path = 'data/202401_NFs_Itens.csv'
-
-cabecalho_df.to_csv(cabecalho_path, index=False, encoding='utf-8')
-itens_df.to_csv(itens_path, index=False, encoding='utf-8')
-
-# Compactar CSVs em ZIP
-zip_path = 'data/202401_NFs.zip'
-with zipfile.ZipFile(zip_path, 'w') as zipf:
-    zipf.write(cabecalho_path, os.path.basename(cabecalho_path))
-    zipf.write(itens_path, os.path.basename(itens_path))
-
-print("✅ Dados gerados e ZIP criado com sucesso!")
+if __name__ == "__main__":
+    main()
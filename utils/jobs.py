@@ -0,0 +1,241 @@
+# utils/jobs.py
+"""Execução em segundo plano das operações longas do app (EDA e LLM).
+
+``submit`` devolve o id do job na hora; o script do Streamlit consulta o
+estado a cada rerun (``get``) em vez de ficar bloqueado. Jobs idênticos em
+andamento (mesma ``key``) são o mesmo job. Cada tipo (``kind``) tem um
+limite próprio de execuções simultâneas (``JOB_LIMITS``, ex.:
+``eda=2,llm=4``); o excedente espera numa fila do próprio tipo e só vai
+para o pool de ``JOB_WORKERS`` threads quando o tipo tem vaga, então uma
+rajada de perguntas ao LLM não ocupa as threads dos jobs de EDA.
+
+Dentro do job, ``report(done, total, mensagem)`` publica o progresso e,
+como ``check_cancelled()``, é ponto de cancelamento: depois de ``cancel``
+a próxima chamada levanta ``Cancelled``. Fora de um job as duas funções não
+fazem nada. O resultado de um job cancelado durante a execução é descartado.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+# padrão: a soma dos limites de JOB_LIMITS, para cada tipo ter suas threads
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "6"))
+DEFAULT_LIMIT = 2
+MAX_FINISHED = 200
+
+QUEUED = "na fila"
+RUNNING = "rodando"
+DONE = "concluído"
+FAILED = "erro"
+CANCELLED = "cancelado"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+_current = contextvars.ContextVar("job", default=None)
+
+
+def _parse_limits(text):
+    limits = {}
+    for item in filter(None, (p.strip() for p in text.split(","))):
+        kind, _, value = item.partition("=")
+        limits[kind.strip()] = int(value)
+    return limits
+
+
+JOB_LIMITS = _parse_limits(os.getenv("JOB_LIMITS", "eda=2,llm=4"))
+
+
+class Cancelled(Exception):
+    """O job foi cancelado enquanto rodava."""
+
+
+class Job:
+    def __init__(self, kind, key, label):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.key = key
+        self.label = label or kind
+        self.status = QUEUED
+        self.done = 0
+        self.total = None
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    @property
+    def progress(self):
+        """Fração concluída (0 a 1) ou None quando o total é desconhecido."""
+        if self.status == DONE:
+            return 1.0
+        return min(self.done / self.total, 1.0) if self.total else None
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+
+def current_job():
+    return _current.get()
+
+
+def report(done, total=None, message=None):
+    """Atualiza o progresso do job corrente; levanta ``Cancelled`` se ele foi cancelado."""
+    job = _current.get()
+    if job is None:
+        return
+    job.done = done
+    if total is not None:
+        job.total = total
+    if message is not None:
+        job.message = message
+    if job.cancel_event.is_set():
+        raise Cancelled(job.id)
+
+
+def check_cancelled():
+    """Levanta ``Cancelled`` se o job corrente foi cancelado (ponto de parada sem progresso)."""
+    job = _current.get()
+    if job is not None and job.cancel_event.is_set():
+        raise Cancelled(job.id)
+
+
+class JobManager:
+    def __init__(self, max_workers=JOB_WORKERS, limits=None):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._limits = dict(JOB_LIMITS if limits is None else limits)
+        self._running = {}
+        self._pending = {}
+        self._jobs = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, key, func, *args, label=None, **kwargs):
+        """Agenda ``func(*args, **kwargs)`` e devolve o id; ``key`` igual em andamento reaproveita o job."""
+        with self._lock:
+            dedup = (kind, key) if key is not None else None
+            if dedup is not None and dedup in self._inflight:
+                return self._inflight[dedup]
+            job = Job(kind, key, label)
+            self._jobs[job.id] = job
+            if dedup is not None:
+                self._inflight[dedup] = job.id
+            self._pending.setdefault(kind, deque()).append((job, func, args, kwargs))
+            self._dispatch(kind)
+        return job.id
+
+    def _dispatch(self, kind):
+        """Manda ao pool os jobs da fila de ``kind`` que cabem no limite do tipo (com o lock)."""
+        queue = self._pending.get(kind)
+        limit = self._limits.get(kind, DEFAULT_LIMIT)
+        while queue and self._running.get(kind, 0) < limit:
+            job, func, args, kwargs = queue.popleft()
+            self._running[kind] = self._running.get(kind, 0) + 1
+            job.future = self._pool.submit(self._run, job, func, args, kwargs)
+
+    def _run(self, job, func, args, kwargs):
+        try:
+            if job.cancel_event.is_set():
+                self._finish(job, CANCELLED)
+                return
+            job.status = RUNNING
+            job.started = time.time()
+            token = _current.set(job)
+            try:
+                result = func(*args, **kwargs)
+                if job.cancel_event.is_set():
+                    # cancelado durante a chamada: o resultado não é publicado
+                    raise Cancelled(job.id)
+                job.result = result
+                self._finish(job, DONE)
+            except Cancelled:
+                self._finish(job, CANCELLED)
+            except Exception as e:
+                logging.exception(f"Job {job.label} ({job.id}) falhou")
+                job.error = f"{type(e).__name__}: {e}"
+                self._finish(job, FAILED)
+            finally:
+                _current.reset(token)
+        finally:
+            # libera a vaga do tipo e chama o próximo da fila
+            with self._lock:
+                self._running[job.kind] -= 1
+                self._dispatch(job.kind)
+
+    def _finish(self, job, status):
+        with self._lock:
+            self._finish_locked(job, status)
+
+    def _finish_locked(self, job, status):
+        job.status = status
+        job.finished = time.time()
+        dedup = (job.kind, job.key)
+        if self._inflight.get(dedup) == job.id:
+            del self._inflight[dedup]
+        finished = [j for j in self._jobs.values() if j.status in FINISHED]
+        for old in finished[:max(0, len(finished) - MAX_FINISHED)]:
+            self._jobs.pop(old.id, None)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Pede o cancelamento; jobs na fila saem na hora, os em execução param no próximo
+        ``report``/``check_cancelled`` (ou têm o resultado descartado ao terminar)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED:
+                return False
+            job.cancel_event.set()
+            queue = self._pending.get(job.kind, ())
+            for item in queue:
+                if item[0] is job:
+                    queue.remove(item)
+                    self._finish_locked(job, CANCELLED)
+                    break
+        return True
+
+    def jobs(self, kind=None):
+        with self._lock:
+            return [j for j in self._jobs.values() if kind is None or j.kind == kind]
+
+    def stats(self):
+        """Quantidade de jobs por estado."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {}
+        for j in jobs:
+            counts[j.status] = counts.get(j.status, 0) + 1
+        return counts
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            for job in self._jobs.values():
+                job.cancel_event.set()
+            for queue in self._pending.values():
+                while queue:
+                    self._finish_locked(queue.popleft()[0], CANCELLED)
+        self._pool.shutdown(wait=wait)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_manager():
+    """Instância compartilhada por todas as sessões do processo."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = JobManager()
+        return _default
@@ -0,0 +1,147 @@
+# utils/llm_cache.py
+"""Cache persistente (SQLite) das respostas do agente de Notas Fiscais.
+
+Chave: impressão digital do dataset + tabela (Cabeçalho/Itens) + pergunta
+normalizada. Guarda o código pandas gerado pelo LLM e a resposta final,
+com TTL e remoção LRU acima de ``max_entries``.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from contextlib import closing
+
+from utils import nf_cache
+
+DB_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(nf_cache.CACHE_DIR, "llm_cache.sqlite"))
+TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    tabela TEXT NOT NULL,
+    question TEXT NOT NULL,
+    code TEXT,
+    answer TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+CREATE INDEX IF NOT EXISTS responses_fingerprint ON responses (fingerprint);
+"""
+
+
+def normalize_question(question):
+    """Minúsculas, sem acentos, espaços colapsados e sem pontuação final."""
+    text = unicodedata.normalize("NFKD", question)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip(" ?.!")
+
+
+def make_key(fingerprint, tabela, question):
+    raw = json.dumps([fingerprint, tabela, normalize_question(question)], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path=DB_PATH, ttl=TTL_SECONDS, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, fingerprint, tabela, question):
+        """Retorna {"code", "answer"} ou None (miss ou expirado)."""
+        key = make_key(fingerprint, tabela, question)
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT code, answer, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[2] <= self.ttl:
+                conn.execute(
+                    "UPDATE responses SET accessed = ?, hits = hits + 1 WHERE key = ?", (now, key)
+                )
+            else:
+                row = None
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if not row:
+            return None
+        return {"code": row[0], "answer": json.loads(row[1])}
+
+    def put(self, fingerprint, tabela, question, code, answer):
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, fingerprint, tabela, question, code, answer, created, accessed, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                (make_key(fingerprint, tabela, question), fingerprint, tabela,
+                 normalize_question(question), code, json.dumps(answer, ensure_ascii=False, default=str),
+                 now, now),
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        (count,) = conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def invalidate(self, fingerprint=None):
+        """Remove as entradas de um dataset (ou todas, sem argumento)."""
+        with closing(self._connect()) as conn, conn:
+            if fingerprint is None:
+                conn.execute("DELETE FROM responses")
+            else:
+                conn.execute("DELETE FROM responses WHERE fingerprint = ?", (fingerprint,))
+
+    def stats(self):
+        with closing(self._connect()) as conn:
+            (entries,) = conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": entries,
+            }
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_cache():
+    """Instância compartilhada por todas as sessões do processo."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ResponseCache()
+        return _default
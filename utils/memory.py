@@ -1,29 +1,124 @@
 # utils/memory.py
+"""Memória de perguntas/respostas do agente EDA.
+
+Armazenada em SQLite (WAL): cada ``add_memory`` é um INSERT (O(1), seguro
+com várias sessões escrevendo ao mesmo tempo) e ``get_memory`` lê só as
+últimas ``limit`` linhas pelo índice. As entradas são particionadas por
+sessão e a retenção (idade e quantidade por sessão) é aplicada por
+``compact``, chamado automaticamente a cada ``COMPACT_EVERY`` inserções.
+Um ``memory.json`` antigo é importado na primeira abertura.
+"""
 import json
 import os
-from datetime import datetime
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime, timedelta
 
 MEMORY_PATH = "memory.json"
+DEFAULT_SESSION = "default"
+RETENTION_DAYS = int(os.getenv("MEMORY_RETENTION_DAYS", "90"))
+MAX_PER_SESSION = int(os.getenv("MEMORY_MAX_PER_SESSION", "1000"))
+COMPACT_EVERY = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS qa (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session TEXT NOT NULL,
+    question TEXT,
+    answer TEXT,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS qa_session_id ON qa (session, id);
+"""
+
+_initialized = set()
+_init_lock = threading.Lock()
+
+
+def _db_path(path):
+    # compatibilidade: quem passa "memory.json" passa a usar "memory.db"
+    return path[:-5] + ".db" if path.endswith(".json") else path
+
+
+def _connect(path):
+    conn = sqlite3.connect(_db_path(path), timeout=30)
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+def _now():
+    return datetime.utcnow().isoformat() + "Z"
+
 
 def init_memory(path=MEMORY_PATH):
-    if not os.path.exists(path):
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump({"qa": []}, f, ensure_ascii=False, indent=2)
+    with _init_lock:
+        if path in _initialized:
+            return
+        db = _db_path(path)
+        if os.path.dirname(db):
+            os.makedirs(os.path.dirname(db), exist_ok=True)
+        with closing(_connect(path)) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            empty = conn.execute("SELECT 1 FROM qa LIMIT 1").fetchone() is None
+            if empty and db != path and os.path.exists(path):
+                _import_legacy(conn, path)
+        _initialized.add(path)
+
+
+def _import_legacy(conn, json_path):
+    try:
+        with open(json_path, "r", encoding="utf-8") as f:
+            entries = json.load(f).get("qa", [])
+    except (OSError, ValueError):
+        return
+    conn.executemany(
+        "INSERT INTO qa (session, question, answer, timestamp) VALUES (?, ?, ?, ?)",
+        [(DEFAULT_SESSION, e.get("question"), e.get("answer"), e.get("timestamp") or _now())
+         for e in entries],
+    )
 
-def add_memory(question, answer, path=MEMORY_PATH):
+
+def add_memory(question, answer, path=MEMORY_PATH, session=DEFAULT_SESSION):
     init_memory(path)
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    data["qa"].append({
-        "question": question,
-        "answer": answer if isinstance(answer, str) else str(answer),
-        "timestamp": datetime.utcnow().isoformat() + "Z"
-    })
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-def get_memory(path=MEMORY_PATH, limit=50):
+    with closing(_connect(path)) as conn, conn:
+        cur = conn.execute(
+            "INSERT INTO qa (session, question, answer, timestamp) VALUES (?, ?, ?, ?)",
+            (session, question, answer if isinstance(answer, str) else str(answer), _now()),
+        )
+        row_id = cur.lastrowid
+    if row_id % COMPACT_EVERY == 0:
+        compact(path)
+
+
+def get_memory(path=MEMORY_PATH, limit=50, session=None):
+    """Últimas ``limit`` entradas (em ordem cronológica), opcionalmente de uma sessão."""
+    init_memory(path)
+    with closing(_connect(path)) as conn:
+        if session is None:
+            rows = conn.execute(
+                "SELECT question, answer, timestamp FROM qa ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT question, answer, timestamp FROM qa WHERE session = ? ORDER BY id DESC LIMIT ?",
+                (session, limit),
+            ).fetchall()
+    return [{"question": q, "answer": a, "timestamp": t} for q, a, t in reversed(rows)]
+
+
+def compact(path=MEMORY_PATH, max_age_days=RETENTION_DAYS, max_per_session=MAX_PER_SESSION):
+    """Aplica a retenção: remove entradas antigas e o excesso por sessão."""
     init_memory(path)
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    return data["qa"][-limit:]
+    with closing(_connect(path)) as conn, conn:
+        if max_age_days:
+            cutoff = (datetime.utcnow() - timedelta(days=max_age_days)).isoformat() + "Z"
+            conn.execute("DELETE FROM qa WHERE timestamp < ?", (cutoff,))
+        if max_per_session:
+            conn.execute(
+                "DELETE FROM qa WHERE id IN ("
+                " SELECT id FROM (SELECT id, ROW_NUMBER() OVER"
+                " (PARTITION BY session ORDER BY id DESC) AS rn FROM qa) WHERE rn > ?)",
+                (max_per_session,),
+            )
@@ -0,0 +1,237 @@
+# utils/metrics.py
+"""Medição leve de latência por etapa (spans, contadores e histogramas).
+
+``with span("nf.llm"):`` mede a etapa, alimenta o histograma da etapa e,
+se houver um span aberto no mesmo contexto, entra no trace dele; o span
+mais externo fecha o trace, que fica entre os ``MAX_TRACES`` recentes.
+Exportação em texto Prometheus ou JSONL (``export``) e captura opcional
+de cProfile para uma única requisição (``profiled``). Desligável com
+``METRICS_ENABLED=0``.
+"""
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join("outputs", "metrics"))
+MAX_TRACES = 200
+MAX_SAMPLES = 1000
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+PREFIX = "app"
+
+_current = contextvars.ContextVar("metrics_trace", default=None)
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_histograms = {}
+_traces = deque(maxlen=MAX_TRACES)
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+        self.errors = 0
+        self.recent = deque(maxlen=MAX_SAMPLES)
+
+    def observe(self, seconds, error=False):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        self.sum += seconds
+        self.count += 1
+        self.errors += bool(error)
+        self.recent.append(seconds)
+
+
+def inc(name, value=1.0):
+    """Soma ``value`` ao contador ``name`` (exportado como ``app_<name>_total``)."""
+    if ENABLED:
+        with _lock:
+            _counters[name] += value
+
+
+def observe(stage, seconds, error=False):
+    if not ENABLED:
+        return
+    with _lock:
+        hist = _histograms.get(stage)
+        if hist is None:
+            hist = _histograms[stage] = _Histogram()
+        hist.observe(seconds, error)
+
+
+@contextmanager
+def span(name, **attrs):
+    """Mede a etapa ``name``; ``attrs`` (pequenos, serializáveis) vão para o trace."""
+    if not ENABLED:
+        yield None
+        return
+    trace = _current.get()
+    token = None
+    if trace is None:
+        trace = {"id": uuid.uuid4().hex[:12], "name": name, "start": time.time(),
+                 "t0": time.perf_counter(), "spans": [], "depth": 0}
+        token = _current.set(trace)
+    depth = trace["depth"]
+    trace["depth"] += 1
+    inicio = time.perf_counter()
+    error = None
+    try:
+        yield trace
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - inicio
+        trace["depth"] -= 1
+        item = {"name": name, "ms": seconds * 1000, "depth": depth,
+                "offset_ms": (inicio - trace["t0"]) * 1000}
+        if attrs:
+            item["attrs"] = attrs
+        if error:
+            item["error"] = error
+        trace["spans"].append(item)
+        observe(name, seconds, error is not None)
+        if token is not None:
+            _current.reset(token)
+            _finish(trace, seconds)
+
+
+def timed(name):
+    """Decorador: cada chamada da função vira um span ``name``."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _finish(trace, seconds):
+    trace["ms"] = seconds * 1000
+    trace["spans"].sort(key=lambda s: s["offset_ms"])
+    for key in ("t0", "depth"):
+        trace.pop(key, None)
+    with _lock:
+        _traces.append(trace)
+
+
+def annotate(**attrs):
+    """Acrescenta atributos ao trace corrente (ex.: caminho da resposta)."""
+    trace = _current.get()
+    if trace is not None:
+        trace.setdefault("attrs", {}).update(attrs)
+
+
+def recent_traces(limit=20):
+    with _lock:
+        return list(_traces)[-limit:][::-1]
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summary():
+    """Linhas por etapa: chamadas, erros, média, p50 e p95 (ms, janela recente)."""
+    with _lock:
+        items = [(stage, h.count, h.errors, h.sum, list(h.recent)) for stage, h in _histograms.items()]
+    rows = []
+    for stage, count, errors, total, recent in sorted(items):
+        rows.append({
+            "etapa": stage, "chamadas": count, "erros": errors,
+            "media_ms": total / count * 1000 if count else 0.0,
+            "p50_ms": _percentile(recent, 0.5) * 1000,
+            "p95_ms": _percentile(recent, 0.95) * 1000,
+        })
+    return rows
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def prometheus_text():
+    """Estado atual no formato de exposição de texto do Prometheus."""
+    lines = [f"# TYPE {PREFIX}_stage_duration_seconds histogram"]
+    with _lock:
+        hists = sorted(_histograms.items())
+        counters = sorted(_counters.items())
+        for stage, h in hists:
+            acc = 0
+            for bound, n in zip(BUCKETS, h.buckets):
+                acc += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{PREFIX}_stage_duration_seconds_bucket{{stage="{_label(stage)}",le="{le}"}} {acc}')
+            lines.append(f'{PREFIX}_stage_duration_seconds_sum{{stage="{_label(stage)}"}} {h.sum}')
+            lines.append(f'{PREFIX}_stage_duration_seconds_count{{stage="{_label(stage)}"}} {h.count}')
+        lines.append(f"# TYPE {PREFIX}_stage_errors_total counter")
+        for stage, h in hists:
+            lines.append(f'{PREFIX}_stage_errors_total{{stage="{_label(stage)}"}} {h.errors}')
+        for name, value in counters:
+            lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+            lines.append(f"{PREFIX}_{name}_total {value}")
+    return "\n".join(lines) + "\n"
+
+
+def traces_jsonl():
+    with _lock:
+        traces = list(_traces)
+    return "".join(json.dumps(t, ensure_ascii=False, default=str) + "\n" for t in traces)
+
+
+def export(fmt="prometheus", path=None):
+    """Grava o estado em ``path`` (padrão: METRICS_DIR/metrics.prom ou traces.jsonl)."""
+    text = prometheus_text() if fmt == "prometheus" else traces_jsonl()
+    path = path or os.path.join(METRICS_DIR, "metrics.prom" if fmt == "prometheus" else "traces.jsonl")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+    return path
+
+
+class ProfileResult:
+    text = ""
+
+
+@contextmanager
+def profiled(enabled=True, limit=30):
+    """cProfile de um único bloco; ``result.text`` traz as funções por tempo acumulado."""
+    result = ProfileResult()
+    if not enabled:
+        yield result
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield result
+    finally:
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(limit)
+        result.text = out.getvalue()
+        annotate(profile=True)
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _traces.clear()
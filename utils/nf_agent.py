@@ -0,0 +1,197 @@
+# utils/nf_agent.py
+"""Pipeline do agente de Notas Fiscais, independente do Streamlit.
+
+Ordem de resolução de uma pergunta: cubo de agregados (``nf_cube``, quando
+o frame veio inteiro do catálogo) -> roteador determinístico -> cache de
+respostas -> plano pandas validado -> LLM (PandasQueryEngine). Usado pelo
+app e pelo executor de lotes (``utils.batch_runner``). ``responder_sql`` é
+o caminho alternativo em que o LLM gera SQL para o DuckDB (``nf_sql``).
+"""
+import json
+import logging
+import time
+
+from utils import engine_registry, jobs, llm_cache, metrics, nf_cube, nf_router, nf_sql, plan_store
+
+SYSTEM_PROMPT = """
+        Você é um assistente de análise de dados.
+        Responda perguntas sobre o DataFrame fornecido.
+        Se a resposta for tabular, retorne como JSON válido (lista de objetos).
+        """
+
+
+def build_query_engine(df, llm, verbose=True):
+    # o prompt leva o perfil compacto do DataFrame (nf_profile), não o df.head();
+    # nf_engine (llama_index) só é importado quando o primeiro engine é construído
+    with metrics.span("nf.engine_build"):
+        from utils import nf_engine
+
+        return nf_engine.ProfiledPandasQueryEngine(df=df, verbose=verbose, llm=llm, system_prompt=SYSTEM_PROMPT)
+
+
+def get_query_engine(df, tabela, get_llm, registry=None, verbose=True):
+    """Engine do registro por (impressão digital, tabela); ``get_llm`` só é chamado ao construir."""
+    fingerprint = df.attrs.get("fingerprint")
+    if fingerprint is None:
+        return build_query_engine(df, get_llm(), verbose)
+    registry = registry or engine_registry.get_registry()
+    return registry.get((fingerprint, tabela), lambda: build_query_engine(df, get_llm(), verbose))
+
+
+def parse_resposta(content):
+    try:
+        data = json.loads(content)
+        if isinstance(data, list) and all(isinstance(item, dict) for item in data):
+            return data
+    except (ValueError, TypeError):
+        pass
+    return content
+
+
+def _resolver_local(df, pergunta, tabela, cache, plans, use_router):
+    """Etapas sem LLM; retorna (resposta, caminho) ou None."""
+    # Agregações simples (contagem, soma, top-N...) lidas do cubo pré-calculado,
+    # sem varrer a tabela; o que o cubo não cobre vai para o roteador
+    if use_router:
+        try:
+            with metrics.span("nf.cube"):
+                cube = nf_cube.for_frame(df)
+                routed = cube.route(pergunta, tabela) if cube is not None else None
+        except Exception as e:
+            logging.warning(f"Cubo de agregados falhou, seguindo para o roteador: {e}")
+            routed = None
+        if routed is not None:
+            return routed.answer, "cubo"
+        # Demais agregações simples resolvidas direto no pandas
+        try:
+            with metrics.span("nf.router"):
+                routed = nf_router.route(pergunta, df, tabela)
+        except Exception as e:
+            logging.warning(f"Roteador falhou, seguindo para o LLM: {e}")
+            routed = None
+        if routed is not None:
+            return routed.answer, "roteador"
+    # Perguntas repetidas sobre o mesmo dataset saem do cache, sem chamar o LLM
+    fingerprint = df.attrs.get("fingerprint")
+    if cache and fingerprint:
+        with metrics.span("nf.cache_lookup"):
+            hit = cache.get(fingerprint, tabela, pergunta)
+        if hit is not None:
+            return hit["answer"], "cache"
+    # Pergunta recorrente (ex.: mês novo): reexecuta a expressão já validada
+    if plans:
+        with metrics.span("nf.plan_replay"):
+            content = plans.replay(tabela, pergunta, df)
+        if content is not None:
+            resp = parse_resposta(content)
+            if cache and fingerprint:
+                cache.put(fingerprint, tabela, pergunta, None, resp)
+            return resp, "plano"
+    return None
+
+
+def _registrar_llm(df, pergunta, tabela, response_obj, cache, plans):
+    content = str(response_obj)
+    resp = parse_resposta(content)
+    code = (response_obj.metadata or {}).get("pandas_instruction_str")
+    fingerprint = df.attrs.get("fingerprint")
+    if not content.startswith(plan_store.ERROR_PREFIX):
+        if plans and code:
+            plans.record(tabela, pergunta, code, df)
+        if cache and fingerprint:
+            cache.put(fingerprint, tabela, pergunta, code, resp)
+    return resp
+
+
+def _defaults(cache, plans):
+    cache = llm_cache.get_cache() if cache is None else cache
+    plans = plan_store.get_store() if plans is None else plans
+    return cache, plans
+
+
+def _fim(inicio, tabela, pergunta, resp, caminho):
+    ms = (time.perf_counter() - inicio) * 1000
+    logging.info(f"NF[{tabela}] {caminho} {ms:.1f} ms: {pergunta}")
+    metrics.annotate(tabela=tabela, caminho=caminho)
+    metrics.inc(f"nf_{caminho}")
+    return resp, caminho, ms
+
+
+def responder(df, pergunta, tabela, get_engine, cache=None, plans=None, use_router=True):
+    """Retorna (resposta, caminho, ms); caminho: cubo, roteador, cache, plano, llm ou erro.
+
+    ``get_engine(df, tabela)`` fornece o query engine. ``cache``/``plans``
+    usam as instâncias compartilhadas por padrão; ``False`` desliga a etapa.
+    Cada chamada é um span ``nf.responder`` (ou entra no trace já aberto).
+    Dentro de um job (``utils.jobs``) o cancelamento é verificado antes e
+    depois da chamada ao LLM e levanta ``jobs.Cancelled``.
+    """
+    inicio = time.perf_counter()
+    cache, plans = _defaults(cache, plans)
+    with metrics.span("nf.responder"):
+        local = _resolver_local(df, pergunta, tabela, cache, plans, use_router)
+        if local is not None:
+            return _fim(inicio, tabela, pergunta, *local)
+        try:
+            jobs.check_cancelled()
+            response_obj = get_engine(df, tabela).query(pergunta)
+            # cancelada durante a chamada: nada vai para o cache nem para os planos
+            jobs.check_cancelled()
+            resp = _registrar_llm(df, pergunta, tabela, response_obj, cache, plans)
+            return _fim(inicio, tabela, pergunta, resp, "llm")
+        except jobs.Cancelled:
+            raise
+        except Exception as e:
+            return _fim(inicio, tabela, pergunta, f"Erro: {e}", "erro")
+
+
+async def aresponder(df, pergunta, tabela, get_engine, cache=None, plans=None, use_router=True):
+    """Versão assíncrona de ``responder``: a chamada ao LLM usa ``aquery``.
+
+    O código gerado é avaliado por ``nf_exec`` (bloqueia o event loop até o
+    limite de tempo).
+    """
+    inicio = time.perf_counter()
+    cache, plans = _defaults(cache, plans)
+    with metrics.span("nf.responder"):
+        local = _resolver_local(df, pergunta, tabela, cache, plans, use_router)
+        if local is not None:
+            return _fim(inicio, tabela, pergunta, *local)
+        try:
+            jobs.check_cancelled()
+            response_obj = await get_engine(df, tabela).aquery(pergunta)
+            jobs.check_cancelled()
+            resp = _registrar_llm(df, pergunta, tabela, response_obj, cache, plans)
+            return _fim(inicio, tabela, pergunta, resp, "llm")
+        except jobs.Cancelled:
+            raise
+        except Exception as e:
+            return _fim(inicio, tabela, pergunta, f"Erro: {e}", "erro")
+
+
+def responder_sql(cabecalho, itens, pergunta, get_llm, cache=None):
+    """Como ``responder``, mas o LLM gera SQL sobre as duas tabelas (DuckDB).
+
+    Mesmo contrato de retorno; o caminho é ``cache``, ``sql`` ou ``erro``.
+    """
+    inicio = time.perf_counter()
+    cache = llm_cache.get_cache() if cache is None else cache
+    fps = (cabecalho.attrs.get("fingerprint"), itens.attrs.get("fingerprint"))
+    fingerprint = "+".join(fps) if None not in fps else None
+    with metrics.span("nf.responder_sql"):
+        if cache and fingerprint:
+            with metrics.span("nf.cache_lookup"):
+                hit = cache.get(fingerprint, "SQL", pergunta)
+            if hit is not None:
+                return _fim(inicio, "SQL", pergunta, hit["answer"], "cache")
+        try:
+            jobs.check_cancelled()
+            resp, sql = nf_sql.answer(cabecalho, itens, pergunta, get_llm())
+        except jobs.Cancelled:
+            raise
+        except Exception as e:
+            return _fim(inicio, "SQL", pergunta, f"Erro: {e}", "erro")
+        jobs.check_cancelled()
+        if cache and fingerprint:
+            cache.put(fingerprint, "SQL", pergunta, sql, resp)
+        return _fim(inicio, "SQL", pergunta, resp, "sql")
@@ -0,0 +1,390 @@
+# utils/nf_cache.py
+"""Cache colunar (Parquet) das tabelas de Notas Fiscais.
+
+O CSV é lido e tipado uma única vez; as execuções seguintes leem o Parquet
+com memory-map. Cada tabela tem um manifesto JSON ao lado do Parquet com
+tamanho, mtime e sha1 do CSV de origem, usados para invalidar o cache.
+
+ZIPs mensais não são extraídos: os membros são localizados por padrão de
+nome e lidos em blocos direto do arquivo compactado para um arquivo Arrow
+temporário, tipados coluna a coluna e gravados uma vez no Parquet
+(``load_zip_tables``). A impressão digital de cada membro vem do CRC32 e do
+tamanho gravados no diretório central do ZIP.
+
+Antes de ir para o Parquet as tabelas passam por ``schema.optimize``
+(categorias, downcast, datas), então o cache já guarda os tipos compactos.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import unicodedata
+import zipfile
+
+import pandas as pd
+
+try:
+    from utils import metrics, schema
+except ImportError:  # executado como script dentro de utils/
+    import metrics
+    import schema
+
+DATA_DIR = os.getenv("DATA_DIR", "data")
+CACHE_DIR = os.getenv("NF_CACHE_DIR", os.path.join(DATA_DIR, ".cache"))
+
+CABECALHO_NUMERIC = ['VALOR NOTA FISCAL']
+ITENS_NUMERIC = ['VALOR TOTAL', 'VALOR UNITÁRIO', 'QUANTIDADE']
+# A chave de 44 dígitos não cabe em int64: mantemos como texto.
+KEY_DTYPES = {'CHAVE DE ACESSO': str}
+
+# membros do ZIP, comparados sem acento/caixa ("Cabeçalho" pode vir como "CabeÃ§alho")
+CABECALHO_PATTERN = re.compile(r"cabe.{1,2}alho[^/]*\.csv$", re.I)
+ITENS_PATTERN = re.compile(r"itens[^/]*\.csv$", re.I)
+CHUNKSIZE = int(os.getenv("NF_CHUNKSIZE", "200000"))
+COPY_BUFFER = 8 * 1024 * 1024
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """sha1 do arquivo, lido em blocos."""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def clean_nf_frame(df, numeric_cols):
+    """Normaliza nomes de colunas e converte as colunas numéricas."""
+    df.columns = df.columns.str.strip()
+    for col in numeric_cols:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+
+def _manifest_path(cache_dir, name):
+    return os.path.join(cache_dir, f"{name}.json")
+
+
+def _read_manifest(cache_dir, name):
+    try:
+        with open(_manifest_path(cache_dir, name), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_manifest(cache_dir, name, entry):
+    path = _manifest_path(cache_dir, name)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def _source_fingerprint(csv_path, entry):
+    """Retorna o sha1 do CSV, evitando reler o arquivo se tamanho e mtime batem."""
+    st = os.stat(csv_path)
+    if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+        return entry["sha1"], st
+    return file_hash(csv_path), st
+
+
+def _valid(entry, sha1):
+    return bool(entry) and entry["sha1"] == sha1 and entry.get("schema") == schema.VERSION
+
+
+@metrics.timed("nf.schema_optimize")
+def _optimize(df, name):
+    df, report = schema.optimize(df, key_columns=KEY_DTYPES)
+    logging.debug(f"Memória de {name}:\n{report.to_string()}")
+    return df
+
+
+@metrics.timed("nf.parquet_read")
+def _read_cached(entry, cache_dir):
+    path = os.path.join(cache_dir, entry["parquet"])
+    if not os.path.exists(path):
+        return None
+    try:
+        df = pd.read_parquet(path, memory_map=True)
+    except Exception as e:
+        logging.warning(f"Cache Parquet ilegível ({path}): {e}")
+        return None
+    for col in KEY_DTYPES:
+        # o Parquet devolve string[python]; a chave volta para o buffer do Arrow
+        if col in df.columns:
+            df[col] = df[col].astype(schema.KEY_DTYPE)
+    if "memory" in entry:
+        df.attrs["memory"] = entry["memory"]
+    df.attrs["parquet"] = path
+    return df
+
+
+def _write_cached(df, cache_dir, name, sha1, st):
+    parquet = f"{name}-{sha1[:16]}.parquet"
+    path = os.path.join(cache_dir, parquet)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        df.to_parquet(tmp, index=False)
+    except Exception as e:
+        # sem pyarrow/fastparquet (ou tipo não suportado): segue sem cache
+        logging.warning(f"Não foi possível gravar o cache de {name}: {e}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return
+    os.replace(tmp, path)
+    df.attrs["parquet"] = path
+    old = _read_manifest(cache_dir, name)
+    _write_manifest(cache_dir, name, {
+        "source": name,
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "sha1": sha1,
+        "parquet": parquet,
+        "schema": schema.VERSION,
+        "memory": df.attrs.get("memory"),
+    })
+    if old and old.get("parquet") != parquet:
+        try:
+            os.remove(os.path.join(cache_dir, old["parquet"]))
+        except OSError:
+            pass
+
+
+def load_table(csv_path, numeric_cols=(), cache_dir=None):
+    """Carrega um CSV de NF já tipado, usando o cache Parquet quando válido.
+
+    O sha1 do arquivo de origem fica em ``df.attrs["fingerprint"]`` e o
+    caminho do Parquet (quando gravado) em ``df.attrs["parquet"]``.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    name = os.path.basename(csv_path)
+    entry = _read_manifest(cache_dir, name)
+    sha1, st = _source_fingerprint(csv_path, entry)
+
+    df = None
+    if _valid(entry, sha1):
+        df = _read_cached(entry, cache_dir)
+        if df is not None and entry["mtime_ns"] != st.st_mtime_ns:
+            # mesmo conteúdo com mtime novo (ex.: ZIP reextraído)
+            entry.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+            _write_manifest(cache_dir, name, entry)
+    if df is None:
+        with metrics.span("nf.csv_parse", arquivo=name):
+            df = pd.read_csv(csv_path, dtype=KEY_DTYPES)
+        df = _optimize(clean_nf_frame(df, numeric_cols), name)
+        _write_cached(df, cache_dir, name, sha1, st)
+    df.attrs["fingerprint"] = sha1
+    return df
+
+
+def load_nf_tables(data_dir, cabecalho_csv, itens_csv, cache_dir=None):
+    """Retorna (cabecalho, itens) tipados a partir do cache colunar."""
+    cabecalho = load_table(os.path.join(data_dir, cabecalho_csv), CABECALHO_NUMERIC, cache_dir)
+    itens = load_table(os.path.join(data_dir, itens_csv), ITENS_NUMERIC, cache_dir)
+    return cabecalho, itens
+
+
+@metrics.timed("nf.upload_copy")
+def copy_upload(src, dest, chunk_size=COPY_BUFFER):
+    """Grava um upload (objeto file-like) em disco em blocos, de forma atômica."""
+    if hasattr(src, "seek"):
+        src.seek(0)
+    if os.path.dirname(dest):
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp = f"{dest}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as out:
+        shutil.copyfileobj(src, out, chunk_size)
+    os.replace(tmp, dest)
+    return dest
+
+
+def _fold(name):
+    return unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+
+
+def find_members(zf):
+    """Localiza (cabecalho, itens) no ZIP pelo padrão do nome, não por nome fixo."""
+    found = {"cabecalho": None, "itens": None}
+    for info in zf.infolist():
+        if info.is_dir() or os.path.basename(info.filename).startswith("."):
+            continue
+        name = _fold(os.path.basename(info.filename))
+        if found["cabecalho"] is None and CABECALHO_PATTERN.search(name):
+            found["cabecalho"] = info
+        elif found["itens"] is None and ITENS_PATTERN.search(name):
+            found["itens"] = info
+    missing = [k for k, v in found.items() if v is None]
+    if missing:
+        raise ValueError(f"ZIP sem os CSVs esperados ({', '.join(missing)}): {zf.filename}")
+    return found["cabecalho"], found["itens"]
+
+
+def member_fingerprint(info):
+    """Impressão digital de um membro do ZIP pelo CRC32/tamanho, sem descompactar."""
+    return hashlib.sha1(f"{info.filename}:{info.CRC:08x}:{info.file_size}".encode("utf-8")).hexdigest()
+
+
+def _conform(chunk, numeric_cols):
+    """Texto em todas as colunas (schema estável entre blocos); números só nas conhecidas."""
+    for col in chunk.columns:
+        if col in numeric_cols:
+            chunk[col] = pd.to_numeric(chunk[col], errors="coerce").astype("float64")
+        else:
+            chunk[col] = chunk[col].astype("string")
+    return chunk
+
+
+def _numeric_flags(chunk, flags):
+    """Atualiza ``flags`` (coluna -> só números até aqui) com um bloco lido como texto."""
+    for col, ok in flags.items():
+        if ok:
+            values = chunk[col]
+            flags[col] = bool(pd.to_numeric(values, errors="coerce").notna().sum() == values.notna().sum())
+
+
+@metrics.timed("nf.zip_parse")
+def _ingest_member(zf, info, path, numeric_cols, chunksize):
+    """Lê o membro em blocos direto do ZIP para um arquivo Arrow IPC (texto, sem compressão).
+
+    Retorna (linhas, flags): ``flags`` diz quais colunas de texto tiveram só
+    números em todos os blocos, decidido durante a leitura.
+    """
+    import pyarrow as pa
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    writer = None
+    rows = 0
+    flags = None
+    try:
+        with zf.open(info) as raw:
+            for chunk in pd.read_csv(raw, dtype=str, chunksize=chunksize):
+                chunk.columns = chunk.columns.str.strip()
+                if flags is None:
+                    flags = {c: True for c in chunk.columns if c not in numeric_cols and c not in KEY_DTYPES}
+                _numeric_flags(chunk, flags)
+                table = pa.Table.from_pandas(_conform(chunk, numeric_cols), preserve_index=False)
+                if writer is None:
+                    writer = pa.ipc.new_file(tmp, table.schema)
+                writer.write_table(table)
+                rows += len(chunk)
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    if writer is None:
+        raise ValueError(f"CSV vazio no ZIP: {info.filename}")
+    writer.close()
+    os.replace(tmp, path)
+    return rows, flags
+
+
+@metrics.timed("nf.schema_optimize")
+def _typed_frame(path, flags, name):
+    """DataFrame otimizado a partir do arquivo IPC, uma coluna por vez.
+
+    O arquivo é lido por memory-map; cada coluna vira pandas, recebe o tipo
+    numérico decidido na leitura e passa por ``schema.optimize_column`` antes
+    da próxima, sem materializar a tabela inteira como texto.
+    """
+    import pyarrow as pa
+
+    columns = {}
+    antes = depois = 0
+    with pa.memory_map(path) as source:
+        table = pa.ipc.open_file(source).read_all()
+        for col in table.column_names:
+            series = table.column(col).to_pandas()
+            if flags.get(col):
+                series = pd.to_numeric(series)
+            antes += series.memory_usage(deep=True, index=False)
+            try:
+                series = schema.optimize_column(series, key=col in KEY_DTYPES)
+            except (TypeError, ValueError) as e:
+                logging.warning(f"Coluna {col} mantida com o tipo original: {e}")
+            depois += series.memory_usage(deep=True, index=False)
+            columns[col] = series
+        del table
+    df = pd.DataFrame(columns)
+    df.attrs["memory"] = {"antes_mb": antes / 2**20, "depois_mb": depois / 2**20}
+    logging.info(f"Schema de {name}: {antes / 2**20:.1f} MB -> {depois / 2**20:.1f} MB")
+    return df
+
+
+def _zip_table(zf, zip_path, info, numeric_cols, cache_dir, chunksize):
+    name = f"{os.path.basename(zip_path)}!{os.path.basename(info.filename)}"
+    fingerprint = member_fingerprint(info)
+    entry = _read_manifest(cache_dir, name)
+    if _valid(entry, fingerprint):
+        df = _read_cached(entry, cache_dir)
+        if df is not None:
+            df.attrs["fingerprint"] = fingerprint
+            return df
+    parquet = f"{name}-{fingerprint[:16]}.parquet"
+    path = os.path.join(cache_dir, parquet)
+    raw = f"{path}.{os.getpid()}.arrow"
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        rows, flags = _ingest_member(zf, info, raw, numeric_cols, chunksize)
+        logging.info(f"{info.filename}: {rows} linhas lidas do ZIP")
+        # tipos decididos com a coluna inteira, não pelo primeiro bloco
+        df = _typed_frame(raw, flags, name)
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+    finally:
+        for leftover in (raw, tmp):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    df.attrs["parquet"] = path
+    _write_manifest(cache_dir, name, {
+        "source": f"{zip_path}!{info.filename}",
+        "size": info.file_size,
+        "crc": info.CRC,
+        "sha1": fingerprint,
+        "parquet": parquet,
+        "rows": rows,
+        "schema": schema.VERSION,
+        "memory": df.attrs.get("memory"),
+    })
+    if entry and entry.get("parquet") != parquet:
+        try:
+            os.remove(os.path.join(cache_dir, entry["parquet"]))
+        except OSError:
+            pass
+    df.attrs["fingerprint"] = fingerprint
+    return df
+
+
+def load_zip_tables(zip_path, cache_dir=None, chunksize=CHUNKSIZE):
+    """Retorna (cabecalho, itens) de um ZIP de NFs sem extraí-lo.
+
+    Só o diretório central é lido quando o cache está válido; caso contrário
+    cada CSV é parseado em blocos de ``chunksize`` linhas direto do ZIP.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    with zipfile.ZipFile(zip_path) as zf:
+        cab_info, itens_info = find_members(zf)
+        cabecalho = _zip_table(zf, zip_path, cab_info, CABECALHO_NUMERIC, cache_dir, chunksize)
+        itens = _zip_table(zf, zip_path, itens_info, ITENS_NUMERIC, cache_dir, chunksize)
+    return cabecalho, itens
+
+
+def load_nf_dataset(data_dir, zip_filename, cabecalho_csv, itens_csv, cache_dir=None):
+    """Prefere o ZIP (lido sem extrair); CSVs soltos ficam como alternativa."""
+    zip_path = os.path.join(data_dir, zip_filename)
+    if os.path.exists(zip_path):
+        return load_zip_tables(zip_path, cache_dir)
+    return load_nf_tables(data_dir, cabecalho_csv, itens_csv, cache_dir)
+
+
+def dataset_available(data_dir, zip_filename, cabecalho_csv, itens_csv):
+    if os.path.exists(os.path.join(data_dir, zip_filename)):
+        return True
+    return all(os.path.exists(os.path.join(data_dir, f)) for f in (cabecalho_csv, itens_csv))
@@ -0,0 +1,462 @@
+# utils/nf_catalog.py
+"""Catálogo particionado dos meses de Notas Fiscais em ``DATA_DIR``.
+
+Cada arquivo ``YYYYMM_NFs*.zip`` (ou par de CSVs soltos
+``YYYYMM_NFs_Cabecalho.csv``/``YYYYMM_NFs_Itens.csv``) é uma partição. Na
+primeira vez que aparece, a partição passa pelo cache colunar
+(``nf_cache``) e o catálogo guarda as estatísticas dela em
+``CACHE_DIR/catalog.json``: linhas, mínimo/máximo de ``DATA EMISSÃO``, UFs
+de emitente e destinatário e faixas das colunas numéricas. ``refresh``
+só processa arquivos novos ou alterados; meses antigos não são relidos.
+
+``load(inicio, fim, ufs)`` descarta pelas estatísticas as partições que o
+filtro não alcança, carrega as restantes em paralelo (sob demanda, com as
+mais recentes em memória) e devolve (cabecalho, itens) já filtrados.
+
+Na ingestão cada partição ganha também o seu cubo de agregados
+(``nf_cube``), gravado em ``CACHE_DIR/cubes``; ``cubes(ids)`` funde os
+cubos das partições pedidas partindo da maior combinação já fundida, de
+modo que um mês novo só acrescenta o cubo dele.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+try:
+    from utils import metrics, nf_cache, nf_cube, nf_profile
+except ImportError:  # executado como script dentro de utils/
+    import metrics
+    import nf_cache
+    import nf_cube
+    import nf_profile
+
+LOAD_WORKERS = int(os.getenv("NF_LOAD_WORKERS", "4"))
+MAX_LOADED = int(os.getenv("NF_MAX_LOADED_PARTITIONS", "12"))
+# combinações (partições + filtro) já concatenadas, reaproveitadas entre reruns
+MAX_COMBINED = 2
+CATALOG_VERSION = 1
+
+DATE_COLUMN = "DATA EMISSÃO"
+UF_COLUMNS = ("UF EMITENTE", "UF DESTINATÁRIO")
+ARCHIVE_PATTERN = re.compile(r"^(\d{6})_NFs[^/]*\.zip$", re.I)
+CSV_PATTERN = re.compile(r"^(\d{6})_NFs[^/]*\.csv$", re.I)
+
+
+def _stat_key(paths):
+    return [[os.path.basename(p), os.stat(p).st_size, os.stat(p).st_mtime_ns] for p in paths]
+
+
+def _date_range(*frames):
+    values = [pd.to_datetime(df[DATE_COLUMN], errors="coerce") for df in frames if DATE_COLUMN in df]
+    values = pd.concat(values) if values else pd.Series(dtype="datetime64[ns]")
+    if values.notna().any():
+        return values.min().isoformat(), values.max().isoformat()
+    return None, None
+
+
+def partition_stats(cabecalho, itens):
+    """Estatísticas usadas na poda: linhas, datas, UFs e faixas numéricas."""
+    inicio, fim = _date_range(cabecalho, itens)
+    stats = {
+        "rows": {"cabecalho": len(cabecalho), "itens": len(itens)},
+        "min_date": inicio,
+        "max_date": fim,
+        "ufs": {col: sorted(map(str, cabecalho[col].dropna().unique())) for col in UF_COLUMNS
+                if col in cabecalho},
+        "columns": {},
+        "fingerprints": [cabecalho.attrs.get("fingerprint"), itens.attrs.get("fingerprint")],
+    }
+    for nome, df in (("cabecalho", cabecalho), ("itens", itens)):
+        num = df.select_dtypes("number")
+        stats["columns"][nome] = {
+            col: {"min": float(num[col].min()), "max": float(num[col].max()),
+                  "sum": float(num[col].sum()), "nulls": int(num[col].isna().sum())}
+            for col in num.columns
+        }
+    return stats
+
+
+def _concat(frames):
+    """Concatena mantendo categóricas (união das categorias) e chaves string[pyarrow]."""
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    frames = [f.copy(deep=False) for f in frames]
+    for col in frames[0].columns:
+        if all(isinstance(f[col].dtype, pd.CategoricalDtype) for f in frames if col in f):
+            categories = union_categoricals([f[col] for f in frames if col in f], ignore_order=True).categories
+            for f in frames:
+                if col in f:
+                    f[col] = f[col].cat.set_categories(categories)
+    df = pd.concat(frames, ignore_index=True)
+    df.attrs = {}
+    return df
+
+
+def _detach(tables):
+    """Esquece os cubos registrados para frames que o catálogo descartou."""
+    for df in tables or ():
+        nf_cube.detach(df.attrs.get("fingerprint"))
+
+
+def _forget(tables, cache_dir):
+    """Frames combinados descartados: cubos e perfis de prompt (``nf_profile``) deles."""
+    _detach(tables)
+    nf_profile.forget([df.attrs.get("fingerprint") for df in tables or ()], cache_dir)
+
+
+def _filter(df, inicio, fim, ufs):
+    mask = pd.Series(True, index=df.index)
+    if DATE_COLUMN in df and (inicio is not None or fim is not None):
+        datas = pd.to_datetime(df[DATE_COLUMN], errors="coerce")
+        if inicio is not None:
+            mask &= datas >= pd.Timestamp(inicio)
+        if fim is not None:
+            mask &= datas <= pd.Timestamp(fim)
+    if ufs:
+        ufs = set(ufs)
+        cols = [c for c in UF_COLUMNS if c in df]
+        if cols:
+            mask &= pd.concat([df[c].astype(str).isin(ufs) for c in cols], axis=1).any(axis=1)
+    return df if mask.all() else df[mask].reset_index(drop=True)
+
+
+class Catalog:
+    def __init__(self, data_dir=None, cache_dir=None, max_loaded=MAX_LOADED):
+        self.data_dir = data_dir or nf_cache.DATA_DIR
+        self.cache_dir = cache_dir or nf_cache.CACHE_DIR
+        self.path = os.path.join(self.cache_dir, "catalog.json")
+        self.max_loaded = max_loaded
+        self._parts = self._read()
+        self._loaded = OrderedDict()
+        self._combined = OrderedDict()
+        self._part_cubes = {}
+        self._cubes = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._swept = False
+
+    # --- persistência ---
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != CATALOG_VERSION:
+            return {}
+        return data.get("partitions", {})
+
+    def _write(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self._lock:
+            data = {"version": CATALOG_VERSION, "partitions": self._parts}
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    # --- descoberta e ingestão ---
+    def discover(self):
+        """Fontes em ``data_dir``: {id: {"month", "kind", "paths"}}; o ZIP vence CSVs do mesmo mês."""
+        try:
+            names = sorted(os.listdir(self.data_dir))
+        except FileNotFoundError:
+            return {}
+        sources = {}
+        zip_months = set()
+        for name in names:
+            m = ARCHIVE_PATTERN.match(name)
+            if m:
+                sources[name] = {"month": m.group(1), "kind": "zip", "paths": [os.path.join(self.data_dir, name)]}
+                zip_months.add(m.group(1))
+        pares = {}
+        for name in names:
+            m = CSV_PATTERN.match(name)
+            if not m or m.group(1) in zip_months:
+                continue
+            folded = nf_cache._fold(name)
+            papel = ("cabecalho" if nf_cache.CABECALHO_PATTERN.search(folded)
+                     else "itens" if nf_cache.ITENS_PATTERN.search(folded) else None)
+            if papel:
+                pares.setdefault(m.group(1), {})[papel] = os.path.join(self.data_dir, name)
+        for month, par in pares.items():
+            if len(par) == 2:
+                sources[f"{month}_NFs (csv)"] = {"month": month, "kind": "csv",
+                                                 "paths": [par["cabecalho"], par["itens"]]}
+        return sources
+
+    def _read_source(self, source):
+        if source["kind"] == "zip":
+            return nf_cache.load_zip_tables(source["paths"][0], self.cache_dir)
+        cab, itens = source["paths"]
+        return (nf_cache.load_table(cab, nf_cache.CABECALHO_NUMERIC, self.cache_dir),
+                nf_cache.load_table(itens, nf_cache.ITENS_NUMERIC, self.cache_dir))
+
+    def _ingest(self, pid, source):
+        with metrics.span("nf.catalog_ingest", particao=pid):
+            cabecalho, itens = self._read_source(source)
+            entry = dict(source, id=pid, source=_stat_key(source["paths"]),
+                         **partition_stats(cabecalho, itens))
+            self._build_cubes(pid, entry, (cabecalho, itens))
+        self._remember(pid, (cabecalho, itens))
+        logging.info(f"Catálogo: partição {pid} registrada ({entry['rows']['cabecalho']} notas, "
+                     f"{entry['min_date']} a {entry['max_date']})")
+        return pid, entry
+
+    def refresh(self, workers=LOAD_WORKERS):
+        """Registra partições novas/alteradas (em paralelo) e esquece as removidas.
+
+        Retorna os ids processados nesta chamada; as já catalogadas só custam um ``stat``.
+        """
+        sources = self.discover()
+        pending = {}
+        for pid, source in sources.items():
+            entry = self._parts.get(pid)
+            if entry is None or entry.get("source") != _stat_key(source["paths"]):
+                pending[pid] = source
+        removed = set(self._parts) - set(sources)
+        if not pending and not removed:
+            if not self._swept:
+                self._prune_profiles()
+            return []
+        done = []
+        if pending:
+            with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pending)))) as pool:
+                futures = {pool.submit(self._ingest, pid, src): pid for pid, src in pending.items()}
+                for fut, pid in futures.items():
+                    try:
+                        _, entry = fut.result()
+                    except Exception as e:
+                        logging.warning(f"Catálogo: partição {pid} ignorada: {e}")
+                        continue
+                    with self._lock:
+                        self._parts[pid] = entry
+                    done.append(pid)
+        with self._lock:
+            for pid in removed:
+                self._parts.pop(pid, None)
+                _detach(self._loaded.pop(pid, None))
+                self._part_cubes.pop(pid, None)
+            for tables in self._combined.values():
+                _forget(tables, self.cache_dir)
+            self._combined.clear()
+        self._write()
+        self._prune_profiles()
+        if done:
+            # deixa pronto o cubo de todas as partições: só os meses novos entram na fusão
+            try:
+                self.cubes()
+            except Exception as e:
+                logging.warning(f"Catálogo: cubo de agregados não atualizado: {e}")
+        return sorted(done)
+
+    def _prune_profiles(self):
+        """Perfis de prompt de meses removidos ou substituídos saem junto com eles."""
+        with self._lock:
+            self._swept = True
+            keep = [f for p in self._parts.values() for f in p["fingerprints"]]
+            keep += [df.attrs.get("fingerprint") for tables in self._combined.values() for df in tables]
+        if self._parts:
+            # sem partições o app usa o dataset avulso, cujos perfis não são do catálogo
+            nf_profile.prune_files(keep, self.cache_dir)
+
+    # --- consulta ---
+    def partitions(self):
+        with self._lock:
+            return [dict(p) for _, p in sorted(self._parts.items())]
+
+    def prune(self, inicio=None, fim=None, ufs=None):
+        """Ids das partições que podem ter notas no período/UFs pedidos."""
+        inicio = pd.Timestamp(inicio) if inicio is not None else None
+        fim = pd.Timestamp(fim) if fim is not None else None
+        keep = []
+        for p in self.partitions():
+            if p["min_date"] is not None:
+                if fim is not None and pd.Timestamp(p["min_date"]) > fim:
+                    continue
+                if inicio is not None and pd.Timestamp(p["max_date"]) < inicio:
+                    continue
+            if ufs:
+                presentes = set().union(*(set(v) for v in p.get("ufs", {}).values()))
+                if not presentes & set(ufs):
+                    continue
+            keep.append(p["id"])
+        return keep
+
+    def _remember(self, pid, tables):
+        with self._lock:
+            old = self._loaded.get(pid)
+            if old is not None and old is not tables:
+                _detach(old)
+            self._loaded[pid] = tables
+            self._loaded.move_to_end(pid)
+            while len(self._loaded) > self.max_loaded:
+                _detach(self._loaded.popitem(last=False)[1])
+
+    def load_partition(self, pid):
+        """(cabecalho, itens) de uma partição; lida do cache Parquet uma vez por processo."""
+        with self._lock:
+            if pid in self._loaded:
+                self._loaded.move_to_end(pid)
+                return self._loaded[pid]
+            entry = self._parts[pid]
+            key_lock = self._loading.setdefault(pid, threading.Lock())
+        with key_lock:
+            with self._lock:
+                if pid in self._loaded:
+                    return self._loaded[pid]
+            with metrics.span("nf.catalog_load", particao=pid):
+                tables = self._read_source(entry)
+            self._remember(pid, tables)
+            with self._lock:
+                self._loading.pop(pid, None)
+            return tables
+
+    def load(self, inicio=None, fim=None, ufs=None, ids=None, workers=LOAD_WORKERS):
+        """(cabecalho, itens) das partições alcançadas pelo filtro, já filtrados por linha.
+
+        ``ids`` restringe às partições dadas. ``attrs["fingerprint"]`` combina
+        as partições e o filtro (chave do cache de respostas e dos engines);
+        ``attrs["partitions"]`` lista os ids usados, ``attrs["parquet"]`` os
+        Parquets de cada um e ``attrs["filter"]`` o filtro aplicado às linhas.
+        """
+        pids = self.prune(inicio, fim, ufs)
+        if ids is not None:
+            pids = [p for p in pids if p in set(ids)]
+        if not pids:
+            raise ValueError("Nenhuma partição de NF atende ao filtro.")
+        if len(pids) == 1 and inicio is None and fim is None and not ufs:
+            # caso comum (um mês, sem filtro): devolve os frames do cache como estão
+            tables = self.load_partition(pids[0])
+            self._attach_cubes(tables, pids)
+            return tables
+        h = hashlib.sha1(json.dumps([sorted(pids), str(inicio), str(fim), sorted(ufs or [])]).encode("utf-8"))
+        with self._lock:
+            for pid in sorted(pids):
+                h.update(json.dumps(self._parts[pid]["fingerprints"]).encode("utf-8"))
+        fingerprint = h.hexdigest()
+        with self._lock:
+            if fingerprint in self._combined:
+                self._combined.move_to_end(fingerprint)
+                return self._combined[fingerprint]
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pids)))) as pool:
+            tables = list(pool.map(self.load_partition, pids))
+        # filtro e Parquets de origem vão junto: o backend SQL lê os arquivos, não o frame
+        filtro = {"inicio": None if inicio is None else pd.Timestamp(inicio).isoformat(),
+                  "fim": None if fim is None else pd.Timestamp(fim).isoformat(),
+                  "ufs": sorted(ufs or [])}
+        result = []
+        for i in range(2):
+            df = _filter(_concat([t[i] for t in tables]), inicio, fim, ufs).copy(deep=False)
+            df.attrs = {"fingerprint": f"{fingerprint}-{i}", "partitions": pids,
+                        "parquet": [t[i].attrs.get("parquet") for t in tables], "filter": filtro}
+            result.append(df)
+        result = tuple(result)
+        if inicio is None and fim is None and not ufs:
+            self._attach_cubes(result, pids)
+        with self._lock:
+            self._combined[fingerprint] = result
+            while len(self._combined) > MAX_COMBINED:
+                _forget(self._combined.popitem(last=False)[1], self.cache_dir)
+        return result
+
+    def fingerprints(self, pid):
+        """Impressões digitais dos frames com a partição ``pid``: ela sozinha e as combinações em memória.
+
+        Chaves do cache de respostas e do registro de engines que deixam de
+        valer quando a partição é substituída; as dos outros meses ficam.
+        """
+        with self._lock:
+            entry = self._parts.get(pid)
+            found = list(entry["fingerprints"]) if entry else []
+            for tables in self._combined.values():
+                if pid in tables[0].attrs.get("partitions", ()):
+                    found += [df.attrs.get("fingerprint") for df in tables]
+        return [f for f in found if f]
+
+    # --- cubo de agregados ---
+    def _cube_path(self, pid, entry, i):
+        h = hashlib.sha1(json.dumps([pid, entry["fingerprints"]]).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.cache_dir, "cubes", f"{h}-{i}.pkl")
+
+    def _build_cubes(self, pid, entry, tables):
+        with metrics.span("nf.cube_build", particao=pid):
+            cubes = tuple(nf_cube.build(df) for df in tables)
+        for i, cube in enumerate(cubes):
+            cube.save(self._cube_path(pid, entry, i))
+        with self._lock:
+            self._part_cubes[pid] = (json.dumps(entry["fingerprints"]), cubes)
+        return cubes
+
+    def partition_cubes(self, pid):
+        """(cubo do cabeçalho, cubo dos itens) de uma partição: memória, disco ou montado agora."""
+        with self._lock:
+            entry = self._parts[pid]
+            stamp = json.dumps(entry["fingerprints"])
+            cached = self._part_cubes.get(pid)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        cubes = tuple(nf_cube.Cube.load(self._cube_path(pid, entry, i)) for i in range(2))
+        if None in cubes:
+            # catálogo anterior aos cubos ou cache apagado: monta a partir das tabelas
+            return self._build_cubes(pid, entry, self.load_partition(pid))
+        with self._lock:
+            self._part_cubes[pid] = (stamp, cubes)
+        return cubes
+
+    def cubes(self, ids=None):
+        """(cubo do cabeçalho, cubo dos itens) das partições ``ids`` (todas, sem argumento).
+
+        Parte da maior combinação já fundida contida no pedido e funde só as
+        partições que faltam.
+        """
+        with self._lock:
+            pids = sorted(self._parts if ids is None else ids)
+            if not pids:
+                raise ValueError("Nenhuma partição de NF no catálogo.")
+            key = frozenset((pid, json.dumps(self._parts[pid]["fingerprints"])) for pid in pids)
+            if key in self._cubes:
+                self._cubes.move_to_end(key)
+                return self._cubes[key]
+            base = max((k for k in self._cubes if k <= key), key=len, default=frozenset())
+            result = self._cubes.get(base)
+        missing = sorted(pid for pid, _ in key - base)
+        with metrics.span("nf.cube_merge", particoes=len(missing)):
+            parts = [self.partition_cubes(pid) for pid in missing]
+            if result is not None:
+                parts.insert(0, result)
+            result = tuple(nf_cube.merge([p[i] for p in parts]) for i in range(2))
+        with self._lock:
+            self._cubes[key] = result
+            while len(self._cubes) > MAX_COMBINED:
+                self._cubes.popitem(last=False)
+        return result
+
+    def _attach_cubes(self, tables, pids):
+        # só frames sem filtro de linha: o cubo cobre as partições inteiras
+        for i, df in enumerate(tables):
+            nf_cube.attach(df.attrs.get("fingerprint"), lambda i=i: self.cubes(pids)[i])
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_catalog():
+    """Instância compartilhada por todas as sessões do processo."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Catalog()
+        return _default
@@ -0,0 +1,493 @@
+# utils/nf_cube.py
+"""Cubo de agregados das Notas Fiscais, mantido incrementalmente por partição.
+
+Quase toda pergunta é um agrupamento de ``VALOR NOTA FISCAL``, ``VALOR
+TOTAL`` ou ``QUANTIDADE`` por UF, emitente, natureza da operação, produto
+ou dia de emissão. Em vez de varrer a tabela a cada pergunta, o catálogo
+(``nf_catalog``) monta na ingestão de cada mês um cubo com um cuboide por
+combinação de até ``CUBE_MAX_DIMS`` dimensões: linhas, soma, contagem,
+mínimo e máximo de cada medida e, nos cuboides de até uma dimensão, as
+notas distintas (exatas) e um sketch HyperLogLog das chaves de acesso.
+
+Tudo é associativo: o cubo de vários meses é a fusão dos cubos de cada
+mês, e um ZIP novo só soma o cubo dele ao que já estava fundido. As
+consultas (``route``, ``lookup``, ``rollup``) leem só o cuboide, com
+índices por valor de dimensão montados na primeira consulta.
+"""
+import os
+import threading
+from collections import OrderedDict
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+try:
+    from utils import nf_router
+except ImportError:  # executado como script dentro de utils/
+    import nf_router
+
+MAX_DIMS = int(os.getenv("CUBE_MAX_DIMS", "2"))
+# 2**8 registradores por grupo: ~6,5% de erro padrão, 256 bytes
+HLL_PRECISION = int(os.getenv("CUBE_HLL_PRECISION", "8"))
+# cuboides maiores que isso ficam sem sketch (só as contagens exatas)
+SKETCH_MAX_GROUPS = 20000
+# EDA: colunas de texto com até tantos valores distintos viram dimensão
+AUTO_MAX_CARDINALITY = 50
+AUTO_MAX_DIMS = 6
+CUBE_VERSION = 1
+
+KEY_COLUMN = nf_router.KEY_COLUMN
+DATE_COLUMN = "DATA EMISSÃO"
+DAY_DIMENSION = "DIA EMISSÃO"
+DIMENSIONS = ("UF EMITENTE", "RAZÃO SOCIAL EMITENTE", "NATUREZA DA OPERAÇÃO",
+              "DESCRIÇÃO DO PRODUTO/SERVIÇO", DAY_DIMENSION)
+MEASURES = ("VALOR NOTA FISCAL", "VALOR TOTAL", "QUANTIDADE")
+
+# sufixos das colunas de um cuboide e como cada uma se funde
+_MERGE = {"soma": "sum", "n": "sum", "min": "min", "max": "max"}
+_SUFFIX = {"soma": "soma", "minimo": "min", "maximo": "max"}
+_EMPTY = np.array([], dtype=np.int64)
+_NO_PLAN = object()
+# perguntas já interpretadas por cubo (a interpretação custa mais que a consulta)
+MAX_PLANS = 1024
+# frames com cubo registrado (``attach``); o catálogo também remove os que descarta
+MAX_SOURCES = int(os.getenv("CUBE_MAX_SOURCES", "32"))
+
+
+# --- HyperLogLog ---
+def _hll_registers(keys, codes, n_groups, p=HLL_PRECISION):
+    """Registradores (n_groups x 2**p, uint8) das chaves de cada grupo (``codes``)."""
+    m = 1 << p
+    registers = np.zeros((n_groups, m), dtype=np.uint8)
+    valid = keys.notna().to_numpy() & (codes >= 0)
+    if not valid.any():
+        return registers
+    h = pd.util.hash_pandas_object(keys[valid], index=False).to_numpy(np.uint64)
+    idx = (h >> np.uint64(64 - p)).astype(np.int64)
+    rest = h << np.uint64(p)
+    # posição do primeiro bit 1 nos 64 - p bits restantes
+    with np.errstate(divide="ignore"):
+        lz = 63 - np.floor(np.log2(rest.astype(np.float64)))
+    rank = np.where(rest == 0, 64 - p + 1, lz + 1).astype(np.uint8)
+    flat = pd.Series(rank).groupby(codes[valid].astype(np.int64) * m + idx).max()
+    registers.ravel()[flat.index.to_numpy()] = flat.to_numpy()
+    return registers
+
+
+def hll_estimate(registers):
+    """Estimativa de distintos por linha de registradores (com correção para poucos itens)."""
+    registers = np.atleast_2d(registers)
+    m = registers.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.sum(np.ldexp(1.0, -registers.astype(np.int64)), axis=1)
+    zeros = (registers == 0).sum(axis=1)
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+
+# --- cuboide ---
+class Cuboid:
+    """Agregados de um conjunto de dimensões: uma linha por combinação observada."""
+
+    def __init__(self, dims, frame, sketch=None):
+        self.dims = tuple(dims)
+        self.frame = frame
+        self.sketch = sketch
+        self._arrays = {}
+        self._index = {}
+
+    def __len__(self):
+        return len(self.frame)
+
+    @property
+    def nbytes(self):
+        size = int(self.frame.memory_usage(index=True, deep=True).sum())
+        return size + (self.sketch.nbytes if self.sketch is not None else 0)
+
+    @classmethod
+    def build(cls, base, dims, measures, key=None):
+        """Cuboide de ``base`` (linhas cruas) agrupado por ``dims``."""
+        named = {}
+        for m in measures:
+            named.update({f"{m}|soma": (m, "sum"), f"{m}|n": (m, "count"),
+                          f"{m}|min": (m, "min"), f"{m}|max": (m, "max")})
+        if not dims:
+            row = {"linhas": len(base)}
+            row.update({name: base[col].agg(how) for name, (col, how) in named.items()})
+            if key:
+                row["notas"] = base[key].nunique()
+            frame = pd.DataFrame([row])
+            codes = np.zeros(len(base), dtype=np.int64)
+        else:
+            g = base.groupby(list(dims), observed=True, sort=False)
+            frame = g.size().rename("linhas").to_frame()
+            if named:
+                frame = frame.join(g.agg(**named))
+            if key:
+                frame["notas"] = g[key].nunique()
+            frame = frame.reset_index()
+            codes = g.ngroup().to_numpy() if key else None
+        sketch = None
+        if key and len(frame) <= SKETCH_MAX_GROUPS:
+            sketch = _hll_registers(base[key], codes, len(frame))
+        return cls(dims, frame, sketch)
+
+    @classmethod
+    def merge(cls, parts):
+        """Fusão de cuboides das mesmas dimensões (partições diferentes)."""
+        if len(parts) == 1:
+            return parts[0]
+        dims = parts[0].dims
+        frame = pd.concat([p.frame for p in parts], ignore_index=True)
+        spec = {c: ("sum" if c in ("linhas", "notas") else _MERGE[c.rpartition("|")[2]])
+                for c in frame.columns if c not in dims}
+        if dims:
+            g = frame.groupby(list(dims), observed=True, sort=False)
+            merged = g.agg(spec).reset_index()
+            codes = g.ngroup().to_numpy()
+        else:
+            merged = pd.DataFrame([{c: frame[c].agg(how) for c, how in spec.items()}])
+            codes = np.zeros(len(frame), dtype=np.int64)
+        sketch = None
+        if all(p.sketch is not None for p in parts) and len(merged) <= SKETCH_MAX_GROUPS:
+            sketch = np.zeros((len(merged), parts[0].sketch.shape[1]), dtype=np.uint8)
+            np.maximum.at(sketch, codes, np.concatenate([p.sketch for p in parts]))
+        return cls(dims, merged, sketch)
+
+    def array(self, column):
+        arr = self._arrays.get(column)
+        if arr is None:
+            arr = self._arrays[column] = self.frame[column].to_numpy()
+        return arr
+
+    def select(self, flt):
+        """Posições das linhas que atendem ao filtro do roteador (coluna, operador, valor)."""
+        if flt is None:
+            return slice(None)
+        column, op, value = flt
+        index = self._index.get(column)
+        if index is None:
+            # mesma normalização de nf_router._apply_filter
+            keys = pd.Series(self.array(column)).astype(str).str.strip().str.casefold()
+            index = self._index[column] = keys.groupby(keys, sort=False).indices
+        if op == "eq":
+            return index.get(value.strip().casefold(), _EMPTY)
+        needle = value.casefold()
+        hits = [pos for k, pos in index.items() if needle in k]
+        return np.sort(np.concatenate(hits)) if hits else _EMPTY
+
+
+# --- cubo ---
+class Cube:
+    """Cuboides de uma tabela (Cabeçalho ou Itens), por combinação de dimensões."""
+
+    def __init__(self, dimensions, measures, cuboids, columns, numeric, key=None):
+        self.dimensions = tuple(dimensions)
+        self.measures = tuple(measures)
+        self.cuboids = cuboids
+        self.columns = list(columns)
+        self.numeric = set(numeric)
+        self.key = key
+        self._plans = {}
+        total = cuboids[()].frame.iloc[0]
+        self.rows = int(total["linhas"])
+        # no Cabeçalho cada linha é uma nota: qualquer recorte tem notas == linhas
+        self.key_unique = key is not None and int(total["notas"]) == self.rows
+
+    @property
+    def nbytes(self):
+        return sum(c.nbytes for c in self.cuboids.values())
+
+    def __sizeof__(self):
+        return self.nbytes
+
+    def cuboid(self, dims):
+        wanted = set(dims)
+        if not wanted <= set(self.dimensions) or len(wanted) != len(dims):
+            return None
+        return self.cuboids.get(tuple(d for d in self.dimensions if d in wanted))
+
+    # --- respostas do agente ---
+    def route(self, question, tabela=None):
+        """Como ``nf_router.route``, lendo só o cubo; None se a intenção ou as colunas não estiverem nele."""
+        pl = self._plans.get((tabela, question))
+        if pl is None:
+            if len(self._plans) >= MAX_PLANS:
+                self._plans.clear()
+            pl = nf_router.plan(question, self.columns, self.numeric.__contains__, tabela)
+            pl = self._plans[(tabela, question)] = pl or _NO_PLAN
+        if pl is _NO_PLAN:
+            return None
+        answer = self._answer(pl)
+        return None if answer is None else nf_router.RouterResult(answer, pl.intent, pl.columns)
+
+    def _answer(self, pl):
+        flt = pl.filter
+        fdims = (flt[0],) if flt else ()
+        if flt and flt[0] not in self.dimensions:
+            return None
+        _scalar = nf_router._scalar
+
+        if pl.intent in ("contar_distintos", "top_n", "top_n_notas", "top_n_soma"):
+            if pl.target not in self.dimensions:
+                return None
+            if pl.intent == "top_n_soma" and pl.value not in self.measures:
+                return None
+            cuboid = self.cuboid(fdims + (pl.target,))
+            if cuboid is None:
+                return None
+            rows = cuboid.select(flt)
+            keys = cuboid.array(pl.target)[rows]
+            if pl.intent == "contar_distintos":
+                return _scalar(len(pd.unique(keys)))
+            if pl.intent == "top_n_soma":
+                column = f"{pl.value}|soma"
+            elif pl.intent == "top_n" or self.key_unique:
+                column = "linhas"
+            elif flt is None and "notas" in cuboid.frame:
+                # sem filtro cada linha do cuboide já traz as notas distintas do
+                # grupo; com filtro as notas se repetiriam entre grupos (pandas)
+                column = "notas"
+            else:
+                return None
+            values = cuboid.array(column)[rows]
+            if flt is not None:
+                # com filtro o mesmo valor de ``target`` pode vir de vários grupos
+                inverse, keys = pd.factorize(keys)
+                if len(keys) < len(values):
+                    values = np.bincount(inverse, weights=values, minlength=len(keys))
+            if pl.intent != "top_n_soma":
+                keep = np.flatnonzero(values > 0)
+                keys, values = keys[keep], values[keep]
+            keys, values = nf_router._ranked(keys, values, pl.n)
+            if pl.intent == "top_n_soma":
+                return [{pl.target: k, pl.value: v} for k, v in zip(keys, values)]
+            return [{pl.target: k, "contagem": int(v)} for k, v in zip(keys, values)]
+
+        cuboid = self.cuboid(fdims)
+        if cuboid is None:
+            return None
+        rows = cuboid.select(flt)
+        if pl.intent in ("maximo", "minimo", "media", "soma"):
+            if pl.target not in self.measures:
+                return None
+            return _scalar(self._reduce(cuboid, rows, pl.target, pl.intent))
+        if pl.intent == "contar_linhas":
+            return _scalar(cuboid.array("linhas")[rows].sum())
+        if pl.intent == "contar_notas":
+            if self.key_unique:
+                return _scalar(cuboid.array("linhas")[rows].sum())
+            # notas de grupos diferentes se repetem (uma nota tem vários produtos):
+            # exato só sem filtro ou com um grupo; o resto fica com o pandas
+            if "notas" in cuboid.frame and (flt is None or len(cuboid.array("notas")[rows]) <= 1):
+                return _scalar(cuboid.array("notas")[rows].sum())
+        return None
+
+    @staticmethod
+    def _reduce(cuboid, rows, measure, how):
+        if how == "soma":
+            return cuboid.array(f"{measure}|soma")[rows].sum()
+        if how == "media":
+            n = cuboid.array(f"{measure}|n")[rows].sum()
+            return cuboid.array(f"{measure}|soma")[rows].sum() / n if n else float("nan")
+        values = pd.Series(cuboid.array(f"{measure}|{_SUFFIX[how]}")[rows])
+        return values.max() if how == "maximo" else values.min()
+
+    # --- consulta direta ---
+    def lookup(self, measure=None, agg="soma", by=(), where=None):
+        """Agregado de ``measure`` por ``by`` com ``where`` = {dimensão: valor} (igualdade).
+
+        ``agg``: soma, media, minimo, maximo, contagem (valores não nulos),
+        linhas ou notas (aproximado pelo sketch quando o recorte junta vários
+        grupos). Sem ``by`` devolve um escalar; com ``by``, uma Series.
+        """
+        by = tuple([by] if isinstance(by, str) else by)
+        where = where or {}
+        cuboid = self.cuboid(by + tuple(where))
+        if cuboid is None:
+            raise KeyError(f"Cubo sem o cuboide {by + tuple(where)}")
+        rows = np.arange(len(cuboid))
+        for dim, value in where.items():
+            rows = np.intersect1d(rows, cuboid.select((dim, "eq", str(value))))
+        if not by:
+            return self._lookup_total(cuboid, rows, measure, agg)
+        keys = [cuboid.array(d)[rows] for d in by]
+        index = pd.MultiIndex.from_arrays(keys, names=by) if len(by) > 1 else pd.Index(keys[0], name=by[0])
+        if agg in ("linhas", "notas"):
+            return pd.Series(cuboid.array(agg)[rows], index=index, name=agg)
+        if agg == "contagem":
+            return pd.Series(cuboid.array(f"{measure}|n")[rows], index=index, name=measure)
+        if agg == "media":
+            values = cuboid.array(f"{measure}|soma")[rows] / cuboid.array(f"{measure}|n")[rows]
+        else:
+            values = cuboid.array(f"{measure}|{_SUFFIX[agg]}")[rows]
+        return pd.Series(values, index=index, name=measure)
+
+    def _lookup_total(self, cuboid, rows, measure, agg):
+        if agg == "linhas":
+            return int(cuboid.array("linhas")[rows].sum())
+        if agg == "notas":
+            if self.key_unique:
+                return int(cuboid.array("linhas")[rows].sum())
+            if len(rows) <= 1:
+                return int(cuboid.array("notas")[rows].sum())
+            if cuboid.sketch is None:
+                raise KeyError("Cuboide sem sketch de notas distintas")
+            return int(round(hll_estimate(cuboid.sketch[rows].max(axis=0))[0]))
+        if agg == "contagem":
+            return int(cuboid.array(f"{measure}|n")[rows].sum())
+        return self._reduce(cuboid, rows, measure, agg)
+
+    def rollup(self, by, measure=None):
+        """Tabela por ``by``: linhas, notas e soma/média/mínimo/máximo de ``measure`` (ou de todas)."""
+        by = tuple([by] if isinstance(by, str) else by)
+        cuboid = self.cuboid(by)
+        if cuboid is None:
+            raise KeyError(f"Cubo sem o cuboide {by}")
+        out = cuboid.frame[list(by) + ["linhas"] + (["notas"] if "notas" in cuboid.frame else [])].copy()
+        for m in [measure] if measure else self.measures:
+            out[f"{m} soma"] = cuboid.frame[f"{m}|soma"]
+            out[f"{m} média"] = cuboid.frame[f"{m}|soma"] / cuboid.frame[f"{m}|n"].replace(0, np.nan)
+            out[f"{m} mín"] = cuboid.frame[f"{m}|min"]
+            out[f"{m} máx"] = cuboid.frame[f"{m}|max"]
+        sort = f"{measure} soma" if measure else "linhas"
+        return out.sort_values(sort, ascending=False).set_index(list(by))
+
+    # --- persistência ---
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        payload = {
+            "version": CUBE_VERSION, "dimensions": self.dimensions, "measures": self.measures,
+            "columns": self.columns, "numeric": sorted(self.numeric), "key": self.key,
+            "cuboids": {dims: (c.frame, c.sketch) for dims, c in self.cuboids.items()},
+        }
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        pd.to_pickle(payload, tmp)
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """Cubo gravado por ``save``; None se não existir ou for de outra versão."""
+        try:
+            payload = pd.read_pickle(path)
+        except (OSError, ValueError, EOFError):
+            return None
+        if not isinstance(payload, dict) or payload.get("version") != CUBE_VERSION:
+            return None
+        cuboids = {dims: Cuboid(dims, frame, sketch) for dims, (frame, sketch) in payload["cuboids"].items()}
+        return cls(payload["dimensions"], payload["measures"], cuboids, payload["columns"],
+                   payload["numeric"], payload["key"])
+
+
+def build(df, dimensions=DIMENSIONS, measures=MEASURES, key=KEY_COLUMN, max_dims=MAX_DIMS):
+    """Cubo de uma tabela; dimensões e medidas ausentes em ``df`` são ignoradas."""
+    base = pd.DataFrame(index=df.index)
+    dims = []
+    for d in dimensions:
+        if d == DAY_DIMENSION and DATE_COLUMN in df:
+            base[d] = pd.to_datetime(df[DATE_COLUMN], errors="coerce").dt.normalize()
+        elif d in df and d != DAY_DIMENSION:
+            base[d] = df[d]
+        else:
+            continue
+        dims.append(d)
+    measures = [m for m in measures if m in df and pd.api.types.is_numeric_dtype(df[m])]
+    for m in measures:
+        base[m] = df[m]
+    key = key if key in df else None
+    if key:
+        base[key] = df[key]
+    cuboids = {}
+    for k in range(max_dims + 1):
+        for combo in combinations(dims, k):
+            # notas e sketch só até uma dimensão: acima disso o custo cresce e as
+            # perguntas do roteador não precisam
+            cuboids[combo] = Cuboid.build(base, combo, measures, key if k <= 1 else None)
+    numeric = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
+    return Cube(dims, measures, cuboids, df.columns, numeric, key)
+
+
+def merge(cubes):
+    """Cubo de várias partições; só ficam os cuboides presentes em todas."""
+    cubes = [c for c in cubes if c is not None]
+    if len(cubes) == 1:
+        return cubes[0]
+    dims = [d for d in cubes[0].dimensions if all(d in c.dimensions for c in cubes[1:])]
+    measures = [m for m in cubes[0].measures if all(m in c.measures for c in cubes[1:])]
+    cuboids = {}
+    for combo in cubes[0].cuboids:
+        if set(combo) <= set(dims) and all(combo in c.cuboids for c in cubes[1:]):
+            parts = [_restrict(c.cuboids[combo], measures) for c in cubes]
+            cuboids[combo] = Cuboid.merge(parts)
+    columns = [c for c in cubes[0].columns if all(c in cube.columns for cube in cubes[1:])]
+    numeric = set.intersection(*(c.numeric for c in cubes))
+    key = cubes[0].key if all(c.key == cubes[0].key for c in cubes) else None
+    return Cube(dims, measures, cuboids, columns, numeric, key)
+
+
+def _restrict(cuboid, measures):
+    keep = [c for c in cuboid.frame.columns
+            if c in cuboid.dims or c in ("linhas", "notas") or c.rpartition("|")[0] in measures]
+    if len(keep) == len(cuboid.frame.columns):
+        return cuboid
+    return Cuboid(cuboid.dims, cuboid.frame[keep], cuboid.sketch)
+
+
+def build_auto(df):
+    """Cubo para um CSV qualquer (aba EDA).
+
+    Usa as dimensões/medidas das NFs quando o CSV as tem; senão, colunas de
+    texto ou categóricas com até ``AUTO_MAX_CARDINALITY`` valores como
+    dimensões e as numéricas restantes como medidas.
+    """
+    if any(d in df for d in DIMENSIONS if d != DAY_DIMENSION):
+        return build(df)
+    dims = []
+    for col in df.columns:
+        s = df[col]
+        texto = not pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_datetime64_any_dtype(s)
+        inteiro = pd.api.types.is_integer_dtype(s) or pd.api.types.is_bool_dtype(s)
+        if (texto or inteiro) and s.nunique() <= AUTO_MAX_CARDINALITY:
+            dims.append(col)
+        if len(dims) == AUTO_MAX_DIMS:
+            break
+    measures = [c for c in df.columns if c not in dims and pd.api.types.is_numeric_dtype(df[c])
+                and not pd.api.types.is_bool_dtype(df[c])]
+    return build(df, dims, measures, key=None)
+
+
+# --- cubos dos frames entregues pelo catálogo ---
+_sources = OrderedDict()
+_sources_lock = threading.Lock()
+
+
+def attach(fingerprint, factory):
+    """Liga a impressão digital de um frame à função que devolve o cubo dele.
+
+    Guarda no máximo ``MAX_SOURCES`` frames (LRU); um frame esquecido só
+    deixa de usar o cubo e é respondido pelo roteador no pandas.
+    """
+    if fingerprint:
+        with _sources_lock:
+            _sources[fingerprint] = factory
+            _sources.move_to_end(fingerprint)
+            while len(_sources) > MAX_SOURCES:
+                _sources.popitem(last=False)
+
+
+def detach(fingerprint):
+    """Esquece o cubo de um frame (ex.: descartado pelo catálogo)."""
+    with _sources_lock:
+        _sources.pop(fingerprint, None)
+
+
+def for_frame(df):
+    """Cubo do frame (pela impressão digital) ou None se ele não veio inteiro do catálogo."""
+    fingerprint = df.attrs.get("fingerprint")
+    with _sources_lock:
+        factory = _sources.get(fingerprint)
+        if factory is not None:
+            _sources.move_to_end(fingerprint)
+    return factory() if factory is not None else None
@@ -0,0 +1,112 @@
+# utils/nf_engine.py
+"""PandasQueryEngine do agente de NF, com o perfil compacto (``nf_profile``).
+
+Módulo separado porque importa o ``llama_index.experimental`` (vários
+segundos): só é carregado quando o primeiro engine é construído.
+
+O código gerado é avaliado por ``nf_exec``, com limite de tempo que vale
+também fora da thread principal (script do Streamlit e jobs).
+"""
+import logging
+
+from llama_index.core.base.response.schema import Response
+from llama_index.core.utils import print_text
+from llama_index.experimental.query_engine import PandasQueryEngine
+
+try:
+    from utils import metrics, nf_exec, nf_profile
+except ImportError:  # executado como script dentro de utils/
+    import metrics
+    import nf_exec
+    import nf_profile
+
+
+class ProfiledPandasQueryEngine(PandasQueryEngine):
+    """PandasQueryEngine cujo contexto de tabela é o perfil compacto.
+
+    O número de tokens de cada prompt vai para o log e para
+    ``response.metadata["prompt_tokens"]``. ``_query``/``_aquery`` seguem
+    os da classe base, separando em spans a ida ao LLM (``nf.llm``) e a
+    avaliação do código pandas (``nf.pandas_eval``).
+    """
+
+    def __init__(self, *args, token_budget=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._token_budget = nf_profile.PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+        self._context = None
+
+    def _get_table_context(self) -> str:
+        if self._token_budget <= 0:
+            return super()._get_table_context()
+        if self._context is None:
+            self._context = nf_profile.table_context(self._df, self._token_budget)
+        return self._context
+
+    def _prompt_tokens(self, query_bundle):
+        prompt = self._pandas_prompt.format(
+            df_str=self._get_table_context(),
+            query_str=query_bundle.query_str,
+            instruction_str=self._instruction_str,
+        )
+        n = nf_profile.count_tokens(prompt)
+        logging.info(f"Prompt com {n} tokens: {query_bundle.query_str}")
+        return n
+
+    def _prompt_kwargs(self, query_bundle):
+        return {
+            "df_str": self._get_table_context(),
+            "query_str": query_bundle.query_str,
+            "instruction_str": self._instruction_str,
+        }
+
+    def _evaluate(self, pandas_response_str, n):
+        if self._verbose:
+            print_text(f"> Pandas Instructions:\n```\n{pandas_response_str}\n```\n")
+        with metrics.span("nf.pandas_eval"):
+            parser = self._instruction_parser
+            pandas_output = nf_exec.run(pandas_response_str, parser.df, **parser.output_kwargs)
+        if self._verbose:
+            print_text(f"> Pandas Output: {pandas_output}\n")
+        metadata = {
+            "pandas_instruction_str": pandas_response_str,
+            "raw_pandas_output": pandas_output,
+            "prompt_tokens": n,
+        }
+        return pandas_output, metadata
+
+    def _synthesis_kwargs(self, query_bundle, pandas_response_str, pandas_output):
+        return {
+            "query_str": query_bundle.query_str,
+            "pandas_instructions": pandas_response_str,
+            "pandas_output": pandas_output,
+        }
+
+    def _query(self, query_bundle):
+        n = self._prompt_tokens(query_bundle)
+        with metrics.span("nf.llm", tokens=n):
+            pandas_response_str = self._llm.predict(self._pandas_prompt, **self._prompt_kwargs(query_bundle))
+        pandas_output, metadata = self._evaluate(pandas_response_str, n)
+        if self._synthesize_response:
+            with metrics.span("nf.llm_synthesis"):
+                response_str = str(self._llm.predict(
+                    self._response_synthesis_prompt,
+                    **self._synthesis_kwargs(query_bundle, pandas_response_str, pandas_output),
+                ))
+        else:
+            response_str = str(pandas_output)
+        return Response(response=response_str, metadata=metadata)
+
+    async def _aquery(self, query_bundle):
+        n = self._prompt_tokens(query_bundle)
+        with metrics.span("nf.llm", tokens=n):
+            pandas_response_str = await self._llm.apredict(self._pandas_prompt, **self._prompt_kwargs(query_bundle))
+        pandas_output, metadata = self._evaluate(pandas_response_str, n)
+        if self._synthesize_response:
+            with metrics.span("nf.llm_synthesis"):
+                response_str = str(await self._llm.apredict(
+                    self._response_synthesis_prompt,
+                    **self._synthesis_kwargs(query_bundle, pandas_response_str, pandas_output),
+                ))
+        else:
+            response_str = str(pandas_output)
+        return Response(response=response_str, metadata=metadata)
@@ -0,0 +1,106 @@
+# utils/nf_exec.py
+"""Execução, com limite de tempo, do código pandas gerado pelo LLM.
+
+O ``safe_exec`` do llama_index limita o tempo com SIGALRM, que só funciona
+na thread principal; o app responde em threads do Streamlit e dos jobs
+(``utils.jobs``). Aqui o código passa pela mesma verificação de AST e roda
+com os mesmos globais restritos do llama_index, mas numa thread auxiliar
+esperada por ``join(timeout)``. Estourado o prazo, a resposta é um erro e a
+thread é abandonada (threads não podem ser interrompidas); com
+``NF_EXEC_MAX_ABANDONED`` execuções abandonadas ainda vivas, novas
+execuções são recusadas até que elas terminem. Uma única chamada em C que
+segura o GIL atrasa o ``join`` até terminar; o prazo vale entre chamadas.
+
+Usado pelo engine do agente (``nf_engine``) e pela reexecução de planos
+(``plan_store``). Erros voltam como texto com o mesmo prefixo do
+``default_output_processor`` do llama_index.
+"""
+import ast
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+TIMEOUT_SECONDS = float(os.getenv("NF_EXEC_TIMEOUT", "30"))
+MAX_ABANDONED = int(os.getenv("NF_EXEC_MAX_ABANDONED", "2"))
+ERROR_PREFIX = "There was an error running the output as Python code."
+_DISPLAY_OPTIONS = ("max_colwidth", "max_rows", "max_columns")
+
+_abandoned = []
+_abandoned_lock = threading.Lock()
+
+
+def _error(message):
+    return f"{ERROR_PREFIX} Error message: {message}"
+
+
+def _guards():
+    """Verificação de AST e globais restritos do llama_index (sem o limite por SIGALRM)."""
+    from llama_index.experimental import exec_utils
+
+    return exec_utils._verify_source_safety, exec_utils._get_restricted_globals
+
+
+def _evaluate(output, df, output_kwargs):
+    """Mesmo roteiro do ``default_output_processor``: executa o corpo e avalia a última expressão."""
+    from llama_index.core.output_parsers.utils import parse_code_markdown
+
+    verify, restricted = _guards()
+    local_vars = {"df": df, "pd": pd}
+    global_vars = {"np": np}
+    code = parse_code_markdown(output, only_last=True)
+    if not isinstance(code, str):
+        code = code[0]
+    tree = ast.parse(code)
+    body = ast.unparse(ast.Module(tree.body[:-1], type_ignores=[]))
+    verify(body)
+    exec(body, restricted({}), local_vars)
+    last = ast.unparse(ast.Module(tree.body[-1:], type_ignores=[]))
+    if last.strip("'\"") != last:
+        # expressão entre aspas: avalia a string para obter a expressão
+        verify(last)
+        last = eval(last, restricted(global_vars), local_vars)
+    verify(last)
+    options = [x for name in _DISPLAY_OPTIONS if name in output_kwargs
+               for x in (f"display.{name}", output_kwargs[name])]
+    if not options:
+        return str(eval(last, restricted(global_vars), local_vars))
+    with pd.option_context(*options):
+        return str(eval(last, restricted(global_vars), local_vars))
+
+
+def busy():
+    """Execuções abandonadas por tempo que ainda estão rodando."""
+    with _abandoned_lock:
+        _abandoned[:] = [t for t in _abandoned if t.is_alive()]
+        return len(_abandoned)
+
+
+def run(output, df, timeout=None, **output_kwargs):
+    """Executa o código de ``output`` sobre ``df`` e devolve a saída como texto (ou o erro)."""
+    timeout = TIMEOUT_SECONDS if timeout is None else timeout
+    stuck = busy()
+    if stuck >= MAX_ABANDONED:
+        return _error(f"{stuck} execuções anteriores ainda rodando após o limite de tempo; tente mais tarde")
+    result = {}
+
+    def target():
+        try:
+            result["output"] = _evaluate(output, df, output_kwargs)
+        except Exception as e:
+            result["error"] = e
+
+    worker = threading.Thread(target=target, name="nf-exec", daemon=True)
+    worker.start()
+    worker.join(timeout)
+    if worker.is_alive():
+        with _abandoned_lock:
+            _abandoned.append(worker)
+        logging.warning(f"Código pandas abandonado após {timeout:g} s")
+        return _error(f"Code execution exceeded {timeout:g}s time limit")
+    if "error" in result:
+        logging.info(f"Código pandas falhou: {result['error']}")
+        return _error(result["error"])
+    return result["output"]
@@ -0,0 +1,196 @@
+# utils/nf_profile.py
+"""Perfil compacto do DataFrame para os prompts do agente de NF.
+
+Em vez do ``df.head()`` cru (30+ colunas largas por prompt), o LLM recebe
+nome, tipo, cardinalidade, valores mais frequentes e faixas numéricas de
+cada coluna. Os fatos são calculados uma vez por impressão digital e
+gravados em JSON ao lado do cache Parquet; o texto é montado para caber em
+``PROMPT_TOKEN_BUDGET`` tokens, reduzindo o detalhe quando necessário, e
+fica num LRU de ``NF_PROFILE_MEMO`` entradas. O catálogo (``nf_catalog``)
+apaga os JSONs dos frames que descarta (``forget``/``prune_files``).
+O engine que usa o perfil fica em ``nf_engine``; este módulo não importa
+o llama_index (o tokenizer só é carregado no primeiro ``count_tokens``).
+"""
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+try:
+    from utils import nf_cache
+except ImportError:  # executado como script dentro de utils/
+    import nf_cache
+
+# 0 desliga o perfil e volta ao df.head() original (útil para comparar)
+PROMPT_TOKEN_BUDGET = int(os.getenv("NF_PROMPT_TOKENS", "800"))
+TOP_VALUES = 3
+MAX_VALUE_CHARS = 40
+PROFILE_VERSION = 1
+MAX_MEMO = int(os.getenv("NF_PROFILE_MEMO", "64"))
+_FILE = re.compile(r"^profile-(.+)\.json$")
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def count_tokens(text):
+    from llama_index.core.utils import get_tokenizer
+
+    return len(get_tokenizer()(text))
+
+
+def _short(value):
+    text = str(value)
+    return text if len(text) <= MAX_VALUE_CHARS else text[:MAX_VALUE_CHARS - 1] + "…"
+
+
+def _fmt_num(value):
+    return f"{value:.6g}" if isinstance(value, float) else str(value)
+
+
+def column_facts(df, top_values=TOP_VALUES):
+    """Fatos por coluna (serializáveis em JSON)."""
+    facts = []
+    for col in df.columns:
+        s = df[col]
+        item = {"name": col, "dtype": str(s.dtype), "nulls": int(s.isna().sum()),
+                "distinct": int(s.nunique())}
+        if pd.api.types.is_bool_dtype(s):
+            pass
+        elif pd.api.types.is_numeric_dtype(s):
+            if s.notna().any():
+                item.update(min=s.min().item(), max=s.max().item(), mean=float(s.mean()))
+        elif pd.api.types.is_datetime64_any_dtype(s):
+            if s.notna().any():
+                item.update(min=str(s.min()), max=str(s.max()))
+        elif item["distinct"] < len(s):
+            # chaves (tudo distinto) não têm valores frequentes úteis
+            top = s.value_counts().head(top_values)
+            item["top"] = [[_short(v), int(n)] for v, n in top.items() if n > 0]
+        facts.append(item)
+    return {"version": PROFILE_VERSION, "rows": len(df), "columns": facts}
+
+
+def _facts_path(fingerprint, cache_dir):
+    # impressão inteira: os frames combinados do catálogo diferem só no sufixo (-0/-1)
+    return os.path.join(cache_dir, f"profile-{fingerprint}.json")
+
+
+def get_facts(df, cache_dir=None):
+    """Fatos do cache em disco (por impressão digital) ou calculados agora."""
+    fingerprint = df.attrs.get("fingerprint")
+    if fingerprint is None:
+        return column_facts(df)
+    path = _facts_path(fingerprint, cache_dir or nf_cache.CACHE_DIR)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            facts = json.load(f)
+        if facts.get("version") == PROFILE_VERSION and facts.get("rows") == len(df):
+            return facts
+    except (OSError, ValueError):
+        pass
+    facts = column_facts(df)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(facts, f, ensure_ascii=False, default=str)
+        os.replace(tmp, path)
+    except OSError as e:
+        logging.warning(f"Não foi possível gravar o perfil {path}: {e}")
+    return facts
+
+
+# níveis de detalhe, do mais rico ao mais enxuto:
+# (valores frequentes por coluna, só em colunas com até N distintos, estatísticas)
+_LEVELS = [
+    (TOP_VALUES, None, True),
+    (2, 50, True),
+    (1, 25, True),
+    (1, 10, True),
+    (0, 0, True),
+    (0, 0, False),
+]
+
+
+def _column_line(item, top_k, max_distinct, stats):
+    line = f"- {item['name']} ({item['dtype']})"
+    if not stats:
+        return line
+    parts = [f"{item['distinct']} distintos"]
+    if item["nulls"]:
+        parts.append(f"{item['nulls']} nulos")
+    if "mean" in item:
+        parts.append(f"min={_fmt_num(item['min'])}, max={_fmt_num(item['max'])}, média={_fmt_num(item['mean'])}")
+    elif "min" in item:
+        parts.append(f"de {item['min']} a {item['max']}")
+    if top_k and item.get("top") and (max_distinct is None or item["distinct"] <= max_distinct):
+        parts.append("ex.: " + ", ".join(f"'{v}' ({n})" for v, n in item["top"][:top_k]))
+    return f"{line}: {'; '.join(parts)}"
+
+
+def render_profile(facts, budget=PROMPT_TOKEN_BUDGET):
+    """Texto do perfil com o maior nível de detalhe que cabe em ``budget`` tokens."""
+    header = f"DataFrame `df` com {facts['rows']} linhas e {len(facts['columns'])} colunas:"
+    text = ""
+    for level in _LEVELS:
+        text = "\n".join([header] + [_column_line(item, *level) for item in facts["columns"]])
+        if count_tokens(text) <= budget:
+            return text
+    logging.warning(f"Perfil com {count_tokens(text)} tokens excede o orçamento de {budget}.")
+    return text
+
+
+def table_context(df, budget=PROMPT_TOKEN_BUDGET, cache_dir=None):
+    """Perfil renderizado, memorizado por (impressão digital, orçamento)."""
+    fingerprint = df.attrs.get("fingerprint")
+    key = (fingerprint, budget)
+    if fingerprint is not None:
+        with _memo_lock:
+            if key in _memo:
+                _memo.move_to_end(key)
+                return _memo[key]
+    text = render_profile(get_facts(df, cache_dir), budget)
+    if fingerprint is not None:
+        with _memo_lock:
+            _memo[key] = text
+            while len(_memo) > MAX_MEMO:
+                _memo.popitem(last=False)
+    return text
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logging.warning(f"Não foi possível apagar o perfil {path}: {e}")
+
+
+def forget(fingerprints, cache_dir=None):
+    """Descarta perfis (memória e JSON) de frames que deixaram de existir."""
+    fingerprints = {f for f in fingerprints if f}
+    with _memo_lock:
+        for key in [k for k in _memo if k[0] in fingerprints]:
+            del _memo[key]
+    for fingerprint in fingerprints:
+        _remove(_facts_path(fingerprint, cache_dir or nf_cache.CACHE_DIR))
+
+
+def prune_files(keep, cache_dir=None):
+    """Apaga os JSONs de perfil de ``cache_dir`` cuja impressão não está em ``keep``."""
+    cache_dir = cache_dir or nf_cache.CACHE_DIR
+    keep = set(keep)
+    try:
+        names = os.listdir(cache_dir)
+    except FileNotFoundError:
+        return []
+    removed = [name for name in names if _FILE.match(name) and _FILE.match(name).group(1) not in keep]
+    for name in removed:
+        _remove(os.path.join(cache_dir, name))
+    return removed
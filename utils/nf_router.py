@@ -0,0 +1,312 @@
+# utils/nf_router.py
+"""Roteador determinístico de intenções para o agente de Notas Fiscais.
+
+Reconhece perguntas de agregação comuns (contagens, contagem de distintos,
+soma, média, máximo/mínimo com filtro opcional, top-N e listagem de valores
+únicos), resolve os nomes de coluna contra ``df.columns`` ignorando acentos,
+caixa e aspas, e executa tudo vetorizado no pandas. Perguntas que não se
+encaixam retornam None e seguem para o LLM.
+
+Só responde quando entendeu a pergunta inteira: qualquer palavra que não
+seja da intenção, das colunas usadas, do filtro ou de ``_FILLER`` (ex.: "em
+SP", "acima de 5000", "por UF", "diferente de") manda a pergunta para o
+LLM em vez de ser ignorada.
+"""
+import difflib
+import re
+import unicodedata
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+_QUOTED = re.compile(r"'([^']+)'|\"([^\"]+)\"|“([^”]+)”")
+_NUMBER_WORDS = {
+    "um": 1, "uma": 1, "dois": 2, "duas": 2, "tres": 3, "quatro": 4, "cinco": 5,
+    "seis": 6, "sete": 7, "oito": 8, "nove": 9, "dez": 10,
+}
+FUZZY_CUTOFF = 0.85
+KEY_COLUMN = "CHAVE DE ACESSO"
+
+# restrições que o roteador não sabe aplicar: comparações, negações e agrupamentos
+_UNSUPPORTED = re.compile(
+    r"[<>≠≤≥]|!="
+    r"|\b(?:acima|abaixo|superior(?:es)?|inferior(?:es)?|entre|ate|apos|antes|depois"
+    r"|(?:maior|menor)(?:es)? (?:ou igual )?(?:que|do que|a)|mais de|menos|pelo menos|no minimo|no maximo"
+    r"|diferentes? d[eoa]s?|exceto|excluindo|salvo|fora|nao|sem|por|agrupad[oa]s?|cada)\b")
+# palavras que podem sobrar sem mudar o sentido da pergunta
+_FILLER = frozenset("""
+    a o as os um uma e eh de da do das dos no na nos nas em ao aos com para que
+    qual quais quanto quanta sao foi foram ser existem existe ha tem tinha tiveram teve
+    possui possuem aparece registrado registrados registrada registradas encontrado
+    encontrados encontrada encontradas presente presentes considerando considerar
+    coluna colunas campo tabela nesta neste nessa nesse desta deste dessa desse
+    dataframe df dados base arquivo todo todos toda todas total geral valor valores
+    sua suas seu seus respectiva respectivas respectivo respectivos contagem contagens
+    vezes ocorrencias frequencia liste listar lista listando mostre mostrar informe
+    diga retorne calcule me nota notas fiscal fiscais nf nfs emitida emitidas emitido
+    emitidos emitiu emitiram produto produtos cuja cujo cujas cujos onde
+""".split())
+
+
+@dataclass
+class RouterResult:
+    answer: object
+    intent: str
+    columns: list = field(default_factory=list)
+
+
+def _norm(text):
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def resolve_column(name, columns):
+    """Coluna de ``columns`` correspondente a ``name`` (acentos/caixa/aspas), ou None."""
+    target = _norm(name).strip("'\" ")
+    by_norm = {_norm(c): c for c in columns}
+    if target in by_norm:
+        return by_norm[target]
+    match = difflib.get_close_matches(target, list(by_norm), n=1, cutoff=FUZZY_CUTOFF)
+    return by_norm[match[0]] if match else None
+
+
+@dataclass
+class _Parsed:
+    text: str                 # pergunta normalizada, literais trocados por marcadores
+    columns: list             # colunas na ordem em que aparecem
+    values: list              # literais que não são colunas
+    filter: tuple = None      # (coluna, operador, valor)
+    filter_span: tuple = None # trecho de ``text`` que o filtro consome
+
+
+def _parse(question, columns):
+    found, values = [], []
+
+    def repl(m):
+        lit = m.group(1) or m.group(2) or m.group(3)
+        col = resolve_column(lit, columns)
+        if col is not None:
+            found.append(col)
+            return f" __c{len(found) - 1}__ "
+        values.append(lit)
+        return f" __v{len(values) - 1}__ "
+
+    text = _norm(_QUOTED.sub(repl, question))
+    # colunas citadas sem aspas (nome mais longo primeiro)
+    for c in sorted(columns, key=lambda c: -len(str(c))):
+        nc = _norm(c)
+        if len(nc) < 3 or c in found:
+            continue
+        # nomes de uma palavra ("NÚMERO", "MODELO") só contam se escritos como coluna
+        if " " not in nc and not re.search(r"\b" + re.escape(str(c)) + r"\b", question):
+            continue
+        m = re.search(r"(?<![\w/])" + re.escape(nc) + r"(?![\w/])", text)
+        if m:
+            found.append(c)
+            text = f"{text[:m.start()]} __c{len(found) - 1}__ {text[m.end():]}"
+    # renumera as colunas pela ordem em que aparecem na pergunta
+    order = [int(i) for i in re.findall(r"__c(\d+)__", text)]
+    renum = {old: new for new, old in enumerate(order)}
+    text = re.sub(r"__c(\d+)__", lambda m: f"__c{renum[int(m.group(1))]}__", text)
+    parsed = _Parsed(text=re.sub(r"\s+", " ", text).strip(), columns=[found[i] for i in order], values=values)
+
+    m = re.search(r"__c(\d+)__ (?:[^_\s]+ ){0,3}?(igual a|=|contem|contendo) __v(\d+)__", parsed.text)
+    if m:
+        op = "contains" if "cont" in m.group(2) else "eq"
+        parsed.filter = (parsed.columns[int(m.group(1))], op, values[int(m.group(3))])
+        parsed.filter_span = m.span()
+    return parsed
+
+
+def _apply_filter(df, flt):
+    if not flt:
+        return df
+    col, op, value = flt
+    series = df[col]
+    if op == "contains":
+        mask = series.astype(str).str.contains(value, case=False, regex=False, na=False)
+    else:
+        mask = series.astype(str).str.strip().str.casefold() == value.strip().casefold()
+        if pd.api.types.is_numeric_dtype(series):
+            num = pd.to_numeric(value.replace(",", "."), errors="coerce")
+            if not np.isnan(num):
+                mask = series == num
+    return df[mask]
+
+
+def _top_n(text):
+    """(n, trecho consumido) do "top N"/"os N ..." da pergunta, ou (None, None)."""
+    m = re.search(r"\b(?:(?:top|as|os|primeir[ao]s)\s+)?\b(\d+|" + "|".join(_NUMBER_WORDS) + r")\s+(?:__c\d+__|\w+)", text)
+    if not m:
+        return None, None
+    token = m.group(1)
+    return (int(token) if token.isdigit() else _NUMBER_WORDS[token]), (m.start(), m.end(1))
+
+
+def _ranked(keys, values, n=None):
+    """As ``n`` primeiras chaves por valor decrescente, desempatadas pela chave.
+
+    Usado pelo roteador e pelo cubo (``nf_cube``) para que os dois devolvam o
+    mesmo top-N quando há empates.
+    """
+    keys = np.asarray(keys, dtype=object)
+    values = np.asarray(values)
+    order = np.lexsort((keys.astype(str), -values))[:n]
+    return keys[order].tolist(), values[order].tolist()
+
+
+def _scalar(value):
+    if isinstance(value, (np.generic,)):
+        value = value.item()
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+@dataclass
+class Plan:
+    """Intenção reconhecida, independente de onde os dados estão."""
+    intent: str
+    target: str = None
+    filter: tuple = None
+    value: str = None         # coluna somada no top-N por soma (ou chave contada no top-N de notas)
+    n: int = None
+    columns: list = field(default_factory=list)
+
+
+_REDUCERS = {"maximo": "max", "minimo": "min", "media": "mean", "soma": "sum"}
+_ROW_WORDS = r"\b(linhas|registros|operacoes)\b"
+
+
+def _accepted(p, pl, tabela, patterns=(), spans=()):
+    """``pl`` se a pergunta não tiver nada além do que o plano consome; senão None.
+
+    Consumidos: os trechos de ``patterns``/``spans`` (palavras da intenção), o
+    filtro, as colunas do plano, o nome da própria ``tabela`` e ``_FILLER``.
+    Uma coluna ou literal a mais, um número solto ou uma palavra desconhecida
+    ("em SP", "por UF") é restrição que o plano ignoraria.
+    """
+    text = p.text
+    spans = list(spans)
+    for pattern in patterns:
+        spans += [m.span() for m in re.finditer(pattern, text)]
+    if p.filter_span:
+        spans.append(p.filter_span)
+    chars = list(text)
+    for start, end in spans:
+        chars[start:end] = " " * (end - start)
+    rest = "".join(chars)
+    used = set(pl.columns) | ({p.filter[0]} if p.filter else set())
+    table = _norm(tabela) if tabela else None
+    rest = re.sub(r"__c(\d+)__", lambda m: " " if p.columns[int(m.group(1))] in used else " __sobra__ ", rest)
+    rest = re.sub(r"__v(\d+)__", lambda m: " " if _norm(p.values[int(m.group(1))]) == table else " __sobra__ ", rest)
+    if all(w in _FILLER or w == table for w in re.findall(r"\w+", rest)):
+        return pl
+    return None
+
+
+def plan(question, columns, is_numeric, tabela=None):
+    """Intenção da pergunta sobre ``columns`` ou None; ``is_numeric(coluna)`` diz se a coluna é numérica.
+
+    ``tabela`` é o nome da tabela consultada: a pergunta pode citá-la, mas
+    citar outra tabela manda a pergunta para o LLM. Separado de ``route``
+    para que outras fontes (ex.: o cubo de agregados, ``nf_cube``) respondam
+    às mesmas intenções.
+    """
+    p = _parse(question, columns)
+    t = p.text
+    if _UNSUPPORTED.search(t):
+        return None
+    non_filter = [c for c in p.columns if not p.filter or c != p.filter[0]]
+    target = non_filter[0] if non_filter else None
+
+    def accept(pl, *patterns, spans=()):
+        return _accepted(p, pl, tabela, patterns, spans)
+
+    unique_words = r"\b(valores? unicos?|distint[oa]s)\b"
+    list_words = r"\b(liste|listar|quais sao|mostre)\b"
+    if re.search(unique_words, t) and re.search(list_words, t) and target:
+        return accept(Plan("listar_unicos", target, p.filter, columns=[target]), unique_words, list_words)
+
+    how_many = r"\bquant[oa]s\b"
+    distinct_words = r"\b(unic[oa]s|distint[oa]s|diferentes)\b"
+    if re.search(how_many, t) and re.search(distinct_words, t) and target:
+        return accept(Plan("contar_distintos", target, p.filter, columns=[target]), how_many, distinct_words)
+
+    top_words = r"\bmais (frequentes|comuns|emitiram|aparecem|vendid[oa]s)\b|\bque mais\b|\btop\b"
+    if re.search(top_words, t) and target:
+        n, n_span = _top_n(t)
+        spans = [n_span] if n_span else []
+        n = n or 5
+        numeric = [c for c in non_filter[1:] if is_numeric(c)]
+        sum_words = r"\b(soma|montante|valor|total)\b"
+        if numeric and re.search(sum_words, t):
+            return accept(Plan("top_n_soma", target, p.filter, numeric[0], n, [target, numeric[0]]),
+                          top_words, sum_words, spans=spans)
+        if re.search(r"\b(soma|montante)\b", t):
+            return None  # pede soma, mas a coluna de valor não está nesta tabela
+        # "que mais emitiram notas": em Itens cada nota ocupa várias linhas
+        if re.search(r"\bnotas\b", t) and KEY_COLUMN in columns and target != KEY_COLUMN:
+            return accept(Plan("top_n_notas", target, p.filter, KEY_COLUMN, n, [target, KEY_COLUMN]),
+                          top_words, spans=spans)
+        return accept(Plan("top_n", target, p.filter, n=n, columns=[target]), top_words, spans=spans)
+
+    if target and is_numeric(target):
+        for intent, words in (("maximo", r"\b(maximo|maxima|maior valor|valor maximo)\b"),
+                              ("minimo", r"\b(minimo|minima|menor valor|valor minimo)\b"),
+                              ("media", r"\bmedia\b"),
+                              ("soma", r"\b(soma|somatorio)\b")):
+            if re.search(words, t):
+                return accept(Plan(intent, target, p.filter, columns=[target]), words)
+
+    if re.search(how_many, t) and (p.filter or not target):
+        used = [p.filter[0]] if p.filter else []
+        # "itens" só é sinônimo de linhas na própria tabela de itens
+        row_words = _ROW_WORDS if _norm(tabela or "") != "itens" else r"\b(linhas|registros|operacoes|itens)\b"
+        rows = re.search(row_words, t)
+        notes = re.search(r"\bnotas\b", t)
+        if rows and notes:
+            return None  # linhas ou notas? fica com o LLM
+        if rows:
+            return accept(Plan("contar_linhas", filter=p.filter, columns=used), how_many, row_words)
+        # em Itens cada nota ocupa várias linhas: conta as chaves distintas
+        if notes and KEY_COLUMN in columns:
+            return accept(Plan("contar_notas", filter=p.filter, columns=used + [KEY_COLUMN]), how_many)
+
+    return None
+
+
+def route(question, df, tabela=None):
+    """Responde a pergunta direto no pandas, ou retorna None se não reconhecer."""
+    pl = plan(question, df.columns, lambda c: pd.api.types.is_numeric_dtype(df[c]), tabela)
+    if pl is None:
+        return None
+    data = _apply_filter(df, pl.filter)
+    target = pl.target
+
+    if pl.intent == "listar_unicos":
+        answer = [{target: v} for v in data[target].dropna().unique().tolist()]
+    elif pl.intent == "contar_distintos":
+        answer = _scalar(data[target].nunique())
+    elif pl.intent == "top_n_soma":
+        sums = data.groupby(target, observed=True)[pl.value].sum()
+        keys, values = _ranked(sums.index, sums.to_numpy(), pl.n)
+        answer = [{target: k, pl.value: v} for k, v in zip(keys, values)]
+    elif pl.intent in ("top_n", "top_n_notas"):
+        if pl.intent == "top_n":
+            counts = data[target].value_counts(sort=False)
+        else:
+            counts = data.groupby(target, observed=True)[pl.value].nunique()
+        # categorias sem ocorrência no recorte filtrado não entram no ranking
+        counts = counts[counts > 0]
+        keys, values = _ranked(counts.index, counts.to_numpy(), pl.n)
+        answer = [{target: k, "contagem": int(v)} for k, v in zip(keys, values)]
+    elif pl.intent in _REDUCERS:
+        answer = _scalar(getattr(data[target], _REDUCERS[pl.intent])())
+    elif pl.intent == "contar_linhas":
+        answer = _scalar(len(data))
+    else:
+        answer = _scalar(data[KEY_COLUMN].nunique())
+    return RouterResult(answer, pl.intent, pl.columns)
@@ -0,0 +1,205 @@
+# utils/nf_sql.py
+"""Backend SQL (DuckDB) para o agente de Notas Fiscais.
+
+O LLM gera uma consulta SQL que roda num DuckDB embutido sobre os Parquets
+do cache (``df.attrs["parquet"]``, um arquivo ou a lista das partições do
+catálogo, com o filtro de ``df.attrs["filter"]`` no ``WHERE`` da view),
+com ``cabecalho`` e ``itens`` registradas como views e ligadas por
+``"CHAVE DE ACESSO"``. A execução tem
+limite de linhas (``NF_SQL_MAX_ROWS``) e de tempo (``NF_SQL_TIMEOUT``,
+via ``interrupt``). O DuckDB é opcional: só é importado quando usado.
+"""
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+try:
+    from utils import metrics, nf_catalog, nf_profile
+except ImportError:  # executado como script dentro de utils/
+    import metrics
+    import nf_catalog
+    import nf_profile
+
+MAX_ROWS = int(os.getenv("NF_SQL_MAX_ROWS", "1000"))
+TIMEOUT_SECONDS = float(os.getenv("NF_SQL_TIMEOUT", "30"))
+MAX_CONNECTIONS = 4
+KEY_COLUMN = "CHAVE DE ACESSO"
+
+SQL_PROMPT = """\
+Você escreve consultas SQL no dialeto do DuckDB sobre duas tabelas.
+
+Tabela cabecalho (uma linha por nota fiscal):
+{cabecalho}
+
+Tabela itens (uma linha por item de nota fiscal):
+{itens}
+
+As tabelas se relacionam pela coluna "{key}".
+Os nomes das colunas têm espaços e acentos: escreva-os SEMPRE entre aspas duplas.
+Responda APENAS com uma única consulta SELECT, sem explicações e sem markdown.
+
+Pergunta: {pergunta}
+SQL:"""
+
+_FENCE = re.compile(r"```(?:sql)?\s*(.*?)```", re.S | re.I)
+_READ_ONLY = re.compile(r"^\s*(select|with)\b", re.I)
+
+_connections = OrderedDict()
+_conn_lock = threading.Lock()
+
+
+class SQLError(ValueError):
+    """SQL gerado inválido, bloqueado ou interrompido por tempo."""
+
+
+def _duckdb():
+    try:
+        import duckdb
+    except ImportError as e:
+        raise SQLError("Backend SQL indisponível: instale o pacote duckdb.") from e
+    return duckdb
+
+
+def _quote_path(path):
+    return "'" + path.replace("'", "''") + "'"
+
+
+def _quote_name(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _parquet_files(df):
+    """Parquets de origem do frame (lista) ou None se faltar algum."""
+    paths = df.attrs.get("parquet")
+    paths = [paths] if isinstance(paths, str) else list(paths or [])
+    if paths and all(p and os.path.exists(p) for p in paths):
+        return paths
+    return None
+
+
+def _where(df):
+    """``WHERE`` equivalente ao filtro de linhas do catálogo (``df.attrs["filter"]``)."""
+    filtro = df.attrs.get("filter") or {}
+    conds = []
+    if nf_catalog.DATE_COLUMN in df:
+        data = f"TRY_CAST({_quote_name(nf_catalog.DATE_COLUMN)} AS TIMESTAMP)"
+        if filtro.get("inicio"):
+            conds.append(f"{data} >= CAST({_quote_path(filtro['inicio'])} AS TIMESTAMP)")
+        if filtro.get("fim"):
+            conds.append(f"{data} <= CAST({_quote_path(filtro['fim'])} AS TIMESTAMP)")
+    cols = [c for c in nf_catalog.UF_COLUMNS if c in df]
+    if filtro.get("ufs") and cols:
+        ufs = ", ".join(_quote_path(str(uf)) for uf in filtro["ufs"])
+        conds.append("(" + " OR ".join(f"CAST({_quote_name(c)} AS VARCHAR) IN ({ufs})" for c in cols) + ")")
+    return f" WHERE {' AND '.join(conds)}" if conds else ""
+
+
+def _register(conn, name, df):
+    paths = _parquet_files(df)
+    if paths:
+        files = ", ".join(_quote_path(p) for p in paths)
+        conn.execute(f"CREATE VIEW {name} AS SELECT * FROM read_parquet([{files}], union_by_name = true)"
+                     f"{_where(df)}")
+    else:
+        # sem Parquet (cache desligado ou apagado): cópia do DataFrame em memória. Uma
+        # tabela, não ``register``: frames registrados não aparecem nos cursores do run_sql
+        logging.info(f"SQL: {name} sem Parquet no cache; consultando o DataFrame em memória")
+        conn.register(f"{name}_df", df)
+        conn.execute(f"CREATE TABLE {name} AS SELECT * FROM {name}_df")
+        conn.unregister(f"{name}_df")
+
+
+def _lock_down(conn, dirs):
+    """Impede o SQL gerado de ler/gravar outros arquivos do servidor."""
+    try:
+        if dirs:
+            conn.execute(f"SET allowed_directories = [{', '.join(_quote_path(d) for d in dirs)}]")
+        conn.execute("SET enable_external_access = false")
+        conn.execute("SET lock_configuration = true")
+    except Exception as e:
+        logging.warning(f"DuckDB sem restrição de acesso a arquivos: {e}")
+
+
+def get_connection(cabecalho, itens):
+    """Conexão (em memória) com as duas tabelas, reutilizada por par de impressões digitais."""
+    key = (cabecalho.attrs.get("fingerprint"), itens.attrs.get("fingerprint"))
+    cacheable = None not in key
+    with _conn_lock:
+        if cacheable and key in _connections:
+            _connections.move_to_end(key)
+            return _connections[key]
+        duckdb = _duckdb()
+        conn = duckdb.connect(":memory:")
+        _register(conn, "cabecalho", cabecalho)
+        _register(conn, "itens", itens)
+        dirs = sorted({os.path.dirname(os.path.abspath(p))
+                       for df in (cabecalho, itens) for p in _parquet_files(df) or ()})
+        _lock_down(conn, dirs)
+        if cacheable:
+            _connections[key] = conn
+            while len(_connections) > MAX_CONNECTIONS:
+                _, old = _connections.popitem(last=False)
+                old.close()
+        return conn
+
+
+def build_prompt(cabecalho, itens, pergunta, budget=None):
+    budget = budget or nf_profile.PROMPT_TOKEN_BUDGET
+    return SQL_PROMPT.format(
+        cabecalho=nf_profile.table_context(cabecalho, budget // 2),
+        itens=nf_profile.table_context(itens, budget // 2),
+        key=KEY_COLUMN,
+        pergunta=pergunta,
+    )
+
+
+def extract_sql(text):
+    """Tira cercas de markdown e o ';' final; aceita só uma consulta de leitura."""
+    m = _FENCE.search(text)
+    sql = (m.group(1) if m else text).strip().rstrip(";").strip()
+    if not _READ_ONLY.match(sql) or ";" in sql:
+        raise SQLError(f"Apenas uma consulta SELECT é permitida: {sql[:200]}")
+    return sql
+
+
+def _to_answer(df, truncated):
+    if df.shape == (1, 1):
+        value = df.iat[0, 0]
+        return str(value.item() if hasattr(value, "item") else value)
+    records = json.loads(df.to_json(orient="records", date_format="iso", force_ascii=False))
+    if truncated:
+        logging.info(f"Resultado SQL truncado em {len(records)} linhas.")
+    return records
+
+
+def run_sql(conn, sql, max_rows=MAX_ROWS, timeout=TIMEOUT_SECONDS):
+    """Executa com limite de linhas e de tempo; retorna lista de dicts ou texto."""
+    cursor = conn.cursor()
+    timer = threading.Timer(timeout, cursor.interrupt) if timeout else None
+    try:
+        if timer:
+            timer.start()
+        df = cursor.execute(f"SELECT * FROM ({sql}) AS resposta LIMIT {max_rows + 1}").fetchdf()
+    except Exception as e:
+        if type(e).__name__ == "InterruptException":
+            raise SQLError(f"Consulta interrompida após {timeout:g} s.") from e
+        raise SQLError(f"Erro ao executar o SQL: {e}") from e
+    finally:
+        if timer:
+            timer.cancel()
+        cursor.close()
+    truncated = len(df) > max_rows
+    return _to_answer(df.head(max_rows), truncated)
+
+
+def answer(cabecalho, itens, pergunta, llm):
+    """Retorna (resposta, sql) gerando o SQL com ``llm.complete``."""
+    prompt = build_prompt(cabecalho, itens, pergunta)
+    logging.info(f"Prompt SQL com {nf_profile.count_tokens(prompt)} tokens: {pergunta}")
+    with metrics.span("nf.sql_llm"):
+        sql = extract_sql(llm.complete(prompt).text)
+    with metrics.span("nf.sql_exec"):
+        return run_sql(get_connection(cabecalho, itens), sql), sql
@@ -0,0 +1,183 @@
+# utils/plan_store.py
+"""Repositório de planos pandas validados, reaproveitados entre datasets.
+
+Quando o LLM gera uma expressão que roda sem erro, ela é gravada por
+(tabela, modelo da pergunta). O modelo é a pergunta normalizada com os
+literais entre aspas que não são nomes de coluna trocados por marcadores
+(ex.: a CHAVE DE ACESSO consultada), e os mesmos literais viram marcadores
+na expressão. Em um mês novo a expressão é reexecutada direto sobre o
+DataFrame, depois de conferir que as colunas usadas ainda existem.
+"""
+import ast
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from utils import nf_cache, nf_exec
+from utils.llm_cache import normalize_question
+
+DB_PATH = os.getenv("PLAN_STORE_PATH", os.path.join(nf_cache.CACHE_DIR, "plans.sqlite"))
+# planos que falham mais do que isso além dos acertos são descartados
+MAX_NET_FAILURES = 2
+ERROR_PREFIX = "There was an error"
+
+_QUOTED = re.compile(r"'([^']+)'|\"([^\"]+)\"")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS plans (
+    tabela TEXT NOT NULL,
+    template TEXT NOT NULL,
+    expression TEXT NOT NULL,
+    columns TEXT NOT NULL,
+    successes INTEGER NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (tabela, template)
+);
+"""
+
+
+def _marker(i):
+    return f"__P{i}__"
+
+
+def question_template(question, columns):
+    """(modelo, parâmetros): literais que não são colunas viram marcadores."""
+    known = {str(c).strip().lower() for c in columns}
+    params = []
+
+    def repl(m):
+        value = m.group(1) or m.group(2)
+        if value.strip().lower() in known:
+            return m.group(0)
+        params.append(value)
+        return _marker(len(params) - 1)
+
+    return normalize_question(_QUOTED.sub(repl, question)), params
+
+
+def referenced_columns(expression, columns):
+    """Literais de string da expressão que são nomes de coluna."""
+    try:
+        tree = ast.parse(_strip_markdown(expression))
+    except SyntaxError:
+        return []
+    known = set(map(str, columns))
+    found = {n.value for n in ast.walk(tree) if isinstance(n, ast.Constant) and isinstance(n.value, str)}
+    return sorted(found & known)
+
+
+def _strip_markdown(code):
+    m = re.search(r"```(?:python)?\s*(.*?)```", code, re.S)
+    return (m.group(1) if m else code).strip()
+
+
+def run_expression(expression, df):
+    """Executa a expressão como o PandasQueryEngine (com limite de tempo); levanta erro em caso de falha."""
+    output = nf_exec.run(expression, df)
+    if output.startswith(ERROR_PREFIX):
+        raise RuntimeError(output)
+    return output
+
+
+class PlanStore:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def record(self, tabela, question, expression, df):
+        """Grava a expressão que o LLM gerou (e que já rodou sem erro).
+
+        Se algum literal da pergunta não aparece na expressão, o plano fica
+        preso à pergunta exata em vez do modelo.
+        """
+        template, params = question_template(question, df.columns)
+        code = _strip_markdown(expression)
+        for i, value in enumerate(params):
+            quoted = [q + value + q for q in ("'", '"') if q + value + q in code]
+            if not quoted:
+                template, code = normalize_question(question), _strip_markdown(expression)
+                break
+            for lit in quoted:
+                code = code.replace(lit, lit[0] + _marker(i) + lit[-1])
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO plans "
+                "(tabela, template, expression, columns, successes, failures, created, last_used) "
+                "VALUES (?, ?, ?, ?, 1, 0, ?, ?)",
+                (tabela, template, code, json.dumps(referenced_columns(code, df.columns), ensure_ascii=False),
+                 now, now),
+            )
+
+    def _lookup(self, tabela, question, df):
+        template, params = question_template(question, df.columns)
+        candidates = [(normalize_question(question), [])]
+        if params:
+            candidates.append((template, params))
+        with closing(self._connect()) as conn:
+            for key, key_params in candidates:
+                row = conn.execute(
+                    "SELECT expression, columns FROM plans WHERE tabela = ? AND template = ?",
+                    (tabela, key),
+                ).fetchone()
+                if row:
+                    return key, key_params, row[0], json.loads(row[1])
+        return None
+
+    def replay(self, tabela, question, df):
+        """Saída da expressão gravada para esta pergunta, ou None (miss/falha)."""
+        found = self._lookup(tabela, question, df)
+        if found is None:
+            return None
+        template, params, code, columns = found
+        if any(c not in df.columns for c in columns):
+            self._mark(tabela, template, ok=False)
+            return None
+        for i, value in enumerate(params):
+            if "'" in value or '"' in value or "\\" in value:
+                return None
+            code = code.replace(_marker(i), value)
+        try:
+            output = run_expression(code, df)
+        except Exception:
+            self._mark(tabela, template, ok=False)
+            return None
+        self._mark(tabela, template, ok=True)
+        return output
+
+    def _mark(self, tabela, template, ok):
+        col = "successes" if ok else "failures"
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                f"UPDATE plans SET {col} = {col} + 1, last_used = ? WHERE tabela = ? AND template = ?",
+                (time.time(), tabela, template),
+            )
+            conn.execute(
+                "DELETE FROM plans WHERE tabela = ? AND template = ? AND failures > successes + ?",
+                (tabela, template, MAX_NET_FAILURES),
+            )
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_store():
+    """Instância compartilhada por todas as sessões do processo."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = PlanStore()
+        return _default
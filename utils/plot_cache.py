@@ -0,0 +1,176 @@
+# utils/plot_cache.py
+"""Cache de gráficos endereçado por conteúdo.
+
+Cada imagem é salva em ``outdir`` com um nome derivado da impressão digital
+do dataset e dos parâmetros do gráfico; pedidos idênticos reaproveitam o
+arquivo. Misses de histogramas são renderizados em um pool de processos e o
+diretório é mantido abaixo de ``PLOT_CACHE_MAX_MB`` por remoção LRU (mtime,
+atualizado a cada hit).
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+try:
+    from utils import metrics
+except ImportError:  # executado como script dentro de utils/
+    import metrics
+
+MAX_BYTES = int(os.getenv("PLOT_CACHE_MAX_MB", "200")) * 1024 * 1024
+MAX_WORKERS = int(os.getenv("PLOT_WORKERS", str(min(4, os.cpu_count() or 1))))
+# abaixo disso não compensa acionar o pool
+PARALLEL_MIN_JOBS = 4
+
+_pool = None
+_pool_lock = threading.Lock()
+_draw_lock = threading.Lock()
+
+
+def dataset_fingerprint(df):
+    """sha1 do conteúdo (valores, índice, nomes e tipos das colunas)."""
+    h = hashlib.sha1()
+    h.update(json.dumps([str(c) for c in df.columns]).encode("utf-8"))
+    h.update(json.dumps([str(t) for t in df.dtypes]).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def cache_path(outdir, prefix, fingerprint, ext="png", **params):
+    """Caminho determinístico para (dataset, tipo de gráfico, parâmetros)."""
+    key = hashlib.sha1(
+        json.dumps([fingerprint, prefix, params], sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()[:16]
+    label = re.sub(r"[^\w.-]", "_", str(params.get("column", "")))
+    name = f"{prefix}_{label}_{key}" if label else f"{prefix}_{key}"
+    return os.path.join(outdir, f"{name}.{ext}")
+
+
+def lookup(path):
+    """True se o arquivo já existe; marca-o como usado recentemente."""
+    try:
+        os.utime(path, None)
+        return True
+    except OSError:
+        return False
+
+
+def evict(outdir, max_bytes=None):
+    """Remove os arquivos menos usados até o diretório caber no limite."""
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    with os.scandir(outdir) as it:
+        for e in it:
+            if e.is_file() and e.name.endswith((".png", ".npy")):
+                st = e.stat()
+                entries.append((st.st_mtime, st.st_size, e.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def histogram_counts(values, bins=50):
+    """Contagens e bordas calculadas uma vez com np.histogram."""
+    values = np.asarray(values, dtype=float)
+    values = values[np.isfinite(values)]
+    return np.histogram(values, bins=bins)
+
+
+def pyplot():
+    """``matplotlib.pyplot`` com backend Agg, importado só no primeiro gráfico."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    return plt
+
+
+@contextmanager
+def drawing():
+    """``pyplot`` com exclusividade: a máquina de estados do pyplot não é thread-safe
+    e os jobs (``utils.jobs``) desenham em threads."""
+    with _draw_lock:
+        plt = pyplot()
+        try:
+            yield plt
+        finally:
+            plt.close("all")
+
+
+def render_histogram(path, title, counts, edges):
+    """Desenha um histograma a partir de contagens já calculadas."""
+    with drawing() as plt:
+        plt.figure()
+        plt.bar(edges[:-1], counts, width=np.diff(edges), align="edge")
+        plt.grid(True)
+        plt.title(title)
+        save_figure(plt, path)
+    return path
+
+
+def save_figure(plt, path):
+    """savefig atômico: leitores concorrentes nunca veem arquivo parcial."""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with metrics.span("plot.savefig"):
+        plt.savefig(tmp, bbox_inches="tight", format="png")
+    os.replace(tmp, path)
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: o processo do Streamlit tem threads, fork não é seguro
+            _pool = ProcessPoolExecutor(
+                max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+@metrics.timed("plot.render")
+def render_many(func, jobs, progress=None):
+    """Executa ``func(*args)`` para cada item de ``jobs``; em paralelo se valer a pena.
+
+    Retorna a lista de resultados (ou exceções) na mesma ordem de ``jobs``.
+    ``progress(feitos, total)`` é chamado a cada resultado; se levantar
+    exceção (ex.: job cancelado), os desenhos ainda não iniciados são
+    descartados e a exceção segue adiante.
+    """
+    if len(jobs) < PARALLEL_MIN_JOBS or MAX_WORKERS <= 1:
+        results = []
+        for args in jobs:
+            try:
+                results.append(func(*args))
+            except Exception as e:
+                results.append(e)
+            if progress:
+                progress(len(results), len(jobs))
+        return results
+    futures = [_get_pool().submit(func, *args) for args in jobs]
+    results = []
+    try:
+        for fut in futures:
+            try:
+                results.append(fut.result())
+            except Exception as e:
+                results.append(e)
+            if progress:
+                progress(len(results), len(jobs))
+    except BaseException:
+        for fut in futures:
+            fut.cancel()
+        raise
+    return results
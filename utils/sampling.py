@@ -0,0 +1,147 @@
+# utils/sampling.py
+"""Amostragem de CSVs grandes em uma passada, sem carregar o arquivo.
+
+Reservatório por chaves aleatórias: cada linha recebe uma chave uniforme e
+ficam as ``n`` maiores, bloco a bloco. Com ``stratify`` cada estrato tem o
+próprio reservatório, e as cotas são aplicadas no fim, quando o tamanho
+de cada estrato já é conhecido: cotas explícitas (``quotas``) ou
+alocação proporcional com piso (``min_per_stratum``), para que classes
+raras (ex.: fraudes em ``Class``) não sumam da amostra. As chaves saem de
+um único gerador com ``seed``; o resultado não depende de ``chunksize``.
+Valores ausentes na coluna de estratificação formam um único estrato.
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CHUNKSIZE = 100_000
+MAX_STRATA = 200
+_ROW = "__linha__"
+# chave única do estrato dos ausentes (NaN != NaN: cada bloco criaria o seu)
+_NA = pd.NA
+
+
+def _stratum(value):
+    return _NA if pd.isna(value) else value
+
+
+class _Reservoir:
+    """Guarda as ``size`` linhas de maior chave vistas até agora."""
+
+    def __init__(self, size):
+        self.size = size
+        self.frame = None
+        self.keys = np.empty(0)
+        self.seen = 0
+
+    def offer(self, frame, keys):
+        self.seen += len(frame)
+        if self.size <= 0:
+            return
+        if len(self.keys) >= self.size:
+            # reservatório cheio: só entram chaves acima da menor guardada
+            keep = keys > self.keys.min()
+            frame, keys = frame[keep], keys[keep]
+            if not len(keys):
+                return
+        frame = frame if self.frame is None else pd.concat([self.frame, frame], ignore_index=True)
+        keys = np.concatenate([self.keys, keys])
+        if len(keys) > self.size:
+            top = np.argpartition(keys, len(keys) - self.size)[len(keys) - self.size:]
+            frame, keys = frame.iloc[top].reset_index(drop=True), keys[top]
+        self.frame, self.keys = frame, keys
+
+    def take(self, n):
+        """As ``n`` linhas de maior chave (subamostra uniforme do reservatório)."""
+        if self.frame is None or n <= 0:
+            return None
+        order = np.argsort(-self.keys, kind="stable")[:n]
+        return self.frame.iloc[order]
+
+
+def allocate(counts, n, min_per_stratum=0):
+    """Cotas proporcionais ao tamanho de cada estrato, com piso ``min_per_stratum``.
+
+    O piso nunca passa do tamanho do estrato; se a soma exceder ``n``, os
+    maiores estratos cedem linhas primeiro. Se só os pisos já passam de
+    ``n``, o piso cai para ``n // estratos``: a soma das cotas nunca passa
+    de ``n``.
+    """
+    counts = pd.Series(counts, dtype=float)
+    total = counts.sum()
+    if total <= n:
+        return counts.astype(int).to_dict()
+    if np.minimum(counts, min_per_stratum).sum() > n:
+        floor = n // len(counts)
+        logging.warning(f"Piso de {min_per_stratum} por estrato não cabe em {n} linhas "
+                        f"({len(counts)} estratos): usando {floor}")
+        min_per_stratum = floor
+    quota = np.floor(counts * n / total)
+    quota = np.maximum(quota, np.minimum(counts, min_per_stratum))
+    # sobras do arredondamento para os maiores estratos; excesso do piso sai deles também
+    diff = int(n - quota.sum())
+    for key in counts.sort_values(ascending=False).index:
+        if diff == 0:
+            break
+        room = counts[key] - quota[key] if diff > 0 else quota[key] - min(counts[key], min_per_stratum)
+        step = int(min(abs(diff), room))
+        quota[key] += step if diff > 0 else -step
+        diff += -step if diff > 0 else step
+    return quota.astype(int).to_dict()
+
+
+def reservoir_sample(filelike, n=5000, seed=0, stratify=None, quotas=None, min_per_stratum=0,
+                     chunksize=DEFAULT_CHUNKSIZE, **read_kwargs):
+    """Amostra ``n`` linhas de um CSV (caminho ou file-like) em uma passada.
+
+    ``stratify``: coluna de estratificação; ``quotas``: ``{valor: linhas}``
+    exatas por estrato (estratos ausentes ficam de fora); sem ``quotas`` a
+    alocação é proporcional com piso ``min_per_stratum``. A amostra volta na
+    ordem do arquivo; ``df.attrs["sampling"]`` traz linhas vistas e
+    amostradas por estrato.
+    """
+    if hasattr(filelike, "seek"):
+        filelike.seek(0)
+    rng = np.random.default_rng(seed)
+    if quotas is not None:
+        quotas = {_stratum(value): size for value, size in quotas.items()}
+    reservoirs = {}
+    offset = 0
+    for chunk in pd.read_csv(filelike, chunksize=chunksize, **read_kwargs):
+        chunk[_ROW] = np.arange(offset, offset + len(chunk))
+        offset += len(chunk)
+        keys = rng.random(len(chunk))
+        if stratify is None:
+            reservoirs.setdefault(None, _Reservoir(n)).offer(chunk, keys)
+            continue
+        codes, uniques = pd.factorize(chunk[stratify], use_na_sentinel=False)
+        for code, value in enumerate(uniques):
+            value = _stratum(value)
+            if value not in reservoirs:
+                if len(reservoirs) >= MAX_STRATA:
+                    raise ValueError(f"Coluna {stratify} tem mais de {MAX_STRATA} valores: não serve como estrato.")
+                size = quotas.get(value, 0) if quotas is not None else n
+                reservoirs[value] = _Reservoir(size)
+            mask = codes == code
+            reservoirs[value].offer(chunk[mask], keys[mask])
+
+    if stratify is None:
+        alloc = {None: n}
+    elif quotas is not None:
+        alloc = {value: quotas.get(value, 0) for value in reservoirs}
+    else:
+        alloc = allocate({value: r.seen for value, r in reservoirs.items()}, n, min_per_stratum)
+    parts = [r.take(alloc[value]) for value, r in reservoirs.items()]
+    parts = [p for p in parts if p is not None]
+    if parts:
+        sample = pd.concat(parts).sort_values(_ROW).drop(columns=_ROW).reset_index(drop=True)
+    else:
+        sample = pd.DataFrame()
+    sample.attrs["sampling"] = {
+        "rows": offset,
+        "seed": seed,
+        "strata": {str(value): {"seen": r.seen, "sampled": min(alloc[value], r.seen)}
+                   for value, r in reservoirs.items()},
+    }
+    return sample
@@ -0,0 +1,129 @@
+# utils/schema.py
+"""Otimização de tipos (dtypes) para caber mais meses de NF por worker.
+
+``optimize`` converte texto de baixa cardinalidade em ``category``, reduz
+inteiros à menor largura que comporta o mínimo/máximo da coluna, reduz
+floats para float32 só quando a conversão é exata, mantém chaves como
+texto (``string[pyarrow]``, um buffer contíguo em vez de um objeto Python
+por linha) e converte colunas de data uma única vez. ``memory_report``
+compara o uso de memória antes/depois, por coluna.
+"""
+import logging
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+# versão das regras: caches gravados com outra versão são refeitos
+VERSION = 1
+
+CATEGORY_RATIO = float(os.getenv("SCHEMA_CATEGORY_RATIO", "0.5"))
+MAX_CATEGORIES = 65535
+DATE_SAMPLE = 200
+_DATE_RE = re.compile(r"^\s*(\d{4}-\d{2}-\d{2}|\d{2}/\d{2}/\d{4})([ T]\d{2}:\d{2}(:\d{2})?)?\s*$")
+_DATE_FORMATS = {10: None, 16: ":%M", 19: ":%M:%S"}
+
+try:
+    import pyarrow  # noqa: F401
+    KEY_DTYPE = "string[pyarrow]"
+except ImportError:
+    KEY_DTYPE = "string"
+
+
+def _is_text(series):
+    return pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+
+
+def _date_format(sample):
+    """Formato strptime comum a toda a amostra, ou None se não for data."""
+    if sample.empty or not sample.map(lambda v: isinstance(v, str) and bool(_DATE_RE.match(v))).all():
+        return None
+    first = sample.iloc[0].strip()
+    day = "%Y-%m-%d" if first[4] == "-" else "%d/%m/%Y"
+    sep = first[10] if len(first) > 10 else ""
+    suffix = _DATE_FORMATS.get(len(first))
+    if len(first) == 10:
+        return day
+    if suffix is None:
+        return None
+    return f"{day}{sep}%H{suffix}"
+
+
+def _downcast_int(series):
+    if series.isna().any():
+        # inteiros com vazios (Int64 do ingest por blocos)
+        lo, hi = series.min(), series.max()
+        for dtype in ("Int8", "Int16", "Int32"):
+            info = np.iinfo(dtype.lower())
+            if info.min <= lo and hi <= info.max:
+                return series.astype(dtype)
+        return series.astype("Int64")
+    return pd.to_numeric(series.astype("int64"), downcast="integer")
+
+
+def _downcast_float(series):
+    values = series.to_numpy(dtype="float64", na_value=np.nan)
+    small = values.astype(np.float32)
+    with np.errstate(invalid="ignore"):
+        exact = np.array_equal(small.astype(np.float64), values, equal_nan=True)
+    return pd.Series(small, index=series.index, name=series.name) if exact else series.astype("float64")
+
+
+def optimize_column(series, key=False, category_ratio=CATEGORY_RATIO):
+    """Retorna a coluna com o tipo mais compacto que preserva os valores."""
+    if key:
+        return series.astype(KEY_DTYPE)
+    if pd.api.types.is_bool_dtype(series) or isinstance(series.dtype, pd.CategoricalDtype):
+        return series
+    if pd.api.types.is_integer_dtype(series):
+        return _downcast_int(series)
+    if pd.api.types.is_float_dtype(series):
+        return _downcast_float(series)
+    if not _is_text(series):
+        return series
+    non_null = series.dropna()
+    fmt = _date_format(non_null.head(DATE_SAMPLE))
+    if fmt is not None:
+        parsed = pd.to_datetime(series, format=fmt, errors="coerce")
+        # só aceita se nenhuma data válida virou NaT
+        if parsed.notna().sum() == len(non_null):
+            return parsed
+    n_unique = non_null.nunique()
+    if n_unique <= MAX_CATEGORIES and n_unique <= max(1, category_ratio * len(series)):
+        return series.astype("category")
+    return series
+
+
+def optimize(df, key_columns=(), category_ratio=CATEGORY_RATIO):
+    """Retorna (df otimizado, relatório de memória por coluna).
+
+    ``key_columns`` ficam como texto mesmo que pareçam numéricas ou
+    repetidas (ex.: ``CHAVE DE ACESSO``). ``df.attrs`` é preservado.
+    """
+    out = df.copy(deep=False)
+    for col in df.columns:
+        try:
+            out[col] = optimize_column(df[col], key=col in key_columns, category_ratio=category_ratio)
+        except (TypeError, ValueError) as e:
+            logging.warning(f"Coluna {col} mantida com o tipo original: {e}")
+    report = memory_report(df, out)
+    total = report.loc["TOTAL"]
+    logging.info(f"Schema otimizado: {total['antes_mb']:.1f} MB -> {total['depois_mb']:.1f} MB")
+    out.attrs["memory"] = {"antes_mb": float(total["antes_mb"]), "depois_mb": float(total["depois_mb"])}
+    return out, report
+
+
+def memory_report(before, after):
+    """Uso de memória (MB, deep) antes/depois por coluna, com linha TOTAL."""
+    antes = before.memory_usage(deep=True, index=False) / 2**20
+    depois = after.memory_usage(deep=True, index=False) / 2**20
+    report = pd.DataFrame({
+        "dtype_antes": before.dtypes.astype(str),
+        "dtype_depois": after.dtypes.astype(str),
+        "antes_mb": antes,
+        "depois_mb": depois,
+    })
+    report.loc["TOTAL"] = ["", "", antes.sum(), depois.sum()]
+    report["reducao_%"] = (1 - report["depois_mb"] / report["antes_mb"].where(report["antes_mb"] > 0)) * 100
+    return report
@@ -1,8 +0,0 @@
-import os
-import zipfile
-
-def unzip_files(zip_path, extract_to):
-    if not os.path.exists(extract_to):
-        os.makedirs(extract_to)
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        zip_ref.extractall(extract_to)
@@ -1,11 +1,16 @@
+import asyncio
 import os
-import zipfile
 import pandas as pd
-from llama_index.core.query_engine import PandasQueryEngine
 
 import logging
 from llama_index.core import PromptTemplate
 
+try:
+    from utils import nf_cache, nf_engine
+except ImportError:  # executado como script: python utils/verifica_zip.py
+    import nf_cache
+    import nf_engine
+
 DATA_DIR = "data"
 ZIP_FILE = "202401_NFs.zip"
 CABECALHO_FILE = "202401_NFs_Cabecalho.csv"
@@ -18,37 +23,14 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()]
 )
 
-def unzip_files(zip_path, extract_to):
-    """Descompacta arquivos de forma segura."""
-    if not os.path.exists(extract_to):
-        os.makedirs(extract_to)
-    try:
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_to)
-        logging.info("✅ Arquivos descompactados com sucesso.")
-    except Exception as e:
-        logging.error(f"❌ Erro ao descompactar arquivos: {e}")
-        raise
-
-def check_and_unzip():
-    cabecalho_path = os.path.join(DATA_DIR, CABECALHO_FILE)
-    itens_path = os.path.join(DATA_DIR, ITENS_FILE)
-    if os.path.exists(cabecalho_path) and os.path.exists(itens_path):
-        logging.info("✔️ Arquivos CSV já estão presentes. Pulando descompactação.")
-    else:
-        logging.info("📦 Arquivos CSV não encontrados. Descompactando...")
-        unzip_files(os.path.join(DATA_DIR, ZIP_FILE), DATA_DIR)
-
 def load_data():
-    cabecalho_path = os.path.join(DATA_DIR, CABECALHO_FILE)
-    itens_path = os.path.join(DATA_DIR, ITENS_FILE)
+    """Carrega as tabelas do ZIP (lido em blocos, sem extrair) ou dos CSVs soltos."""
     try:
-        cabecalho = pd.read_csv(cabecalho_path)
-        itens = pd.read_csv(itens_path)
+        cabecalho, itens = nf_cache.load_nf_dataset(DATA_DIR, ZIP_FILE, CABECALHO_FILE, ITENS_FILE)
         logging.info(f"🗂️ Dados carregados: Cabeçalho({cabecalho.shape[0]} linhas), Itens({itens.shape[0]} linhas)")
         return cabecalho, itens
     except FileNotFoundError:
-        logging.error("❌ Um ou ambos os arquivos CSV não foram encontrados. Verifique se a descompactação ocorreu corretamente.")
+        logging.error("❌ Nem o ZIP nem os arquivos CSV foram encontrados em data/.")
         raise
     except pd.errors.EmptyDataError:
         logging.error("❌ Um ou ambos os arquivos CSV estão vazios.")
@@ -69,7 +51,7 @@ def create_query_engine(df, name="Tabela"):
     pandas_prompt = PromptTemplate(
         """\
 Você é um agente capaz de responder perguntas sobre um DataFrame do Pandas.
-Dado o DataFrame abaixo, cuja representação (e cabeçalho) é:
+Dado o DataFrame abaixo, descrito pelo perfil das colunas:
 {df_str}
 
 Responda à pergunta "{query_str}" de forma concisa.
@@ -77,7 +59,8 @@ Você DEVE retornar APENAS a resposta textual e nada mais.
 NÃO inclua nenhuma formatação adicional, como explicações ou código Python.
 """
     )
-    engine = PandasQueryEngine(
+    # {df_str} recebe o perfil compacto (tipos, cardinalidade, faixas) em vez do head()
+    engine = nf_engine.ProfiledPandasQueryEngine(
         df=df,
         verbose=False,
         llm=None,
@@ -86,9 +69,16 @@ NÃO inclua nenhuma formatação adicional, como explicações ou código Python
     )
     return engine
 
+async def consultar_ambas(cabecalho_engine, itens_engine, pergunta):
+    """Consulta as duas tabelas em paralelo; erros voltam como exceções."""
+    return await asyncio.gather(
+        cabecalho_engine.aquery(pergunta),
+        itens_engine.aquery(pergunta),
+        return_exceptions=True,
+    )
+
 if __name__ == "__main__":
     logging.info("🚀 Iniciando script de utilidades (para testes).")
-    check_and_unzip()
     try:
         cabecalho_df, itens_df = load_data()
         cabecalho_engine = create_query_engine(cabecalho_df, "Notas Fiscais - Cabeçalho")
@@ -100,17 +90,16 @@ if __name__ == "__main__":
                 logging.info("👋 Encerrando agente de teste.")
                 break
 
-            try:
-                resposta_cab = cabecalho_engine.query(pergunta)
+            # as duas tabelas são consultadas ao mesmo tempo (para lotes: utils/batch_runner.py)
+            resposta_cab, resposta_itens = asyncio.run(consultar_ambas(cabecalho_engine, itens_engine, pergunta))
+            if isinstance(resposta_cab, Exception):
+                logging.error(f"⚠️ Erro ao consultar o cabeçalho: {resposta_cab}")
+            else:
                 print(f"\n📄 Resposta do Cabeçalho: {resposta_cab.response}")
-            except Exception as e:
-                logging.error(f"⚠️ Erro ao consultar o cabeçalho: {e}")
-
-            try:
-                resposta_itens = itens_engine.query(pergunta)
+            if isinstance(resposta_itens, Exception):
+                logging.error(f"⚠️ Erro ao consultar os itens: {resposta_itens}")
+            else:
                 print(f"\n📦 Resposta dos Itens: {resposta_itens.response}")
-            except Exception as e:
-                logging.error(f"⚠️ Erro ao consultar os itens: {e}")
 
     except Exception as e:
         logging.critical(f"❌ Erro crítico na execução: {e}")